@@ -0,0 +1,92 @@
+import argparse
+import sys
+
+from cw2 import monitor
+from cw2.cw_config import cw_config
+from cw2.cw_data import cw_archive
+from cw2.cw_profiling import cw_trace
+
+
+def _monitor(args) -> None:
+    conf = cw_config.Config(args.config, args.experiments)
+    m = monitor.Monitor(conf, args.root_dir, args.window)
+    m.run(args.interval, args.once)
+
+
+def _trace_merge(args) -> None:
+    print(cw_trace.merge(args.trace_dir, args.output))
+
+
+def _compact(args) -> None:
+    conf = cw_config.Config(args.config, args.experiments)
+    results = cw_archive.compact(conf, args.root_dir, args.force, not args.keep)
+    print(cw_archive.format_table(results))
+
+
+def main(argv=None) -> None:
+    """cw2 command line tools."""
+    p = argparse.ArgumentParser(prog="cw2")
+    sub = p.add_subparsers(dest="command")
+    sub.required = True
+
+    mon = sub.add_parser("monitor", help="Live progress of a running sweep.")
+    mon.add_argument("config", metavar="CONFIG.yml")
+    mon.add_argument(
+        "-e",
+        "--experiments",
+        nargs="+",
+        default=None,
+        help="Allows to specify which experiments should be monitored.",
+    )
+    mon.add_argument(
+        "--root-dir", default="", help="Root directory of the experiment output."
+    )
+    mon.add_argument(
+        "--interval", type=float, default=5.0, help="Seconds between two polls."
+    )
+    mon.add_argument(
+        "--window",
+        type=float,
+        default=60.0,
+        help="Seconds over which the throughput is averaged.",
+    )
+    mon.add_argument("--once", action="store_true", help="Print the status once.")
+    mon.set_defaults(func=_monitor)
+
+    trace = sub.add_parser(
+        "trace-merge", help="Merge the trace events of a run into a Chrome trace file."
+    )
+    trace.add_argument("trace_dir", metavar="TRACE_DIR")
+    trace.add_argument(
+        "-o", "--output", default=None, help="Output file. Defaults to TRACE_DIR/trace.json."
+    )
+    trace.set_defaults(func=_trace_merge)
+
+    comp = sub.add_parser(
+        "compact", help="Pack finished experiments into one archive per experiment."
+    )
+    comp.add_argument("config", metavar="CONFIG.yml")
+    comp.add_argument(
+        "-e",
+        "--experiments",
+        nargs="+",
+        default=None,
+        help="Allows to specify which experiments should be compacted.",
+    )
+    comp.add_argument(
+        "--root-dir", default="", help="Root directory of the experiment output."
+    )
+    comp.add_argument(
+        "--force", action="store_true", help="Also pack unfinished experiments."
+    )
+    comp.add_argument(
+        "--keep", action="store_true", help="Keep the loose files after packing."
+    )
+    comp.set_defaults(func=_compact)
+
+    args = p.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
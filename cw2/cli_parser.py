@@ -62,6 +62,38 @@ class Arguments:
             action="store_true",
             help="Disables writing internal console log files",
         )
+        p.add_argument(
+            "--dry-run",
+            dest="dry_run",
+            nargs="?",
+            const="table",
+            default=None,
+            choices=["table", "json"],
+            help="Only expand the configuration and report jobs, estimated core- / GPU-hours "
+                 "and the filesystem footprint as table or json. Nothing is written.",
+        )
+        p.add_argument(
+            "--profile",
+            choices=["cpu", "mem", "both"],
+            default=None,
+            help="Profile the tasks with cProfile (cpu) and / or tracemalloc (mem). "
+                 "Results are written into the repetition directories.",
+        )
+        p.add_argument(
+            "--profile-tasks",
+            dest="profile_tasks",
+            type=int,
+            nargs="+",
+            default=None,
+            help="Only profile the tasks with these indices.",
+        )
+        p.add_argument(
+            "--profile-every",
+            dest="profile_every",
+            type=int,
+            default=None,
+            help="Only profile every n-th iteration of iterative experiments.",
+        )
         p.add_argument(
             "--debug", action="store_true", default=False, help="Enable debug mode."
         )
@@ -78,6 +110,12 @@ class Arguments:
                 "Timestep prefixing (-t) only work on local schedulers, "
                 "so cannot use args --slurm (-s) and --prefix-with-timestamp (-t) at the same time."
             )
+        if self.args.profile is None and (
+            self.args.profile_tasks is not None or self.args.profile_every is not None
+        ):
+            raise ValueError(
+                "--profile-tasks and --profile-every require a profiling mode (--profile)."
+            )
 
     def get(self) -> dict:
         return vars(self.args)
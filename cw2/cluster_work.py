@@ -1,8 +1,11 @@
+import os
 from typing import List, Type
 
-from cw2 import cli_parser, experiment, job, scheduler
-from cw2.cw_config import cw_config
+from cw2 import cli_parser, experiment, job, planner, scheduler
+from cw2.cw_config import cw_conf_keys as KEYS
+from cw2.cw_config import conf_index, cw_config
 from cw2.cw_data import cw_loading, cw_logging
+from cw2.cw_profiling import cw_profiler, cw_trace
 
 
 class ClusterWork:
@@ -56,15 +59,33 @@ class ClusterWork:
         Args:
             root_dir (str, optional): [description]. Defaults to "".
         """
+        if self.args.get("dry_run") is not None:
+            p = planner.plan(self.config, self.args, root_dir)
+            if self.args["dry_run"] == "json":
+                print(planner.to_json(p))
+            else:
+                print(planner.format_table(p))
+            return p
+
         if self.exp_cls is None:
             raise NotImplementedError(
                 "Cannot run with missing experiment.AbstractExperiment Implementation."
             )
 
         self.config.to_yaml(relpath=True)
+        conf_index.write_index(self.config.exp_configs, root_dir)
 
         args = self.args
 
+        if args.get("profile") is not None:
+            n = cw_profiler.annotate_configs(
+                self.config.exp_configs,
+                args["profile"],
+                args.get("profile_tasks"),
+                args.get("profile_every"),
+            )
+            cw_logging.getLogger().info("Profiling {} tasks".format(n))
+
         # Handle SLURM execution
         if args["slurm"]:
             s = scheduler.SlurmScheduler(self.config)
@@ -91,17 +112,39 @@ class ClusterWork:
 
         self._run_scheduler(s, root_dir)
 
-    def load(self, root_dir: str = ""):
+        if not args["slurm"] and cw_trace.trace_dir() is not None:
+            trace = cw_trace.merge(cw_trace.trace_dir())
+            cw_logging.getLogger().info("Trace written to {}".format(trace))
+
+    def load(
+        self,
+        root_dir: str = "",
+        n_workers: int = None,
+        backend: str = "thread",
+        incremental: bool = False,
+        lazy: bool = False,
+    ):
         """Loads all saved information.
 
         Args:
             root_dir (str, optional): [description]. Defaults to "".
+            n_workers (int, optional): number of parallel loading workers. 1 loads sequentially. Defaults to None.
+            backend (str, optional): "thread" or "process" worker pool. Defaults to "thread".
+            incremental (bool, optional): keep a consolidated result store in the output directory and only read new or changed repetitions. Defaults to False.
+            lazy (bool, optional): only load parameters and light handles to the logger results. Read them on demand with df.cw2.load_logs(). Defaults to False.
 
         Returns:
             pd.DataFrame: saved data in Dataframe form.
         """
+        store_dir = None
+        if incremental:
+            store_dir = os.path.join(
+                root_dir, self.config.exp_configs[0][KEYS.i_BASIC_PATH], ".cw2_store"
+            )
 
-        loader = cw_loading.Loader()
+        loader = cw_loading.Loader(
+            n_workers=n_workers, backend=backend, store_dir=store_dir, lazy=lazy
+        )
 
         return self._run_scheduler(loader, root_dir, True)
 
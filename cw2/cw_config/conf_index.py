@@ -0,0 +1,163 @@
+import json
+import os
+import time
+from typing import Dict, List, Set, Tuple
+
+from cw2.cw_config import conf_io, conf_path
+from cw2.cw_config import cw_conf_keys as KEY
+
+INDEX_FILE = "index.jsonl"
+COMPLETED_FILE = "completed.jsonl"
+# completion marker in the repetition directory, for the other layouts
+REP_COMPLETED_FILE = "completed.json"
+
+# completion log cache: path -> (mtime_ns, size, completed set)
+_completed_cache = {}
+
+
+def write_index(exp_configs: List[Dict], root_dir: str = "") -> List[str]:
+    """write the index files of all experiments with sharded layout.
+    Each line maps a task id to the name, parameters and relative path of a parameter setting.
+
+    Args:
+        exp_configs (List[Dict]): expanded and unrolled experiment configs
+        root_dir (str, optional): root directory of the experiment output. Defaults to "".
+
+    Returns:
+        List[str]: paths of the written index files
+    """
+    grouped = {}
+    for c in exp_configs:
+        if not conf_path.is_sharded(c) or c[KEY.i_REP_IDX] != 0:
+            continue
+        exp_dir = os.path.join(root_dir, conf_path.experiment_dir(c))
+        grouped.setdefault(exp_dir, []).append(
+            {
+                "id": c[KEY.i_TASK_ID],
+                "name": c[KEY.i_EXP_NAME],
+                "params": c.get(KEY.PARAMS, {}),
+                "path": os.path.relpath(c[KEY.PATH], conf_path.experiment_dir(c)),
+                KEY.REPS: c[KEY.REPS],
+            }
+        )
+
+    written = []
+    for exp_dir, entries in grouped.items():
+        fpath = os.path.join(exp_dir, INDEX_FILE)
+        conf_io.write_once(
+            fpath,
+            conf_io.content_hash(entries),
+            lambda f, entries=entries: f.writelines(
+                json.dumps(e, default=repr) + "\n" for e in entries
+            ),
+        )
+        written.append(fpath)
+    return written
+
+
+def read_index(exp_dir: str) -> Dict[str, Dict]:
+    """
+    Args:
+        exp_dir (str): experiment directory
+
+    Returns:
+        Dict[str, Dict]: index entries by task id
+    """
+    res = {}
+    with open(os.path.join(exp_dir, INDEX_FILE)) as f:
+        for line in f:
+            e = json.loads(line)
+            res[e["id"]] = e
+    return res
+
+
+def mark_completed(config: Dict, status: str, root_dir: str = "") -> None:
+    """record a finished repetition. With the sharded layout, it is appended to the completion log of its experiment.
+    Single short lines are appended with O_APPEND, so parallel tasks do not need a lock.
+    Otherwise a completion marker is written into the repetition directory.
+
+    Args:
+        config (Dict): task config
+        status (str): "done", "surrender" or "crash"
+        root_dir (str, optional): root directory of the experiment output. Defaults to "".
+    """
+    if not conf_path.is_sharded(config):
+        rep_path = os.path.join(root_dir, config[KEY.i_REP_LOG_PATH])
+        with open(os.path.join(rep_path, REP_COMPLETED_FILE), "w") as f:
+            json.dump({"r": config[KEY.i_REP_IDX], "status": status, "ts": time.time()}, f)
+        return
+
+    line = json.dumps(
+        {
+            "id": config[KEY.i_TASK_ID],
+            "r": config[KEY.i_REP_IDX],
+            "status": status,
+            "ts": time.time(),
+        }
+    )
+    fpath = os.path.join(root_dir, conf_path.experiment_dir(config), COMPLETED_FILE)
+    fd = os.open(fpath, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, (line + "\n").encode("utf-8"))
+    finally:
+        os.close(fd)
+
+
+def completed(exp_dir: str) -> Set[Tuple[str, int]]:
+    """read the completion log of an experiment. The log is only re-read when it changed.
+
+    Args:
+        exp_dir (str): experiment directory
+
+    Returns:
+        Set[Tuple[str, int]]: (task id, repetition) of all completed repetitions
+    """
+    fpath = os.path.join(exp_dir, COMPLETED_FILE)
+    try:
+        st = os.stat(fpath)
+    except FileNotFoundError:
+        return set()
+
+    cached = _completed_cache.get(fpath)
+    if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+
+    res = set()
+    with open(fpath) as f:
+        for line in f:
+            try:
+                e = json.loads(line)
+            except ValueError:
+                # line of a concurrent writer, not yet complete
+                continue
+            res.add((e["id"], e["r"]))
+    _completed_cache[fpath] = (st.st_mtime_ns, st.st_size, res)
+    return res
+
+
+def unmark_completed(config: Dict, root_dir: str = "") -> None:
+    """remove the completion marker of a repetition which is run again. The completion log of the sharded layout is append-only.
+
+    Args:
+        config (Dict): task config
+        root_dir (str, optional): root directory of the experiment output. Defaults to "".
+    """
+    if conf_path.is_sharded(config):
+        return
+    try:
+        os.remove(os.path.join(root_dir, config[KEY.i_REP_LOG_PATH], REP_COMPLETED_FILE))
+    except FileNotFoundError:
+        pass
+
+
+def is_completed(config: Dict, root_dir: str = "") -> bool:
+    """
+    Args:
+        config (Dict): task config with sharded layout
+        root_dir (str, optional): root directory of the experiment output. Defaults to "".
+
+    Returns:
+        bool: True if the repetition was already run
+    """
+    exp_dir = os.path.join(root_dir, conf_path.experiment_dir(config))
+    return (config[KEY.i_TASK_ID], config[KEY.i_REP_IDX]) in completed(exp_dir)
@@ -1,3 +1,5 @@
+import hashlib
+import json
 import os
 from typing import List, Tuple
 
@@ -6,6 +8,9 @@ import yaml
 from cw2.cw_config import cw_conf_keys as KEY
 from cw2.cw_error import ExperimentNotFoundError, MissingConfigError
 
+# libyaml based dumper is considerably faster for large expanded configs
+_Dumper = getattr(yaml, "CDumper", yaml.Dumper)
+
 
 def get_configs(
     config_path: str, experiment_selections: List[str]
@@ -77,13 +82,107 @@ def separate_configs(
     return slurm_config, default_config, experiment_configs
 
 
-def write_yaml(fpath, data):
-    """write a yaml file
+def content_hash(data) -> str:
+    """stable hash of a yaml payload.
+
+    Args:
+        data : list of yaml documents
+
+    Returns:
+        str: sha256 hex digest
+    """
+    h = hashlib.sha256()
+    # hash document by document, so large payloads are never serialized as a whole
+    for doc in data:
+        try:
+            dump = _json_dump(doc)
+        except TypeError:
+            # keys of mixed types, e.g. {1: a, b: c}, cannot be sorted
+            dump = _json_dump(_repr_keys(doc))
+        h.update(dump.encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+def _json_dump(doc) -> str:
+    return json.dumps(doc, sort_keys=True, default=repr, separators=(",", ":"))
+
+
+def _repr_keys(obj):
+    """replaces all dictionary keys by their repr, so 1 and "1" stay distinct."""
+    if isinstance(obj, dict):
+        return {repr(k): _repr_keys(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_repr_keys(v) for v in obj]
+    return obj
+
+
+def _hash_path(fpath: str) -> str:
+    d, f = os.path.split(fpath)
+    return os.path.join(d, ".{}.sha256".format(f))
+
+
+def _atomic_write(fpath: str, write_fn) -> None:
+    tmp = "{}.tmp.{}".format(fpath, os.getpid())
+    try:
+        with open(tmp, "w") as f:
+            write_fn(f)
+        os.replace(tmp, fpath)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def write_once(fpath: str, digest: str, write_fn) -> bool:
+    """write a file only if its content changed.
+    The content hash is stored in a hidden sidecar file, together with the modification time and size
+    of the written file, so a deleted or hand-edited file is written again. The file is written atomically,
+    so concurrent writers never leave a partial file.
+
+    Args:
+        fpath (str): path
+        digest (str): content hash of the payload
+        write_fn: function writing the payload to an open file
+
+    Returns:
+        bool: True if the file was written, False if an identical file exists
+    """
+    hash_path = _hash_path(fpath)
+    try:
+        with open(hash_path) as f:
+            if f.read().strip() == _file_signature(fpath, digest):
+                return False
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(os.path.dirname(fpath), exist_ok=True)
+    _atomic_write(fpath, write_fn)
+    signature = _file_signature(fpath, digest)
+    _atomic_write(hash_path, lambda f: f.write(signature + "\n"))
+    return True
+
+
+def _file_signature(fpath: str, digest: str) -> str:
+    try:
+        st = os.stat(fpath)
+    except FileNotFoundError:
+        return ""
+    return "{} {} {}".format(digest, st.st_mtime_ns, st.st_size)
+
+
+def write_yaml(fpath, data) -> bool:
+    """write a yaml file.
+    The file is a write-once snapshot: if an identical payload was already written, nothing is done.
 
     Args:
         fpath : path
         data : payload
+
+    Returns:
+        bool: True if the file was written, False if an identical snapshot exists
     """
-    os.makedirs(os.path.dirname(fpath), exist_ok=True)
-    with open(fpath, "w") as f:
-        yaml.dump_all(data, f, default_flow_style=False)
+    return write_once(
+        fpath,
+        content_hash(data),
+        lambda f: yaml.dump_all(data, f, Dumper=_Dumper, default_flow_style=False),
+    )
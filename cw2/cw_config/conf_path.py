@@ -1,3 +1,5 @@
+import hashlib
+import json
 import os
 from typing import Any, Dict, List
 
@@ -17,13 +19,71 @@ def normalize_expanded_paths(
     """
     # Set Path and LogPath Args depending on the name
     for _config in expanded_config_list:
-        _config[KEY.PATH] = os.path.join(
-            _config[KEY.i_BASIC_PATH], _config[KEY.i_NEST_DIR], _config[KEY.i_EXP_NAME]
-        )
+        if is_sharded(_config):
+            _config[KEY.i_TASK_ID] = task_id(_config)
+            _config[KEY.PATH] = sharded_path(_config)
+        else:
+            _config[KEY.PATH] = os.path.join(
+                _config[KEY.i_BASIC_PATH],
+                _config[KEY.i_NEST_DIR],
+                _config[KEY.i_EXP_NAME],
+            )
         _config[KEY.LOG_PATH] = os.path.join(_config[KEY.PATH], "log")
     return expanded_config_list
 
 
+def is_sharded(config: Dict[str, Any]) -> bool:
+    """
+    Args:
+        config (Dict[str, Any]): experiment config
+
+    Returns:
+        bool: True if the experiment uses the sharded directory layout
+    """
+    return config.get(KEY.LAYOUT, KEY.LAYOUT_NESTED) == KEY.LAYOUT_SHARDED
+
+
+def task_id(config: Dict[str, Any]) -> str:
+    """short id of an expanded parameter setting, derived from its name and parameters.
+
+    Args:
+        config (Dict[str, Any]): expanded experiment config
+
+    Returns:
+        str: 16 hex characters
+    """
+    key = json.dumps(
+        [config[KEY.NAME], config[KEY.i_EXP_NAME], config.get(KEY.PARAMS, {})],
+        sort_keys=True,
+        default=repr,
+    )
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def experiment_dir(config: Dict[str, Any]) -> str:
+    """
+    Args:
+        config (Dict[str, Any]): expanded experiment config
+
+    Returns:
+        str: directory of the experiment, containing all parameter settings
+    """
+    return os.path.join(config[KEY.i_BASIC_PATH], config[KEY.NAME])
+
+
+def sharded_path(config: Dict[str, Any]) -> str:
+    """path of a parameter setting in the sharded layout: <path>/<name>/ab/cd/abcd...
+
+    Args:
+        config (Dict[str, Any]): expanded experiment config with task id
+
+    Returns:
+        str: path of the parameter setting
+    """
+    t = config[KEY.i_TASK_ID]
+    return os.path.join(experiment_dir(config), t[:2], t[2:4], t)
+
+
 def make_rel_paths(config: Dict[str, Any], base_path: str) -> Dict[str, Any]:
     """converts relevant paths of the config into relative paths
 
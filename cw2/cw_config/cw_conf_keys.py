@@ -7,6 +7,15 @@ NAME = "name"
 PATH = "path"
 LOG_PATH = "log_path"
 
+LAYOUT = "layout"
+LAYOUT_NESTED = "nested"
+LAYOUT_SHARDED = "sharded"
+
+TIMING = "timing"
+RESOURCES = "resources"
+SCRATCH = "scratch"
+CHECKPOINT = "checkpoint"
+
 IMPORT_PATH = "import_path"
 IMPORT_EXP = "import_exp"
 
@@ -14,6 +23,7 @@ IMPORT_EXP = "import_exp"
 REPS = "repetitions"
 REPS_PARALL = "reps_in_parallel"
 REPS_P_JOB = "reps_per_job"
+REPS_BATCHED = "reps_batched"
 
 # EXP PARAMS
 PARAMS = "params"
@@ -25,10 +35,13 @@ ABLATIVE = "ablative"
 i_BASIC_PATH = "_basic_path"
 i_EXP_NAME = "_experiment_name"
 i_NEST_DIR = "_nested_dir"
+i_TASK_ID = "_task_id"
 i_DEBUG_FLAG = "_debug"
+i_PROFILE = "_profile"
 # INTERNAL REP
 i_REP_IDX = "_rep_idx"
 i_REP_LOG_PATH = "_rep_log_path"
+i_FINAL_REP_LOG_PATH = "_final_rep_log_path"
 
 # INTERNAL IMPORT ARCHIVE
 i_IMPORT_PATH_ARCHIVE = "_import_path_archive"
@@ -1,5 +1,6 @@
 import os
 import socket
+import sys
 from typing import List, Tuple
 from datetime import datetime
 
@@ -66,14 +67,18 @@ class Config:
         default_conf = None
         specific_conf = None
         hostname = socket.gethostname().lower()
-        print("Hostname: {}".format(hostname))
+        # stderr, so stdout stays machine readable, e.g. for --dry-run json
+        print("Hostname: {}".format(hostname), file=sys.stderr)
         for c in slurm_configs:
-            print("Found slurm config: {}".format(c[KEY.NAME]))
+            print("Found slurm config: {}".format(c[KEY.NAME]), file=sys.stderr)
             if c[KEY.NAME].lower() == KEY.SLURM.lower():
-                print("Seeting default slurm config")
+                print("Setting default slurm config", file=sys.stderr)
                 default_conf = c
             elif c[KEY.NAME].split("_")[1].lower() in hostname:
-                print("Setting specific slurm config: {}".format(c[KEY.NAME]))
+                print(
+                    "Setting specific slurm config: {}".format(c[KEY.NAME]),
+                    file=sys.stderr,
+                )
                 specific_conf = c
                 specific_conf[KEY.NAME] = KEY.SLURM
 
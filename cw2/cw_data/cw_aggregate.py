@@ -0,0 +1,152 @@
+import warnings
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def rep_arrays(
+    log: pd.DataFrame, metrics: List[str], iter_col: str = "iter"
+) -> Tuple[np.ndarray, np.ndarray]:
+    """extracts the iteration positions and metric values of a single repetition log.
+
+    Args:
+        log (pd.DataFrame): repetition log, e.g. from the PandasLogger
+        metrics (List[str]): metric columns. Missing columns are NaN.
+        iter_col (str, optional): iteration column. Row order is used if missing. Defaults to "iter".
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: iteration positions (n,), metric values (n, metrics)
+    """
+    if iter_col in log.columns:
+        pos = log[iter_col].to_numpy(dtype=np.int64)
+    else:
+        pos = np.arange(len(log))
+    vals = log.reindex(columns=metrics).to_numpy(dtype=np.float64, na_value=np.nan)
+    return pos, vals
+
+
+def stack_reps(
+    reps: List[Tuple[np.ndarray, np.ndarray]],
+    n_iter: int = None,
+) -> np.ndarray:
+    """stacks repetitions into a dense reps x iterations x metrics array.
+    Uneven repetitions are padded with NaN.
+
+    Args:
+        reps (List[Tuple[np.ndarray, np.ndarray]]): (positions, values) per repetition, see rep_arrays()
+        n_iter (int, optional): number of iterations. Defaults to the longest repetition.
+
+    Returns:
+        np.ndarray: dense array
+    """
+    n_metrics = reps[0][1].shape[1] if len(reps) > 0 else 0
+    if n_iter is None:
+        n_iter = max([p.max() + 1 for p, _ in reps if len(p) > 0], default=0)
+
+    stack = np.full((len(reps), n_iter, n_metrics), np.nan)
+    for i, (pos, vals) in enumerate(reps):
+        stack[i, pos] = vals
+    return stack
+
+
+def summarize(
+    stack: np.ndarray, quantiles: Iterable[float] = (), axis: int = 0
+) -> Dict[str, np.ndarray]:
+    """computes NaN-aware statistics over the repetition axis.
+
+    Args:
+        stack (np.ndarray): dense array, see stack_reps()
+        quantiles (Iterable[float], optional): quantiles in [0, 1]. Defaults to ().
+        axis (int, optional): repetition axis. Defaults to 0.
+
+    Returns:
+        Dict[str, np.ndarray]: statistic name -> reduced array
+    """
+    count = np.sum(~np.isnan(stack), axis=axis)
+    stats = {"count": count}
+
+    # All-NaN slices are expected for padded iterations
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        stats["mean"] = np.nanmean(stack, axis=axis)
+        stats["std"] = np.nanstd(stack, axis=axis, ddof=1)
+        stats["min"] = np.nanmin(stack, axis=axis)
+        stats["max"] = np.nanmax(stack, axis=axis)
+        quantiles = list(quantiles)
+        if len(quantiles) > 0:
+            qs = np.nanquantile(stack, quantiles, axis=axis)
+            for q, v in zip(quantiles, qs):
+                stats["q{:g}".format(q * 100)] = v
+    return stats
+
+
+def aggregate(
+    logs: List[pd.DataFrame],
+    group_codes: np.ndarray,
+    metrics: List[str],
+    quantiles: Iterable[float] = (),
+    iter_col: str = "iter",
+    max_cells: int = 2**25,
+) -> pd.DataFrame:
+    """computes per iteration statistics across the repetitions of each group.
+    Groups are stacked into dense groups x reps x iterations x metrics arrays, in chunks of at most max_cells values.
+
+    Args:
+        logs (List[pd.DataFrame]): repetition logs
+        group_codes (np.ndarray): group number 0..G-1 of each log
+        metrics (List[str]): metric columns
+        quantiles (Iterable[float], optional): quantiles in [0, 1]. Defaults to ().
+        iter_col (str, optional): iteration column. Defaults to "iter".
+        max_cells (int, optional): memory bound for a single chunk. Defaults to 2**25.
+
+    Returns:
+        pd.DataFrame: index (group, iter), columns (metric, statistic)
+    """
+    reps = [rep_arrays(l, metrics, iter_col) for l in logs]
+    n_groups = int(group_codes.max()) + 1 if len(reps) > 0 else 0
+    n_iter = max([p.max() + 1 for p, _ in reps if len(p) > 0], default=0)
+
+    members = [[] for _ in range(n_groups)]
+    for i, g in enumerate(group_codes):
+        members[g].append(i)
+
+    frames = []
+    start = 0
+    while start < n_groups:
+        # Grow the chunk of groups until the dense array exceeds the memory bound
+        stop = start + 1
+        width = len(members[start])
+        while stop < n_groups:
+            new_width = max(width, len(members[stop]))
+            if (stop + 1 - start) * new_width * n_iter * len(metrics) > max_cells:
+                break
+            width = new_width
+            stop += 1
+
+        dense = np.full((stop - start, width, n_iter, len(metrics)), np.nan)
+        for g in range(start, stop):
+            group_reps = [reps[i] for i in members[g]]
+            dense[g - start, : len(group_reps)] = stack_reps(group_reps, n_iter)
+
+        stats = summarize(dense, quantiles, axis=1)
+        columns = pd.MultiIndex.from_product(
+            [metrics, list(stats.keys())], names=["metric", "stat"]
+        )
+        # (groups, iter, metric, stat) -> (groups * iter, metric * stat)
+        values = np.stack(list(stats.values()), axis=-1).reshape(
+            (stop - start) * n_iter, -1
+        )
+        index = pd.MultiIndex.from_product(
+            [range(start, stop), range(n_iter)], names=["group", iter_col]
+        )
+        frames.append(pd.DataFrame(values, index=index, columns=columns))
+        start = stop
+
+    if len(frames) == 0:
+        return pd.DataFrame()
+
+    # Drop padded iterations, which no repetition of the group reached
+    df = pd.concat(frames)
+    reached = (df.xs("count", axis=1, level="stat") > 0).any(axis=1)
+    return df[reached]
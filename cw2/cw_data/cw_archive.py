@@ -0,0 +1,353 @@
+import datetime
+import os
+import shutil
+import struct
+import threading
+import zipfile
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from cw2.cw_config import conf_index, conf_path
+from cw2.cw_config import cw_conf_keys as KEYS
+from cw2.cw_config import cw_config
+
+ARCHIVE_NAME = "archive.cw2.zip"
+
+# members with these suffixes are stored uncompressed, so they can be memory-mapped
+STORED_SUFFIXES = (".bin",)
+
+# open archives: archive path -> (pid, mtime_ns, size, _Archive)
+_archives = {}
+_lock = threading.Lock()
+
+
+class _Archive:
+    """internal class. An open archive with a directory tree of its members."""
+
+    def __init__(self, archive_path: str):
+        self.zf = zipfile.ZipFile(archive_path, "r")
+        self.children = {}
+        for name in self.zf.NameToInfo:
+            parts = name.split("/")
+            for i in range(len(parts)):
+                self.children.setdefault("/".join(parts[:i]), set()).add(parts[i])
+
+    def contains(self, member: str) -> bool:
+        return member in self.zf.NameToInfo or member in self.children
+
+
+def _open_archive(archive_path: str) -> _Archive:
+    """internal function. opens an archive once per process and reopens it when it was rewritten."""
+    st = os.stat(archive_path)
+    key = (os.getpid(), st.st_mtime_ns, st.st_size)
+    with _lock:
+        cached = _archives.get(archive_path)
+        if cached is not None and cached[:3] == key:
+            return cached[3]
+        archive = _Archive(archive_path)
+        _archives[archive_path] = key + (archive,)
+        return archive
+
+
+def locate(path: str) -> Optional[Tuple[_Archive, str]]:
+    """find the archive containing a file or directory which is missing from the loose layout.
+    Archives are searched in the parent directories of the path.
+
+    Args:
+        path (str): path in the loose layout
+
+    Returns:
+        Optional[Tuple[_Archive, str]]: (archive, member name), None if no archive contains the path
+    """
+    path = os.path.abspath(path)
+    d = os.path.dirname(path)
+    while True:
+        archive_path = os.path.join(d, ARCHIVE_NAME)
+        if os.path.isfile(archive_path):
+            member = os.path.relpath(path, d).replace(os.sep, "/")
+            archive = _open_archive(archive_path)
+            if archive.contains(member):
+                return archive, member
+        parent = os.path.dirname(d)
+        if parent == d:
+            return None
+        d = parent
+
+
+def exists(path: str) -> bool:
+    """
+    Args:
+        path (str): file or directory path
+
+    Returns:
+        bool: True if the path exists in the loose layout or in an archive
+    """
+    return os.path.exists(path) or locate(path) is not None
+
+
+def open_file(path: str):
+    """open a file for binary reading, from the loose layout or from an archive.
+
+    Args:
+        path (str): file path in the loose layout
+
+    Raises:
+        FileNotFoundError: if the file is neither loose nor archived
+
+    Returns:
+        binary file object
+    """
+    try:
+        return open(path, "rb")
+    except FileNotFoundError:
+        loc = locate(path)
+        if loc is None or loc[1] not in loc[0].zf.NameToInfo:
+            raise
+        return loc[0].zf.open(loc[1])
+
+
+def entries(path: str) -> List[List]:
+    """list the files directly in a directory, merging the loose layout and the archive.
+    Loose files take precedence over archived files with the same name.
+
+    Args:
+        path (str): directory path in the loose layout
+
+    Returns:
+        List[List]: sorted [name, mtime_ns, size] entries
+    """
+    res = {}
+    loc = locate(path)
+    if loc is not None:
+        archive, member = loc
+        for name in archive.children.get(member, ()):
+            info = archive.zf.NameToInfo.get(member + "/" + name)
+            if info is not None:
+                mtime = datetime.datetime(*info.date_time).timestamp()
+                res[name] = [name, int(mtime * 1e9), info.file_size]
+    try:
+        for e in os.scandir(path):
+            if e.is_file():
+                st = e.stat()
+                res[e.name] = [e.name, st.st_mtime_ns, st.st_size]
+    except FileNotFoundError:
+        pass
+    return sorted(res.values())
+
+
+def listdir(path: str) -> List[str]:
+    """
+    Args:
+        path (str): directory path in the loose layout
+
+    Returns:
+        List[str]: names of the entries of the directory. The archive is only searched if the loose directory is empty.
+    """
+    try:
+        names = os.listdir(path)
+    except FileNotFoundError:
+        names = []
+    if len(names) > 0:
+        return sorted(names)
+    loc = locate(path)
+    if loc is None:
+        return []
+    return sorted(loc[0].children.get(loc[1], ()))
+
+
+def memmap(path: str) -> np.ndarray:
+    """map a binary file read-only. Uncompressed archive members are mapped directly from the archive,
+    compressed members are read into memory.
+
+    Args:
+        path (str): file path in the loose layout
+
+    Returns:
+        np.ndarray: uint8 buffer
+    """
+    if os.path.exists(path):
+        return np.memmap(path, dtype=np.uint8, mode="r")
+    loc = locate(path)
+    if loc is None:
+        raise FileNotFoundError(path)
+    archive, member = loc
+    archive_path = archive.zf.filename
+    info = archive.zf.getinfo(member)
+    if info.compress_type != zipfile.ZIP_STORED:
+        return np.frombuffer(archive.zf.read(member), dtype=np.uint8)
+    if info.file_size == 0:
+        return np.zeros(0, dtype=np.uint8)
+
+    # skip the local file header to find the raw member data
+    with open(archive_path, "rb") as f:
+        f.seek(info.header_offset)
+        header = f.read(30)
+    name_len, extra_len = struct.unpack("<HH", header[26:30])
+    offset = info.header_offset + 30 + name_len + extra_len
+    return np.memmap(
+        archive_path, dtype=np.uint8, mode="r", offset=offset, shape=(info.file_size,)
+    )
+
+
+def pack(directory: str, subdirs_only: bool = False, remove: bool = True) -> Dict:
+    """pack the files of a directory into its archive. An existing archive is merged,
+    loose files replace archived files of the same name.
+    The new archive is written to a temporary file, verified and renamed, before loose files are removed.
+
+    Args:
+        directory (str): directory to pack
+        subdirs_only (bool, optional): only pack files in subdirectories, top level files stay loose. Defaults to False.
+        remove (bool, optional): remove the packed loose files and empty directories. Defaults to True.
+
+    Returns:
+        Dict: archive path, number of packed files, loose bytes and archive bytes
+    """
+    archive_path = os.path.join(directory, ARCHIVE_NAME)
+    loose = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        if subdirs_only and root == directory:
+            continue
+        for fname in sorted(files):
+            fpath = os.path.join(root, fname)
+            if fpath == archive_path or fname.startswith(ARCHIVE_NAME):
+                continue
+            loose.append(
+                (fpath, os.path.relpath(fpath, directory).replace(os.sep, "/"))
+            )
+
+    stats = {"archive": archive_path, "files": len(loose), "bytes": 0}
+    if len(loose) > 0:
+        members = set(m for _, m in loose)
+        tmp_path = archive_path + ".tmp"
+        with zipfile.ZipFile(tmp_path, "w", allowZip64=True) as out:
+            if os.path.exists(archive_path):
+                with zipfile.ZipFile(archive_path, "r") as old:
+                    for info in old.infolist():
+                        if info.filename in members:
+                            continue
+                        with old.open(info) as src, out.open(
+                            info, "w", force_zip64=True
+                        ) as dst:
+                            shutil.copyfileobj(src, dst)
+            for fpath, member in loose:
+                stats["bytes"] += os.path.getsize(fpath)
+                out.write(fpath, member, compress_type=_compression(member))
+
+        with zipfile.ZipFile(tmp_path, "r") as check:
+            bad = check.testzip()
+        if bad is not None:
+            os.remove(tmp_path)
+            raise IOError("Corrupt member {} in {}".format(bad, tmp_path))
+        os.replace(tmp_path, archive_path)
+
+        if remove:
+            for fpath, _ in loose:
+                os.remove(fpath)
+            _remove_empty_dirs(directory)
+
+    stats["archive_bytes"] = (
+        os.path.getsize(archive_path) if os.path.exists(archive_path) else 0
+    )
+    return stats
+
+
+def _compression(member: str) -> int:
+    if member.endswith(STORED_SUFFIXES):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def _remove_empty_dirs(directory: str) -> None:
+    for root, dirs, files in os.walk(directory, topdown=False):
+        if root != directory and not os.listdir(root):
+            os.rmdir(root)
+
+
+def is_finished(config: Dict, root_dir: str = "") -> bool:
+    """checks if a repetition has finished. With the sharded layout, the completion log is read.
+    Otherwise the completion marker in the repetition directory is looked up. A running repetition already has
+    files, but no marker.
+
+    Args:
+        config (Dict): task config
+        root_dir (str, optional): root directory of the experiment output. Defaults to "".
+
+    Returns:
+        bool: True if the repetition has finished
+    """
+    if conf_path.is_sharded(config):
+        return conf_index.is_completed(config, root_dir)
+    return exists(
+        os.path.join(root_dir, config[KEYS.i_REP_LOG_PATH], conf_index.REP_COMPLETED_FILE)
+    )
+
+
+def compact(
+    conf: cw_config.Config, root_dir: str = "", force: bool = False, remove: bool = True
+) -> List[Dict]:
+    """pack every finished experiment of a configuration into one archive per experiment.
+    Unfinished experiments are skipped. If all experiments are finished, the SLURM logs are packed as well.
+
+    Args:
+        conf (cw_config.Config): configuration
+        root_dir (str, optional): root directory of the experiment output. Defaults to "".
+        force (bool, optional): also pack unfinished experiments. Defaults to False.
+        remove (bool, optional): remove the packed loose files. Defaults to True.
+
+    Returns:
+        List[Dict]: one result per experiment and SLURM log directory
+    """
+    grouped = {}
+    for c in conf.exp_configs:
+        grouped.setdefault(c[KEYS.NAME], []).append(c)
+
+    results = []
+    all_packed = True
+    for name, configs in grouped.items():
+        exp_dir = os.path.join(root_dir, conf_path.experiment_dir(configs[0]))
+        pending = sum(not is_finished(c, root_dir) for c in configs)
+        if pending > 0 and not force:
+            all_packed = False
+            results.append({"name": name, "skipped": "{} unfinished".format(pending)})
+            continue
+        if not os.path.isdir(exp_dir):
+            results.append({"name": name, "skipped": "no output"})
+            continue
+        res = pack(exp_dir, subdirs_only=True, remove=remove)
+        res["name"] = name
+        results.append(res)
+
+    if len(grouped) > 0 and all_packed:
+        slurm_log = (conf.slurm_config or {}).get(
+            "slurm_log",
+            os.path.join(conf.exp_configs[0][KEYS.i_BASIC_PATH], "slurmlog"),
+        )
+        slurm_log = os.path.join(root_dir, slurm_log)
+        if os.path.isdir(slurm_log):
+            res = pack(slurm_log, remove=remove)
+            res["name"] = "slurmlog"
+            results.append(res)
+    return results
+
+
+def format_table(results: List[Dict]) -> str:
+    """
+    Args:
+        results (List[Dict]): results of compact()
+
+    Returns:
+        str: one line per experiment
+    """
+    lines = []
+    for r in results:
+        if "skipped" in r:
+            lines.append("{:<30} skipped ({})".format(r["name"], r["skipped"]))
+        else:
+            lines.append(
+                "{:<30} {:>8} files {:>12} B -> {}".format(
+                    r["name"], r["files"], r["bytes"], r["archive"]
+                )
+            )
+    return "\n".join(lines)
@@ -0,0 +1,169 @@
+import json
+import os
+import re
+import shutil
+from typing import Dict, List
+
+import numpy as np
+
+from cw2.cw_data import cw_archive
+
+
+class ArrayRef:
+    """Reference to an array in an ArrayStore.
+    Stored in the tabular logs instead of the array itself.
+    """
+
+    def __init__(self, key: str, file: str, offset: int, dtype: str, shape: tuple):
+        self.key = key
+        self.file = file
+        self.offset = offset
+        self.dtype = dtype
+        self.shape = tuple(shape)
+
+    @property
+    def nbytes(self) -> int:
+        return int(np.prod(self.shape, dtype=np.int64)) * np.dtype(self.dtype).itemsize
+
+    def load(self, rep_path: str, mmap: bool = True) -> np.ndarray:
+        """read the referenced array.
+
+        Args:
+            rep_path (str): repetition directory of the store
+            mmap (bool, optional): memory-map the array read-only instead of reading it. Defaults to True.
+
+        Returns:
+            np.ndarray: the array
+        """
+        fpath = os.path.join(rep_path, self.file)
+        if mmap:
+            buf = cw_archive.memmap(fpath)
+        else:
+            with cw_archive.open_file(fpath) as f:
+                f.seek(self.offset)
+                buf = np.frombuffer(f.read(self.nbytes), dtype=np.uint8)
+            return buf.view(self.dtype).reshape(self.shape)
+        return _view(buf, self)
+
+    def __repr__(self) -> str:
+        return "ArrayRef({}@{})".format(self.file, self.offset)
+
+
+class ArrayStore:
+    """Append-only, chunked binary store for the array-valued results of a single repetition.
+    Arrays are appended as raw bytes to chunk files in the "arrays" subdirectory,
+    described by a JSON lines index.
+    """
+
+    DIR = "arrays"
+    INDEX = "index.jsonl"
+
+    def __init__(self, rep_path: str, chunk_bytes: int = 64 * 2**20):
+        """
+        Args:
+            rep_path (str): repetition directory
+            chunk_bytes (int, optional): a new chunk file is started when a chunk would exceed this size. Defaults to 64 MiB.
+        """
+        self.rep_path = rep_path
+        self.chunk_bytes = chunk_bytes
+        self._chunks = {}
+
+    def clear(self) -> None:
+        """remove all arrays of a previous run."""
+        shutil.rmtree(os.path.join(self.rep_path, self.DIR), ignore_errors=True)
+        self._chunks = {}
+
+    @staticmethod
+    def is_array(value) -> bool:
+        """checks if a value should be stored out-of-line.
+
+        Args:
+            value: logged value
+
+        Returns:
+            bool: True for non-empty, non-scalar arrays of a fixed size dtype
+        """
+        return (
+            isinstance(value, np.ndarray)
+            and value.ndim > 0
+            and value.size > 0
+            and not value.dtype.hasobject
+        )
+
+    def append(self, key: str, value: np.ndarray, n: int = None) -> ArrayRef:
+        """append an array to the chunk file of its key.
+
+        Args:
+            key (str): result key
+            value (np.ndarray): array
+            n (int, optional): iteration, stored in the index. Defaults to None.
+
+        Returns:
+            ArrayRef: reference to the stored array
+        """
+        value = np.ascontiguousarray(value)
+        chunk, size = self._chunks.get(key, (0, 0))
+        if size > 0 and size + value.nbytes > self.chunk_bytes:
+            chunk, size = chunk + 1, 0
+
+        fname = os.path.join(
+            self.DIR, "{}_{:04d}.bin".format(re.sub(r"[^\w.-]", "_", key), chunk)
+        )
+        os.makedirs(os.path.join(self.rep_path, self.DIR), exist_ok=True)
+        with open(os.path.join(self.rep_path, fname), "ab") as f:
+            offset = f.tell()
+            f.write(value.tobytes())
+
+        ref = ArrayRef(key, fname, offset, value.dtype.str, value.shape)
+        self._chunks[key] = (chunk, offset + value.nbytes)
+
+        with open(os.path.join(self.rep_path, self.DIR, self.INDEX), "a") as f:
+            entry = {"iter": n, "key": key, "file": fname, "offset": offset}
+            entry.update({"dtype": ref.dtype, "shape": list(ref.shape)})
+            f.write(json.dumps(entry) + "\n")
+        return ref
+
+    def index(self) -> List[Dict]:
+        """read the index of all stored arrays.
+
+        Returns:
+            List[Dict]: one entry per array, in order of storage
+        """
+        try:
+            with cw_archive.open_file(
+                os.path.join(self.rep_path, self.DIR, self.INDEX)
+            ) as f:
+                return [json.loads(l) for l in f if l.strip()]
+        except FileNotFoundError:
+            return []
+
+
+def resolve_refs(values, rep_path: str, mmap: bool = True) -> list:
+    """replace ArrayRefs by their arrays. Each chunk file is mapped only once.
+
+    Args:
+        values: iterable of logged values
+        rep_path (str): repetition directory of the store
+        mmap (bool, optional): memory-map the arrays read-only. Defaults to True.
+
+    Returns:
+        list: values with resolved arrays
+    """
+    buffers = {}
+    res = []
+    for v in values:
+        if isinstance(v, ArrayRef):
+            if not mmap:
+                v = v.load(rep_path, mmap=False)
+            else:
+                if v.file not in buffers:
+                    buffers[v.file] = cw_archive.memmap(
+                        os.path.join(rep_path, v.file)
+                    )
+                v = _view(buffers[v.file], v)
+        res.append(v)
+    return res
+
+
+def _view(buf: np.ndarray, ref: ArrayRef) -> np.ndarray:
+    return buf[ref.offset : ref.offset + ref.nbytes].view(ref.dtype).reshape(ref.shape)
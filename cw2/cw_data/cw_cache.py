@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Callable, Dict, List, Union
+
+import numpy as np
+
+from cw2 import util
+from cw2.cw_data import cw_logging
+
+ENV_CACHE_DIR = "CW2_CACHE_DIR"
+ENV_CACHE_BYTES = "CW2_CACHE_BYTES"
+MANIFEST = "manifest.json"
+
+Arrays = Union[np.ndarray, Dict[str, np.ndarray]]
+
+
+def default_dir() -> str:
+    """
+    Returns:
+        str: $CW2_CACHE_DIR, or a per-user directory in the RAM backed /dev/shm or the temp directory
+    """
+    if ENV_CACHE_DIR in os.environ:
+        return os.environ[ENV_CACHE_DIR]
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "cw2_cache_{}".format(os.getuid()))
+
+
+class DatasetCache:
+    """Node-wide cache for NumPy datasets, keyed by a user-provided key.
+    The first process loading a key writes the arrays to the cache directory under a file lock,
+    all processes on the node then memory-map the same files read-only and share their pages.
+    Least recently used entries are evicted when the total size exceeds the limit.
+    """
+
+    def __init__(self, directory: str = None, max_bytes: int = None):
+        """
+        Args:
+            directory (str, optional): node-local cache directory. Defaults to default_dir().
+            max_bytes (int, optional): total size of all entries. Defaults to $CW2_CACHE_BYTES or 16 GiB.
+        """
+        if directory is None:
+            directory = default_dir()
+        if max_bytes is None:
+            max_bytes = int(os.environ.get(ENV_CACHE_BYTES, 16 * 2**30))
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(
+            self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+        )
+
+    def get(self, key: str, loader: Callable[[], Arrays]) -> Arrays:
+        """map the cached arrays of a key. On a miss, the loader is called by exactly one process on the node,
+        the others wait for it.
+
+        Args:
+            key (str): dataset key, e.g. path and preprocessing parameters
+            loader (Callable[[], Arrays]): returns an array or a dict of arrays
+
+        Returns:
+            Arrays: read-only memory-mapped arrays, in the structure returned by the loader
+        """
+        entry = self._entry_path(key)
+        try:
+            return self._map(entry)
+        except FileNotFoundError:
+            pass
+
+        with util.FileLock(entry + ".lock"):
+            # another process might have loaded the key while we waited
+            try:
+                return self._map(entry)
+            except FileNotFoundError:
+                pass
+
+            t = time.perf_counter()
+            data = loader()
+            self._write(entry, key, data)
+            cw_logging.getLogger().info(
+                "Cached {} in {:.2f}s".format(key, time.perf_counter() - t)
+            )
+        self.evict(keep=entry)
+        return self._map(entry)
+
+    def _map(self, entry: str) -> Arrays:
+        with open(os.path.join(entry, MANIFEST)) as f:
+            manifest = json.load(f)
+        # the modification time of the manifest marks the last access for the LRU eviction
+        os.utime(os.path.join(entry, MANIFEST))
+
+        arrays = {
+            name: np.load(os.path.join(entry, "{}.npy".format(i)), mmap_mode="r")
+            for i, name in enumerate(manifest["arrays"])
+        }
+        if manifest["single"]:
+            return arrays[manifest["arrays"][0]]
+        return arrays
+
+    def _write(self, entry: str, key: str, data: Arrays) -> None:
+        single = isinstance(data, np.ndarray)
+        arrays = {"data": data} if single else data
+
+        tmp = "{}.tmp{}".format(entry, os.getpid())
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        nbytes = 0
+        for i, value in enumerate(arrays.values()):
+            value = np.asarray(value)
+            nbytes += value.nbytes
+            np.save(os.path.join(tmp, "{}.npy".format(i)), value, allow_pickle=False)
+        with open(os.path.join(tmp, MANIFEST), "w") as f:
+            json.dump(
+                {
+                    "key": key,
+                    "arrays": list(arrays.keys()),
+                    "single": single,
+                    "nbytes": nbytes,
+                },
+                f,
+            )
+        # publish the entry atomically
+        os.rename(tmp, entry)
+
+    def entries(self) -> List[Dict]:
+        """
+        Returns:
+            List[Dict]: key, path, size and last access of all entries, least recently used first
+        """
+        res = []
+        for name in os.listdir(self.directory):
+            manifest_path = os.path.join(self.directory, name, MANIFEST)
+            try:
+                with open(manifest_path) as f:
+                    manifest = json.load(f)
+                atime = os.stat(manifest_path).st_mtime
+            except (OSError, ValueError):
+                continue
+            res.append(
+                {
+                    "key": manifest["key"],
+                    "path": os.path.join(self.directory, name),
+                    "nbytes": manifest["nbytes"],
+                    "last_access": atime,
+                }
+            )
+        return sorted(res, key=lambda e: e["last_access"])
+
+    def evict(self, keep: str = None) -> List[str]:
+        """remove the least recently used entries until the total size is below the limit.
+        Processes which mapped an evicted entry keep their mapping, the files are freed when it is closed.
+
+        Args:
+            keep (str, optional): path of an entry which is never evicted. Defaults to None.
+
+        Returns:
+            List[str]: keys of the evicted entries
+        """
+        evicted = []
+        with util.FileLock(os.path.join(self.directory, ".evict.lock")):
+            entries = self.entries()
+            total = sum(e["nbytes"] for e in entries)
+            for e in entries:
+                if total <= self.max_bytes:
+                    break
+                if e["path"] == keep:
+                    continue
+                self._remove(e["path"])
+                total -= e["nbytes"]
+                evicted.append(e["key"])
+        return evicted
+
+    def remove(self, key: str) -> None:
+        """remove a single entry.
+
+        Args:
+            key (str): dataset key
+        """
+        self._remove(self._entry_path(key))
+
+    def _remove(self, entry: str) -> None:
+        # rename first, so other processes never see a partially removed entry
+        trash = "{}.evict{}".format(entry, os.getpid())
+        try:
+            os.rename(entry, trash)
+        except FileNotFoundError:
+            return
+        shutil.rmtree(trash, ignore_errors=True)
+
+
+def get(key: str, loader: Callable[[], Arrays], **kwargs) -> Arrays:
+    """map the cached arrays of a key from the default cache.
+
+    Args:
+        key (str): dataset key
+        loader (Callable[[], Arrays]): returns an array or a dict of arrays
+        **kwargs: arguments of DatasetCache
+
+    Returns:
+        Arrays: read-only memory-mapped arrays
+    """
+    return DatasetCache(**kwargs).get(key, loader)
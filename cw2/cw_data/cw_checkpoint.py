@@ -0,0 +1,266 @@
+import json
+import os
+import pickle
+import threading
+import time
+from typing import Any, Optional
+
+from cw2.cw_config import cw_conf_keys as KEYS
+from cw2.cw_data import cw_logging
+
+
+class AsyncWriter:
+    """Writes state snapshots on a background thread.
+    Only the newest pending snapshot is kept, older ones which were not started yet are skipped.
+    """
+
+    def __init__(self, write_fn):
+        """
+        Args:
+            write_fn (Callable[[Any, int], None]): writes a snapshot of an iteration
+        """
+        self.write_fn = write_fn
+        self.skipped = 0
+        self._pending = None
+        self._busy = False
+        self._closed = False
+        self._error = None
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run, name="cw2-checkpoint-writer", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, snapshot: Any, n: int) -> None:
+        with self._cond:
+            self._raise()
+            if self._pending is not None:
+                self.skipped += 1
+            self._pending = (snapshot, n)
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                snapshot, n = self._pending
+                self._pending = None
+                self._busy = True
+            try:
+                self.write_fn(snapshot, n)
+            except BaseException as e:
+                self._error = e
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+    def flush(self) -> None:
+        """wait until all submitted snapshots are written.
+
+        Raises:
+            the exception of a failed write
+        """
+        with self._cond:
+            while self._pending is not None or self._busy:
+                self._cond.wait()
+            self._raise()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _raise(self) -> None:
+        if self._error is not None:
+            e, self._error = self._error, None
+            raise e
+
+
+class Checkpointer:
+    """Decides after which iterations the state of an AbstractIterativeExperiment is saved:
+    every k iterations, every t seconds and / or whenever a metric improved.
+    In asynchronous mode, the state is snapshotted in memory and written on a background thread.
+    """
+
+    META = "checkpoint.json"
+
+    def __init__(
+        self,
+        every: int = None,
+        interval: float = None,
+        best: str = None,
+        mode: str = "min",
+        asynchronous: bool = False,
+        file: str = "state.pkl",
+    ):
+        """
+        Args:
+            every (int, optional): save every k iterations. Defaults to None.
+            interval (float, optional): save if the last save is at least t seconds ago. Defaults to None.
+            best (str, optional): save whenever this result key improved. Defaults to None.
+            mode (str, optional): "min" or "max", direction of improvement of the best metric. Defaults to "min".
+            asynchronous (bool, optional): snapshot the state in memory and write it on a background thread. Defaults to False.
+            file (str, optional): checkpoint file in the repetition directory written in asynchronous mode. Defaults to "state.pkl".
+        """
+        if mode not in ["min", "max"]:
+            raise ValueError("checkpoint mode must be 'min' or 'max', not {}".format(mode))
+        if every is None and interval is None and best is None:
+            every = 1
+        self.every = every
+        self.interval = interval
+        self.best = best
+        self.mode = mode
+        self.asynchronous = asynchronous
+        self.file = file
+
+        self.best_value = None
+        self.last_saved = None
+        self.last_iter = None
+        self.saves = 0
+        self._last_time = time.monotonic()
+        self._writer = None
+        self._exp = None
+        self._args = None
+
+    @staticmethod
+    def from_config(cw_config: dict) -> Optional["Checkpointer"]:
+        """create a checkpointer if the `checkpoint` keyword is set in the configuration.
+
+        Args:
+            cw_config (dict): clusterwork experiment configuration
+
+        Returns:
+            Optional[Checkpointer]: checkpointer or None
+        """
+        conf = cw_config.get(KEYS.CHECKPOINT, False)
+        if not conf:
+            return None
+        if not isinstance(conf, dict):
+            return Checkpointer()
+        conf = dict(conf)
+        conf["asynchronous"] = conf.pop("async", conf.get("asynchronous", False))
+        return Checkpointer(**conf)
+
+    def start(self, exp, cw_config: dict, rep: int) -> None:
+        """
+        Args:
+            exp (AbstractIterativeExperiment): experiment
+            cw_config (dict): clusterwork experiment configuration
+            rep (int): repetition counter
+        """
+        self._exp = exp
+        self._args = (cw_config, rep)
+        self.rep_path = cw_config[KEYS.i_REP_LOG_PATH]
+        if self.asynchronous:
+            self._writer = AsyncWriter(self._write)
+
+    def due(self, n: int, res: dict) -> bool:
+        """
+        Args:
+            n (int): iteration counter
+            res (dict): results of the iteration
+
+        Returns:
+            bool: True if the state should be saved after this iteration
+        """
+        due = False
+        if self.every is not None and (n + 1) % self.every == 0:
+            due = True
+        if self.interval is not None and time.monotonic() - self._last_time >= self.interval:
+            due = True
+        if self.best is not None and self.best in res:
+            value = res[self.best]
+            if (
+                self.best_value is None
+                or (self.mode == "min" and value < self.best_value)
+                or (self.mode == "max" and value > self.best_value)
+            ):
+                self.best_value = value
+                due = True
+        return due
+
+    def step(self, n: int, res: dict) -> None:
+        """called after each iteration. Saves the state if one of the policies is due.
+
+        Args:
+            n (int): iteration counter
+            res (dict): results of the iteration
+        """
+        self.last_iter = n
+        if self.due(n, res):
+            self.save(n)
+
+    def save(self, n: int, sync: bool = False) -> None:
+        """
+        Args:
+            n (int): iteration counter
+            sync (bool, optional): write synchronously, even in asynchronous mode. Defaults to False.
+        """
+        if self.asynchronous:
+            snapshot = self._exp.snapshot_state(*self._args, n)
+            if sync:
+                self._writer.flush()
+                self._write(snapshot, n)
+            else:
+                self._writer.submit(snapshot, n)
+        else:
+            self._exp.save_state(*self._args, n)
+        self.last_saved = n
+        self.saves += 1
+        self._last_time = time.monotonic()
+
+    def _write(self, snapshot: Any, n: int) -> None:
+        path = os.path.join(self.rep_path, self.file)
+        tmp = "{}.tmp".format(path)
+        self._exp.write_state(snapshot, tmp)
+        os.replace(tmp, path)
+
+        meta = os.path.join(self.rep_path, self.META)
+        with open(meta + ".tmp", "w") as f:
+            json.dump({"iter": n, "file": self.file, "ts": time.time()}, f)
+        os.replace(meta + ".tmp", meta)
+
+    def close(self, final: bool = True) -> None:
+        """final flush. Saves the state of the last iteration synchronously, if it was not saved yet,
+        and waits for the background writer.
+        With only the best policy, the last state is not saved, it would overwrite the best checkpoint.
+
+        Args:
+            final (bool, optional): save the last state. False after a crash, only pending writes are finished. Defaults to True.
+        """
+        try:
+            only_best = self.every is None and self.interval is None
+            if (
+                final
+                and not only_best
+                and self.last_iter is not None
+                and self.last_saved != self.last_iter
+            ):
+                self.save(self.last_iter, sync=True)
+            if self._writer is not None:
+                self._writer.flush()
+        finally:
+            if self._writer is not None:
+                self._writer.close()
+                if self._writer.skipped > 0:
+                    cw_logging.getLogger().info(
+                        "Skipped {} checkpoints while the previous one was written".format(
+                            self._writer.skipped
+                        )
+                    )
+                self._writer = None
+
+
+def write_pickle(state: Any, path: str) -> None:
+    """default writer of state snapshots.
+
+    Args:
+        state (Any): snapshot
+        path (str): file path
+    """
+    with open(path, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
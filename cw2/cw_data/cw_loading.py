@@ -1,44 +1,183 @@
-from typing import Type
+import concurrent.futures
+import copy
+import os
+from typing import Dict, Iterable, List, Type
 
+import numpy as np
 import pandas as pd
 
 from cw2 import job, scheduler, util
-from cw2.cw_data import cw_logging, cw_pd_logger
+from cw2.cw_config import conf_index, conf_path
+from cw2.cw_config import cw_conf_keys as KEYS
+from cw2.cw_data import cw_aggregate, cw_logging, cw_pd_logger, cw_store
+from cw2.cw_profiling import cw_resources
 
 
 class Loader(scheduler.AbstractScheduler):
+    """Scheduler which loads the results of all assigned jobs instead of running them.
+    Repetitions are read concurrently by a thread or process pool.
+    """
+
+    BACKEND_THREAD = "thread"
+    BACKEND_PROCESS = "process"
+
+    def __init__(
+        self,
+        n_workers: int = None,
+        backend: str = BACKEND_THREAD,
+        progress: bool = True,
+        store_dir: str = None,
+        lazy: bool = False,
+    ):
+        """
+        Args:
+            n_workers (int, optional): number of parallel workers. 1 loads sequentially. Defaults to the executor default.
+            backend (str, optional): "thread" or "process". Threads suit I/O bound network filesystems. Defaults to "thread".
+            progress (bool, optional): periodically log the loading progress. Defaults to True.
+            store_dir (str, optional): directory of an incrementally updated cw_store.ResultStore. Only new or changed repetitions are read. Defaults to None.
+            lazy (bool, optional): only load light metadata and handles to the logger results. Defaults to False.
+        """
+        super(Loader, self).__init__()
+        if backend not in [self.BACKEND_THREAD, self.BACKEND_PROCESS]:
+            raise ValueError("Unknown loading backend: {}".format(backend))
+        self.n_workers = n_workers
+        self.backend = backend
+        self.progress = progress
+        self.lazy = lazy
+        self.store = None
+        if store_dir is not None:
+            self.store = cw_store.ResultStore(store_dir)
+
     def run(self, overwrite: bool = False):
-        cw_res = CWResult()
+        tasks = [(j, c) for j in self.joblist for c in j.tasks if _has_results(j, c)]
 
-        for j in self.joblist:
-            cw_res._load_job(j)
+        if self.store is not None and len(tasks) > 0:
+            fingerprint = ",".join(
+                l.__class__.__name__ for l in self.joblist[0].logger
+            )
+            if self.lazy:
+                fingerprint += ":lazy"
+            df = self.store.update(tasks, self._load_tasks, fingerprint)
+            return df.set_index(["name", "r"])
 
+        cw_res = CWResult()
+        cw_res._add_reps(self._load_tasks(tasks))
         cw_res._compile()
         return cw_res.data().set_index(["name", "r"])
 
+    def _load_tasks(self, tasks: List) -> List[pd.DataFrame]:
+        """internal function. loads all tasks, sequentially or in parallel.
+
+        Args:
+            tasks (List): list of (job, task configuration) tuples
+
+        Returns:
+            List[pd.DataFrame]: one single row DataFrame per task, in task order
+        """
+        if self.n_workers == 1:
+            return [_load_rep(j, c, lazy=self.lazy) for j, c in tasks]
+        return self._load_parallel(tasks)
+
+    def _load_parallel(self, tasks: List) -> List[pd.DataFrame]:
+        """internal function. loads all tasks with a worker pool.
+
+        Args:
+            tasks (List): list of (job, task configuration) tuples
+
+        Returns:
+            List[pd.DataFrame]: one single row DataFrame per task, in task order
+        """
+        if self.backend == self.BACKEND_PROCESS:
+            executor_cls = concurrent.futures.ProcessPoolExecutor
+        else:
+            executor_cls = concurrent.futures.ThreadPoolExecutor
+
+        frames = [None] * len(tasks)
+        report_every = max(1, len(tasks) // 20)
+
+        with executor_cls(max_workers=self.n_workers) as pool:
+            futures = {}
+            for i, (j, c) in enumerate(tasks):
+                # Loggers are stateful. Threads need their own copy.
+                logger = None
+                if self.backend == self.BACKEND_THREAD:
+                    logger = copy.deepcopy(j.logger)
+                futures[pool.submit(_load_rep, j, c, logger, self.lazy)] = i
+
+            for done, f in enumerate(concurrent.futures.as_completed(futures), 1):
+                frames[futures[f]] = f.result()
+                if self.progress and (done % report_every == 0 or done == len(tasks)):
+                    cw_logging.getLogger().info(
+                        "Loaded {}/{} repetitions".format(done, len(tasks))
+                    )
+        return frames
+
+
+def _has_results(j: job.Job, c: Dict) -> bool:
+    """internal function. With the sharded layout, repetitions which are not in the completion log are skipped
+    without touching their directories. Other layouts are always loaded.
+    """
+    if not conf_path.is_sharded(c):
+        return True
+    return conf_index.is_completed(c, j._root_dir)
+
+
+def _load_rep(
+    j: job.Job, c: Dict, logger: cw_logging.AbstractLogger = None, lazy: bool = False
+) -> pd.DataFrame:
+    """load a single repetition into a single row DataFrame.
+    Errors are isolated per repetition and stored in the "load_error" column.
+
+    Args:
+        j (job.Job): job containing the task
+        c (Dict): task configuration
+        logger (cw_logging.AbstractLogger, optional): logger to load with. Defaults to the job logger.
+        lazy (bool, optional): only load light handles to the logger results. Defaults to False.
+
+    Returns:
+        pd.DataFrame: single row with the loaded data
+    """
+    try:
+        rep_data = j.load_task(c, logger, lazy)
+    except Exception as e:
+        cw_logging.getLogger().exception("Could not load {}".format(c[KEYS.i_REP_LOG_PATH]))
+        rep_data = {"load_error": repr(e)}
+
+    rep_data.update(
+        {
+            "name": c[KEYS.NAME],
+            "r": c[KEYS.i_REP_IDX],
+            "rep_path": c[KEYS.i_REP_LOG_PATH],
+            "params": c.get(KEYS.PARAMS, {}),
+        }
+    )
+    rep_data.update(util.flatten_dict(c.get(KEYS.PARAMS, {})))
+
+    # Wrap values in lists, so nested objects like DataFrames are stored as is
+    return pd.DataFrame({k: [v] for k, v in rep_data.items()})
+
 
 class CWResult:
     def __init__(self, df: pd.DataFrame = None):
-        self.data_list = []
+        self.frame_list = []
         self.df = df
 
     def _compile(self):
-        self.df = pd.DataFrame(self.data_list)
-        self.data_list = None
+        if len(self.frame_list) == 0:
+            self.df = pd.DataFrame(columns=["name", "r"])
+        else:
+            self.df = pd.concat(self.frame_list, ignore_index=True)
+        self.frame_list = None
+
+    def _add_rep(self, rep_frame: pd.DataFrame) -> None:
+        self.frame_list.append(rep_frame)
+
+    def _add_reps(self, rep_frames: List[pd.DataFrame]) -> None:
+        self.frame_list.extend(rep_frames)
 
     def _load_job(self, j: job.Job) -> None:
         for c in j.tasks:
-            rep_data = j.load_task(c)
-            rep_data.update(
-                {
-                    "name": c["name"],
-                    "r": c["_rep_idx"],
-                    "rep_path": c["_rep_log_path"],
-                    "params": c["params"],
-                }
-            )
-            rep_data.update(util.flatten_dict(c["params"]))
-            self.data_list.append(rep_data)
+            self._add_rep(_load_rep(j, c))
 
     def data(self) -> pd.DataFrame:
         return self.df
@@ -49,6 +188,71 @@ class Cw2Accessor:
     def __init__(self, pandas_obj):
         self._obj = pandas_obj
 
+    def _lookup(self, key: str) -> Dict:
+        """internal function. returns the lookup index of a column or index level.
+        The index maps each value to the positions of its rows.
+        It is cached on the DataFrame object together with a copy of the values it was built from,
+        and only reused while the current values are equal, so in-place edits rebuild it.
+
+        Args:
+            key (str): column or index level name
+
+        Returns:
+            Dict: value -> array of row positions. None if the values are unhashable.
+        """
+        df = self._obj
+        cache = df.__dict__.get("_cw2_lookup")
+        if cache is None:
+            cache = {}
+            object.__setattr__(df, "_cw2_lookup", cache)
+
+        values = self._values(key)
+        cached = cache.get(key)
+        if cached is not None and cached[0].equals(values):
+            return cached[1]
+
+        try:
+            lookup = values.groupby(values, sort=False, dropna=False).indices
+        except TypeError:
+            lookup = None
+        cache[key] = (values.copy(), lookup)
+        return lookup
+
+    def _values(self, key: str) -> pd.Series:
+        """internal function. returns the values of a column or index level.
+
+        Args:
+            key (str): column or index level name
+
+        Returns:
+            pd.Series: values with a positional index
+        """
+        df = self._obj
+        if key in df.columns:
+            return df[key].reset_index(drop=True)
+        if key in df.index.names:
+            return pd.Series(df.index.get_level_values(key))
+        raise KeyError(key)
+
+    def _select(self, selection: Dict) -> pd.DataFrame:
+        """internal function. selects all rows matching every key: value pair.
+
+        Args:
+            selection (Dict): column or index level name -> value
+
+        Returns:
+            pd.DataFrame: selected rows
+        """
+        positions = np.arange(len(self._obj))
+        for k, v in selection.items():
+            lookup = self._lookup(k)
+            if lookup is None:
+                match = np.flatnonzero((self._values(k) == v).to_numpy())
+            else:
+                match = lookup.get(v, np.empty(0, dtype=int))
+            positions = np.intersect1d(positions, match, assume_unique=True)
+        return self._obj.iloc[positions]
+
     def filter(self, param_dict: dict):
         """filter by parameter dictionary.
         Supports nested dictionarys. Has to be the same format as the config file.
@@ -59,12 +263,7 @@ class Cw2Accessor:
         Returns:
             pd.DataFrame: filtered result
         """
-        flattened = util.flatten_dict(param_dict)
-
-        df = self._obj.copy()
-        for k, v in flattened.items():
-            df = df[df[k] == v]
-        return df
+        return self._select(util.flatten_dict(param_dict))
 
     def repetition(self, r: int):
         """only select a specific repetition.
@@ -75,8 +274,7 @@ class Cw2Accessor:
         Returns:
             pd.DataFrame: filtered result
         """
-        df = self._obj
-        return df[df["r"] == r]
+        return self._select({"r": r})
 
     def name(self, name: str):
         """only select experiments with a specific name
@@ -87,8 +285,121 @@ class Cw2Accessor:
         Returns:
             pd.DataFrame: filtered result
         """
-        df = self._obj
-        return df[df["name"] == name]
+        return self._select({"name": name})
+
+    def load_logs(self, columns: List[str] = None, l_name: str = ""):
+        """read the lazy logger results of the selected repetitions.
+        Intended for results of cw.load(lazy=True). Already loaded results are kept as is.
+
+        Args:
+            columns (List[str], optional): only read these metric columns. Defaults to all.
+            l_name (str, optional): the class name of the logger. Defaults to PandasLogger.
+
+        Returns:
+            pd.DataFrame: copy of the selection with loaded logger results
+        """
+        if l_name == "":
+            l_name = cw_pd_logger.PandasLogger.__name__
+
+        df = self._obj.copy()
+        df[l_name] = df[l_name].map(lambda l: _materialize(l, columns))
+        return df
+
+    def resources(self, root_dir: str = "") -> pd.DataFrame:
+        """collects the resource usage summaries of the selected repetitions.
+        Repetitions which were run without the `resources` keyword are omitted.
+
+        Args:
+            root_dir (str, optional): root directory of the experiments. Defaults to "".
+
+        Returns:
+            pd.DataFrame: one row per repetition, indexed by name and repetition
+        """
+        rows = []
+        for name, r, rep_path in zip(
+            self._obj["name"], self._obj["r"], self._obj["rep_path"]
+        ):
+            summary = cw_resources.read_resources(os.path.join(root_dir, rep_path))
+            if summary is not None:
+                rows.append(dict(summary, name=name, r=r))
+
+        if len(rows) == 0:
+            return pd.DataFrame(columns=["name", "r"]).set_index(["name", "r"])
+        return pd.DataFrame(rows).set_index(["name", "r"])
+
+    def aggregate(
+        self,
+        metrics: List[str] = None,
+        quantiles: Iterable[float] = (0.25, 0.5, 0.75),
+        by: List[str] = None,
+        l_name: str = "",
+    ) -> pd.DataFrame:
+        """computes per iteration statistics across the repetitions of each hyperparameter setting.
+        Each setting is stacked into a dense NumPy array and reduced vectorized.
+
+        Args:
+            metrics (List[str], optional): metric columns of the logger results. Defaults to all numeric columns.
+            quantiles (Iterable[float], optional): quantiles in [0, 1]. Defaults to (0.25, 0.5, 0.75).
+            by (List[str], optional): columns defining a setting. Defaults to the name and all flattened parameters.
+            l_name (str, optional): the class name of the logger. Defaults to PandasLogger.
+
+        Returns:
+            pd.DataFrame: summary indexed by setting and iteration, with (metric, statistic) columns
+        """
+        if l_name == "":
+            l_name = cw_pd_logger.PandasLogger.__name__
+
+        df = self._obj.reset_index()
+        if by is None:
+            by = ["name"] + self._param_columns(df)
+
+        read_cols = None if metrics is None else list(metrics) + ["iter"]
+        logs = df[l_name].map(lambda l: _materialize(l, read_cols))
+        has_log = logs.map(lambda l: isinstance(l, pd.DataFrame)).to_numpy()
+        df = df[has_log]
+        logs = list(logs[has_log])
+        if len(logs) == 0:
+            return pd.DataFrame()
+
+        if metrics is None:
+            metrics = [
+                c
+                for c in logs[0].columns
+                if c not in ["iter", "rep"] and pd.api.types.is_numeric_dtype(logs[0][c])
+            ]
+
+        codes = df.groupby(by, sort=False, dropna=False).ngroup().to_numpy()
+        res = cw_aggregate.aggregate(logs, codes, metrics, quantiles)
+
+        # Replace the group number with the values defining the setting
+        _, first = np.unique(codes, return_index=True)
+        settings = df[by].iloc[first]
+        groups = res.index.get_level_values("group")
+        res.index = pd.MultiIndex.from_arrays(
+            [settings[k].to_numpy()[groups] for k in by]
+            + [res.index.get_level_values("iter")],
+            names=by + ["iter"],
+        )
+        return res
+
+    @staticmethod
+    def _param_columns(df: pd.DataFrame) -> List[str]:
+        """internal function. returns the flattened parameter columns present in the frame.
+
+        Args:
+            df (pd.DataFrame): loaded results
+
+        Returns:
+            List[str]: flattened parameter names, in order of appearance
+        """
+        if "params" not in df.columns:
+            return []
+
+        keys = {}
+        for p in df["params"]:
+            if isinstance(p, dict):
+                keys.update(dict.fromkeys(util.flatten_dict(p)))
+        return [k for k in keys if k in df.columns]
 
     def logger(
         self,
@@ -116,23 +427,56 @@ class Cw2Accessor:
         return df[l_name]
 
     def flatten_pd_log(self):
+        """flatten the nested PandasLogger results into a long format DataFrame
+        with one row per iteration. The columns of the outer repetition row are broadcast onto its iterations.
+        Repetitions without PandasLogger results are skipped.
+
+        Returns:
+            pd.DataFrame: flattened results, indexed by name, repetition and iteration
+        """
         pd_log_col = cw_pd_logger.PandasLogger.__name__
         if pd_log_col not in self._obj.columns:
             return self._obj
 
-        df = self._obj
-        new_df = pd.DataFrame()
-        for idx, row in df.iterrows():
-            nested_df = row[pd_log_col]
-
-            outer_row = row.drop(pd_log_col)
-            for c, v in outer_row.iteritems():
-                if isinstance(v, dict):
-                    nested_df[c] = str(v)
-                    nested_df[c] = nested_df[c].map(eval)
-                    continue
-                nested_df[c] = v
-            nested_df["name"] = idx[0]
-            nested_df["r"] = idx[1]
-            new_df = new_df.append(nested_df, ignore_index=True)
+        df = self._obj.cw2.load_logs()
+        has_log = df[pd_log_col].map(lambda n: isinstance(n, pd.DataFrame))
+        df = df[has_log]
+
+        outer = df.drop(columns=pd_log_col).reset_index()
+        nested = list(df[pd_log_col])
+        if len(nested) == 0:
+            return pd.DataFrame(columns=list(outer.columns) + ["iter"]).set_index(
+                ["name", "r", "iter"]
+            )
+
+        # The level of the keys holds the position of the outer row for each iteration
+        inner = pd.concat(nested, keys=range(len(nested)))
+        outer_pos = inner.index.get_level_values(0)
+
+        # Outer columns take precedence over nested columns of the same name
+        inner = inner.drop(columns=[c for c in outer.columns if c in inner.columns])
+        new_df = pd.concat(
+            [
+                inner.reset_index(drop=True),
+                outer.iloc[outer_pos].reset_index(drop=True),
+            ],
+            axis=1,
+        )
         return new_df.set_index(["name", "r", "iter"])
+
+
+def _materialize(log, columns: List[str] = None):
+    """read a lazy logger result. Other values are returned as is.
+
+    Args:
+        log: logger result or lazy handle
+        columns (List[str], optional): only keep these metric columns. Defaults to all.
+    """
+    if isinstance(log, cw_pd_logger.LazyPandasLog):
+        try:
+            return log.load(columns)
+        except FileNotFoundError:
+            return "{} does not exist".format(log.pkl_name)
+    if columns is not None and isinstance(log, pd.DataFrame):
+        return log[[c for c in columns if c in log.columns]]
+    return log
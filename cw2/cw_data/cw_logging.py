@@ -1,8 +1,14 @@
 import abc
+import atexit
+import contextlib
+import contextvars
 import logging
+import logging.handlers
 import os
 import pprint
+import queue
 import sys
+import threading
 from typing import Dict, Iterable, List, Optional
 
 
@@ -84,6 +90,25 @@ class AbstractLogger(abc.ABC):
         """
         raise NotImplementedError
 
+    def initialize_load(self, config: dict, rep: int, rep_log_path: str) -> None:
+        """called instead of initialize() before load(). Must not write to the repetition directory,
+        which might not exist anymore, e.g. after compaction.
+        Defaults to initialize().
+
+        Arguments:
+            config {attrdict.Attrdict} -- configuration
+            rep {int} -- repetition counter
+            rep_log_path {str} -- repetition directory
+        """
+        self.initialize(config, rep, rep_log_path)
+
+    def load_lazy(self):
+        """called instead of load() for lazy loading.
+        Can be overwritten to return light handles, which read the data on demand.
+        Defaults to load().
+        """
+        return self.load()
+
 
 class LoggerArray(AbstractLogger):
     """Storage for multiple AbstractLogger objects.
@@ -101,6 +126,10 @@ class LoggerArray(AbstractLogger):
         for logger in self._logger_array:
             logger.initialize(config, rep, rep_log_path)
 
+    def initialize_load(self, config: dict, rep: int, rep_log_path: str) -> None:
+        for logger in self._logger_array:
+            logger.initialize_load(config, rep, rep_log_path)
+
     def preprocess(self, *args):
         for logger in self._logger_array:
             logger.preprocess(*args)
@@ -114,10 +143,16 @@ class LoggerArray(AbstractLogger):
             logger.finalize()
 
     def load(self):
+        return self._collect(lazy=False)
+
+    def load_lazy(self):
+        return self._collect(lazy=True)
+
+    def _collect(self, lazy: bool = False) -> dict:
         data = {}
         for logger in self._logger_array:
             try:
-                d = logger.load()
+                d = logger.load_lazy() if lazy else logger.load()
             except:
                 getLogger().exception(logger.__class__.__name__)
                 d = "Error when loading {}".format(logger.__class__.__name__)
@@ -154,37 +189,66 @@ class Printer(AbstractLogger):
 
 class PythonLogger(AbstractLogger):
     """
-    Logger which writes calls to logging.getLogger('cw2') on to disk
+    Logger which writes calls to logging.getLogger('cw2') on to disk.
+    Records are routed by their task context to the files of the emitting repetition.
+    Records of a batch of tasks, see task_batch(), are written to the files of every task in the batch.
+    A single background thread per process writes all repetition files.
     """
 
     def __init__(self):
         self.logger = getLogger()
+        self.key = None
 
     def initialize(self, config: dict, rep: int, rep_log_path: str) -> None:
-        self.outh = logging.FileHandler(
-            os.path.join(rep_log_path, "out.log"), delay=True
+        _ensure_listener()
+
+        # err.log marks a started repetition, even if nothing is written
+        open(os.path.join(rep_log_path, "err.log"), "a").close()
+
+        self.key = rep_log_path
+        batch = _batch_context.get()
+        previous = _task_context.get() or ()
+        keys = tuple(k for k in previous if k in batch and k != self.key)
+        for k in previous:
+            if k not in keys and k != self.key:
+                # The previous repetition of this task context did not finalize
+                _control("close", k)
+        _task_context.set(keys + (self.key,))
+        _control(
+            "open",
+            self.key,
+            os.path.join(rep_log_path, "out.log"),
+            os.path.join(rep_log_path, "err.log"),
         )
-        self.outh.setLevel(logging.INFO)
-        self.outh.setFormatter(_formatter)
-        self.logger.addHandler(self.outh)
 
-        self.errh = logging.FileHandler(os.path.join(rep_log_path, "err.log"))
-        self.errh.setLevel(logging.ERROR)
-        self.errh.setFormatter(_formatter)
-        self.logger.addHandler(self.errh)
+    def initialize_load(self, config: dict, rep: int, rep_log_path: str) -> None:
+        # Nothing to load. Must not create err.log or open the log files of the repetition.
+        pass
 
     def process(self, data: dict) -> None:
         pass
 
     def finalize(self) -> None:
-        for h in [self.outh, self.errh]:
-            h.flush()
-            h.close()
-            self.logger.removeHandler(h)
+        if self.key is None:
+            return
+        _control("close", self.key)
+        context = _task_context.get() or ()
+        if self.key in context:
+            rest = tuple(k for k in context if k != self.key)
+            _task_context.set(rest or None)
+        self.key = None
+        _flush_listener()
 
     def load(self):
         pass
 
+    def __getstate__(self):
+        # The logging.Logger is looked up again in each process
+        return {"key": None}
+
+    def __setstate__(self, state):
+        self.__init__()
+
 
 ### logging module functionality ####
 
@@ -209,6 +273,133 @@ class _CWFormatter(logging.Formatter):
 _formatter = _CWFormatter()
 
 
+class _TaskQueueHandler(logging.handlers.QueueHandler):
+    """Stamps each record with the task context of the emitting thread."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if not hasattr(record, "cw2_task"):
+            record.cw2_task = _task_context.get()
+        super().emit(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue stays in this process. Formatting is left to the file handlers.
+        return record
+
+
+class _TaskRouter(logging.Handler):
+    """Writes records to the files of their repetition.
+    Only used by the listener thread, which also processes the control records opening and closing the files.
+    Records without task context are not written to any repetition file.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.routes = {}
+
+    def emit(self, record: logging.LogRecord) -> None:
+        control = getattr(record, "cw2_control", None)
+        if control is not None:
+            self._handle_control(*control)
+            return
+
+        for key in getattr(record, "cw2_task", None) or ():
+            for h in self.routes.get(key, ()):
+                if record.levelno >= h.level:
+                    h.handle(record)
+
+    def _handle_control(self, cmd: str, *args) -> None:
+        if cmd == "open":
+            key, out_path, err_path = args
+            self._close(key)
+
+            outh = logging.FileHandler(out_path, delay=True)
+            outh.setLevel(logging.INFO)
+            outh.setFormatter(_formatter)
+
+            errh = logging.FileHandler(err_path, delay=True)
+            errh.setLevel(logging.ERROR)
+            errh.setFormatter(_formatter)
+            self.routes[key] = (outh, errh)
+        elif cmd == "close":
+            self._close(args[0])
+        elif cmd == "sync":
+            args[0].set()
+
+    def _close(self, key: str) -> None:
+        for h in self.routes.pop(key, ()):
+            h.flush()
+            h.close()
+
+
+# rep_log_paths of the repetitions the current thread / task works on
+_task_context = contextvars.ContextVar("cw2_task", default=None)
+_batch_context = contextvars.ContextVar("cw2_batch", default=())
+
+
+@contextlib.contextmanager
+def task_batch(rep_log_paths: List[str]):
+    """Loggers initialized in this context belong to one batch of tasks, which run in a single call.
+    The PythonLogger then writes the records of the batch to the files of all its repetitions,
+    instead of closing the files of the previously initialized repetition.
+
+    Args:
+        rep_log_paths (List[str]): repetition directories of the batch
+    """
+    token = _batch_context.set(tuple(rep_log_paths))
+    try:
+        yield
+    finally:
+        _batch_context.reset(token)
+_queue = None
+_listener = None
+_listener_pid = None
+_queue_handler = None
+
+
+def _ensure_listener() -> None:
+    """starts the background writer of this process and attaches its queue handler to the cw2 logger.
+    Restarts them in forked child processes, which do not inherit the writer thread.
+    """
+    global _queue, _listener, _listener_pid, _queue_handler
+
+    if _listener_pid == os.getpid():
+        return
+
+    logger = getLogger()
+    if _queue_handler is not None:
+        logger.removeHandler(_queue_handler)
+
+    _queue = queue.SimpleQueue()
+    _queue_handler = _TaskQueueHandler(_queue)
+    _queue_handler.setLevel(logging.INFO)
+    logger.addHandler(_queue_handler)
+
+    _listener = logging.handlers.QueueListener(_queue, _TaskRouter())
+    _listener.start()
+    _listener_pid = os.getpid()
+    atexit.register(_stop_listener, _listener)
+
+
+def _stop_listener(listener: logging.handlers.QueueListener) -> None:
+    if _listener is listener and _listener_pid == os.getpid():
+        listener.stop()
+
+
+def _control(cmd: str, *args) -> None:
+    """enqueue a control record for the background writer."""
+    record = logging.makeLogRecord({"cw2_control": (cmd, *args)})
+    _queue.put_nowait(record)
+
+
+def _flush_listener(timeout: float = 30.0) -> None:
+    """wait until the background writer has processed all queued records."""
+    if _listener_pid != os.getpid():
+        return
+    done = threading.Event()
+    _control("sync", done)
+    done.wait(timeout)
+
+
 def getLogger() -> logging.Logger:
     """creates a logging.getLogger('cw2') object with initialization.
     Parallelization via joblib needs a more sophisticated getLogger function.
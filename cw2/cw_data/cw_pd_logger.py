@@ -3,35 +3,69 @@ from typing import Dict, Iterable, Optional
 
 import pandas as pd
 
-from cw2.cw_data import cw_logging
+from cw2.cw_data import cw_archive, cw_array_store, cw_logging
 
 
 class PandasLogger(cw_logging.AbstractLogger):
     """Writes the results of each repetition seperately to disk
     Each repetition is saved in its own directory. Write occurs after every iteration.
+    Array-valued results are appended to a chunked cw_array_store.ArrayStore, the table only keeps a reference.
+    They are memory-mapped on load.
     """
 
     def __init__(
         self,
         ignore_keys: Optional[Iterable] = None,
         allow_keys: Optional[Iterable] = None,
+        store_arrays: bool = True,
+        chunk_bytes: int = 64 * 2**20,
     ):
+        """
+        Args:
+            ignore_keys (Optional[Iterable], optional): keys which are not logged. Defaults to None.
+            allow_keys (Optional[Iterable], optional): only log these keys. Defaults to None.
+            store_arrays (bool, optional): store NumPy arrays out-of-line instead of pickling them with the table. Defaults to True.
+            chunk_bytes (int, optional): maximum size of an array chunk file. Defaults to 64 MiB.
+        """
         super().__init__(ignore_keys=ignore_keys, allow_keys=allow_keys)
         self.log_path = ""
         self.csv_name = "rep.csv"
         self.pkl_name = "rep.pkl"
         self.df = pd.DataFrame()
+        self.store_arrays = store_arrays
+        self.chunk_bytes = chunk_bytes
+        self.array_store = None
 
     def initialize(self, config: Dict, rep: int, rep_log_path: str):
         self.log_path = rep_log_path
         self.csv_name = os.path.join(self.log_path, "rep_{}.csv".format(rep))
         self.pkl_name = os.path.join(self.log_path, "rep_{}.pkl".format(rep))
         self.df = pd.DataFrame()
+        self.array_store = None
+
+    def _store_arrays(self, data: dict) -> dict:
+        """internal function. replaces arrays by references into the array store."""
+        if self.array_store is None:
+            # First iteration of a new run: remove arrays of previous runs
+            self.array_store = cw_array_store.ArrayStore(self.log_path, self.chunk_bytes)
+            self.array_store.clear()
+
+        stored = dict(data)
+        for k, v in data.items():
+            if cw_array_store.ArrayStore.is_array(v):
+                stored[k] = self.array_store.append(k, v, data.get("iter", None))
+        return stored
 
     def process(self, log_data: dict) -> None:
         data = self.filter(log_data)
+        if self.store_arrays:
+            data = self._store_arrays(data)
 
-        self.df = self.df.append(data, ignore_index=True)
+        row = pd.DataFrame([data])
+        if self.df.empty:
+            self.df = row
+        else:
+            self.df = pd.concat([self.df, row], ignore_index=True)
 
         try:
             self.df.to_csv(self.csv_name, index_label="index")
@@ -52,11 +86,13 @@ class PandasLogger(cw_logging.AbstractLogger):
 
         # Check if file exists
         try:
-            df = pd.read_pickle(self.pkl_name)
+            with cw_archive.open_file(self.pkl_name) as f:
+                df = pd.read_pickle(f)
         except FileNotFoundError as _:
             warn = "{} does not exist".format(self.pkl_name)
             cw_logging.getLogger().warning(warn)
             return warn
+        df = resolve_arrays(df, self.log_path)
 
         # Enrich Payload with descriptive statistics for loading DF structure
         """
@@ -71,3 +107,57 @@ class PandasLogger(cw_logging.AbstractLogger):
         """
         payload[self.__class__.__name__] = df
         return payload
+
+    def load_lazy(self):
+        if not cw_archive.exists(self.pkl_name):
+            warn = "{} does not exist".format(self.pkl_name)
+            cw_logging.getLogger().warning(warn)
+            return warn
+        return {self.__class__.__name__: LazyPandasLog(self.pkl_name)}
+
+
+class LazyPandasLog:
+    """Light handle to the results of a single PandasLogger repetition.
+    The results are only read from disk when load() is called.
+    """
+
+    def __init__(self, pkl_name: str):
+        self.pkl_name = pkl_name
+
+    def load(self, columns: Optional[Iterable] = None) -> pd.DataFrame:
+        """read the repetition results.
+
+        Args:
+            columns (Iterable, optional): only keep these metric columns. Defaults to None.
+
+        Returns:
+            pd.DataFrame: repetition results
+        """
+        with cw_archive.open_file(self.pkl_name) as f:
+            df = pd.read_pickle(f)
+        if columns is not None:
+            df = df[[c for c in columns if c in df.columns]]
+        return resolve_arrays(df, os.path.dirname(self.pkl_name))
+
+    def __repr__(self) -> str:
+        return "LazyPandasLog({})".format(self.pkl_name)
+
+
+def resolve_arrays(df: pd.DataFrame, rep_path: str, mmap: bool = True) -> pd.DataFrame:
+    """replace the array references of a repetition log by the memory-mapped arrays.
+
+    Args:
+        df (pd.DataFrame): repetition log
+        rep_path (str): repetition directory
+        mmap (bool, optional): memory-map the arrays read-only. Defaults to True.
+
+    Returns:
+        pd.DataFrame: repetition log with arrays
+    """
+    for c in df.columns:
+        if df[c].dtype == object and any(
+            isinstance(v, cw_array_store.ArrayRef) for v in df[c]
+        ):
+            values = cw_array_store.resolve_refs(df[c], rep_path, mmap)
+            df[c] = pd.Series(values, index=df.index, dtype=object)
+    return df
@@ -0,0 +1,174 @@
+import copy
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from typing import Dict, Optional
+
+from cw2.cw_config import cw_conf_keys as KEYS
+from cw2.cw_data import cw_logging
+
+
+class Scratch:
+    """Runs a repetition in a node-local scratch directory and stages its output out to the
+    repetition directory on the shared file system in bulk.
+    """
+
+    def __init__(self, dir: str = None, sync_interval: float = 0.0, keep: bool = False):
+        """
+        Args:
+            dir (str, optional): scratch base directory. Environment variables are expanded. Defaults to $TMPDIR.
+            sync_interval (float, optional): seconds between periodic stage-outs during the run. 0 only stages out at the end. Defaults to 0.0.
+            keep (bool, optional): keep the scratch directory after the final stage-out. Defaults to False.
+        """
+        if dir is None:
+            dir = os.environ.get("TMPDIR", tempfile.gettempdir())
+        self.dir = os.path.expanduser(os.path.expandvars(dir))
+        self.sync_interval = sync_interval
+        self.keep = keep
+
+        self.local_path = None
+        self.final_path = None
+        # relative path -> (mtime_ns, size) of the files at the final location
+        self._synced = {}
+        self._sync_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def from_config(cw_config: dict) -> Optional["Scratch"]:
+        """create a scratch stage if the `scratch` keyword is set in the configuration.
+
+        Args:
+            cw_config (dict): clusterwork experiment configuration
+
+        Returns:
+            Optional[Scratch]: scratch stage or None
+        """
+        conf = cw_config.get(KEYS.SCRATCH, False)
+        if not conf:
+            return None
+        if isinstance(conf, dict):
+            return Scratch(**conf)
+        if isinstance(conf, str):
+            return Scratch(conf)
+        return Scratch()
+
+    def stage_in(self, c: Dict) -> Dict:
+        """create the scratch directory of a repetition and copy existing results, e.g. checkpoints, into it.
+        Starts the periodic stage-out.
+
+        Args:
+            c (Dict): task configuration
+
+        Returns:
+            Dict: copy of the task configuration with the repetition path pointing to scratch.
+                The final path is stored in the `_final_rep_log_path` key.
+        """
+        self.final_path = c[KEYS.i_REP_LOG_PATH]
+        key = hashlib.sha1(os.path.abspath(self.final_path).encode("utf-8"))
+        self.local_path = os.path.join(
+            self.dir,
+            "cw2-{}".format(key.hexdigest()[:16]),
+            os.path.basename(os.path.normpath(self.final_path)),
+        )
+        shutil.rmtree(self.local_path, ignore_errors=True)
+        os.makedirs(self.local_path)
+        if os.path.isdir(self.final_path):
+            shutil.copytree(self.final_path, self.local_path, dirs_exist_ok=True)
+        self._synced = _scan(self.local_path)
+
+        c = copy.copy(c)
+        c[KEYS.i_FINAL_REP_LOG_PATH] = self.final_path
+        c[KEYS.i_REP_LOG_PATH] = self.local_path
+
+        if self.sync_interval > 0:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="cw2-scratch-sync", daemon=True
+            )
+            self._thread.start()
+        return c
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.sync_interval):
+            try:
+                self.sync()
+            except OSError:
+                cw_logging.getLogger().exception(
+                    "Periodic stage-out to {} failed".format(self.final_path)
+                )
+
+    def sync(self, final: bool = False) -> int:
+        """copy new and changed files to the final location and remove deleted files there.
+        Files are written to a temporary name and renamed, so the final location never holds partial files.
+        A file which changed while it was copied, e.g. a checkpoint which is still written, is not published.
+        It is copied again by the next sync.
+
+        Args:
+            final (bool, optional): the run has finished, publish all files. Defaults to False.
+
+        Returns:
+            int: number of copied files
+        """
+        with self._sync_lock:
+            current = _scan(self.local_path)
+            synced = dict(self._synced)
+            copied = 0
+            for rel, sig in current.items():
+                if synced.get(rel) == sig:
+                    continue
+                src = os.path.join(self.local_path, rel)
+                dst = os.path.join(self.final_path, rel)
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                tmp = "{}.tmp{}".format(dst, os.getpid())
+                try:
+                    shutil.copy2(src, tmp)
+                    stable = final or _signature(src) == sig
+                except FileNotFoundError:
+                    # removed by the experiment while it was copied
+                    stable = False
+                if not stable:
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+                    continue
+                os.replace(tmp, dst)
+                synced[rel] = sig
+                copied += 1
+            for rel in set(synced) - set(current):
+                try:
+                    os.remove(os.path.join(self.final_path, rel))
+                except FileNotFoundError:
+                    pass
+                del synced[rel]
+            self._synced = synced
+            return copied
+
+    def stage_out(self) -> None:
+        """stop the periodic stage-out, copy the final state and remove the scratch directory."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        os.makedirs(self.final_path, exist_ok=True)
+        self.sync(final=True)
+        if not self.keep:
+            shutil.rmtree(os.path.dirname(self.local_path), ignore_errors=True)
+
+
+def _signature(fpath: str) -> tuple:
+    st = os.stat(fpath)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _scan(path: str) -> Dict[str, tuple]:
+    res = {}
+    for root, _, files in os.walk(path):
+        for fname in files:
+            fpath = os.path.join(root, fname)
+            try:
+                res[os.path.relpath(fpath, path)] = _signature(fpath)
+            except FileNotFoundError:
+                continue
+    return res
@@ -0,0 +1,344 @@
+import json
+import math
+import numbers
+import os
+from typing import Dict, Iterable, Optional
+
+import pandas as pd
+
+from cw2 import util
+from cw2.cw_config import cw_conf_keys as KEYS
+from cw2.cw_data import cw_archive, cw_logging
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with relative accuracy guarantees (DDSketch).
+    Values are counted in logarithmically sized buckets, so the sketch size only grows with the value range.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-9):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.pos = {}
+        self.neg = {}
+        self.zero = 0
+        self.count = 0
+
+    def _key(self, x: float) -> int:
+        return int(math.ceil(math.log(x) / self._log_gamma))
+
+    def _value(self, k: int) -> float:
+        return 2 * self.gamma**k / (self.gamma + 1)
+
+    def add(self, x: float) -> None:
+        if x > self.min_value:
+            k = self._key(x)
+            self.pos[k] = self.pos.get(k, 0) + 1
+        elif x < -self.min_value:
+            k = self._key(-x)
+            self.neg[k] = self.neg.get(k, 0) + 1
+        else:
+            self.zero += 1
+        self.count += 1
+
+    def merge(self, other: "QuantileSketch") -> None:
+        for k, n in other.pos.items():
+            self.pos[k] = self.pos.get(k, 0) + n
+        for k, n in other.neg.items():
+            self.neg[k] = self.neg.get(k, 0) + n
+        self.zero += other.zero
+        self.count += other.count
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return math.nan
+
+        rank = q * (self.count - 1)
+        seen = 0
+        for k in sorted(self.neg, reverse=True):
+            seen += self.neg[k]
+            if seen > rank:
+                return -self._value(k)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for k in sorted(self.pos):
+            seen += self.pos[k]
+            if seen > rank:
+                return self._value(k)
+        return self._value(max(self.pos))
+
+    def to_dict(self) -> dict:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "min_value": self.min_value,
+            "pos": self.pos,
+            "neg": self.neg,
+            "zero": self.zero,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "QuantileSketch":
+        s = cls(d["relative_accuracy"], d["min_value"])
+        s.pos = {int(k): n for k, n in d["pos"].items()}
+        s.neg = {int(k): n for k, n in d["neg"].items()}
+        s.zero = d["zero"]
+        s.count = sum(s.pos.values()) + sum(s.neg.values()) + s.zero
+        return s
+
+
+class RunningStat:
+    """Mergeable running statistics of a single metric.
+    Mean and variance are computed with Welford's algorithm, quantiles with a QuantileSketch.
+    Non-finite values are not part of the statistics, they are only counted in non_finite.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.count = 0
+        self.non_finite = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = QuantileSketch(relative_accuracy)
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+        self.sketch.add(x)
+
+    def merge(self, other: "RunningStat") -> None:
+        self.non_finite += other.non_finite
+        n = self.count + other.count
+        if n == 0:
+            return
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / n
+        self.m2 += other.m2 + delta**2 * self.count * other.count / n
+        self.count = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+
+    @property
+    def std(self) -> float:
+        if self.count < 2:
+            return math.nan
+        return math.sqrt(self.m2 / (self.count - 1))
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "non_finite": self.non_finite,
+            "mean": self.mean,
+            "m2": self.m2,
+            "min": self.min,
+            "max": self.max,
+            "sketch": self.sketch.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "RunningStat":
+        s = cls()
+        s.count = d["count"]
+        s.non_finite = d.get("non_finite", 0)
+        s.mean = d["mean"]
+        s.m2 = d["m2"]
+        s.min = d["min"]
+        s.max = d["max"]
+        s.sketch = QuantileSketch.from_dict(d["sketch"])
+        return s
+
+
+class OnlineStatsLogger(cw_logging.AbstractLogger):
+    """Keeps per iteration statistics across all repetitions of a hyperparameter setting.
+    Each finished repetition merges its scalar results into a shared summary file in the log_path of the setting.
+    The summary is ready without loading every repetition.
+    """
+
+    def __init__(
+        self,
+        ignore_keys: Optional[Iterable] = None,
+        allow_keys: Optional[Iterable] = None,
+        quantiles: Iterable[float] = (0.25, 0.5, 0.75),
+        relative_accuracy: float = 0.01,
+        file_name: str = "cross_rep_stats.json",
+    ):
+        super().__init__(ignore_keys=ignore_keys, allow_keys=allow_keys)
+        self.quantiles = list(quantiles)
+        self.relative_accuracy = relative_accuracy
+        self.file_name = file_name
+        self.summary_path = ""
+        self.load_path = ""
+        self.rep = None
+        self.values = {}
+        self.non_finite = {}
+
+    def initialize(self, config: Dict, rep: int, rep_log_path: str) -> None:
+        # The shared log_path of the setting, or the parent of the repetition when loading
+        log_path = config.get(KEYS.LOG_PATH, os.path.dirname(rep_log_path))
+        self.summary_path = os.path.join(log_path, self.file_name)
+        self.load_path = os.path.join(os.path.dirname(rep_log_path), self.file_name)
+        self.rep = rep
+        self.values = {}
+        self.non_finite = {}
+
+    def process(self, data: dict) -> None:
+        data_ = self.filter(data)
+        n = data.get("iter", len(self.values))
+        it = self.values.setdefault(n, {})
+        for k, v in data_.items():
+            if k in ["iter", "rep"] or isinstance(v, bool):
+                continue
+            if isinstance(v, numbers.Real):
+                v = float(v)
+                if math.isfinite(v):
+                    it[k] = v
+                else:
+                    # a single inf or nan would spoil the statistics of all repetitions
+                    skipped = self.non_finite.setdefault(n, {})
+                    skipped[k] = skipped.get(k, 0) + 1
+
+    def finalize(self) -> None:
+        if len(self.values) == 0:
+            return
+
+        try:
+            with util.FileLock(self.summary_path + ".lock"):
+                summary = read_summary(self.summary_path)
+                if self.rep in summary["reps"]:
+                    cw_logging.getLogger().warning(
+                        "Repetition {} already merged into {}. Delete the file to rebuild it.".format(
+                            self.rep, self.summary_path
+                        )
+                    )
+                    return
+
+                stats = summary["stats"]
+                for n, metrics in self.values.items():
+                    it = stats.setdefault(str(n), {})
+                    for k, v in metrics.items():
+                        self._stat(it, k).add(v)
+                for n, metrics in self.non_finite.items():
+                    it = stats.setdefault(str(n), {})
+                    for k, count in metrics.items():
+                        self._stat(it, k).non_finite += count
+                summary["reps"].append(self.rep)
+                write_summary(self.summary_path, summary)
+        except OSError:
+            cw_logging.getLogger().exception(
+                "Could not update {}".format(self.summary_path)
+            )
+
+    def _stat(self, it: dict, k: str) -> RunningStat:
+        s = it.get(k)
+        if s is None:
+            s = it[k] = RunningStat(self.relative_accuracy)
+        return s
+
+    def load(self):
+        if not os.path.exists(self.load_path):
+            return None
+        summary = read_summary(self.load_path)
+        return {self.__class__.__name__: summary_to_frame(summary, self.quantiles)}
+
+
+def read_summary(path: str) -> dict:
+    """read a cross repetition summary file.
+
+    Args:
+        path (str): summary file path
+
+    Returns:
+        dict: merged repetitions and RunningStat objects per iteration and metric. Empty if missing.
+    """
+    try:
+        with cw_archive.open_file(path) as f:
+            raw = json.load(f)
+    except FileNotFoundError:
+        return {"reps": [], "stats": {}}
+
+    stats = {
+        n: {k: RunningStat.from_dict(s) for k, s in metrics.items()}
+        for n, metrics in raw["stats"].items()
+    }
+    return {"reps": raw["reps"], "stats": stats}
+
+
+def write_summary(path: str, summary: dict) -> None:
+    """atomically write a cross repetition summary file.
+
+    Args:
+        path (str): summary file path
+        summary (dict): summary, see read_summary()
+    """
+    raw = {
+        "reps": summary["reps"],
+        "stats": {
+            n: {k: s.to_dict() for k, s in metrics.items()}
+            for n, metrics in summary["stats"].items()
+        },
+    }
+    tmp = "{}.tmp{}".format(path, os.getpid())
+    with open(tmp, "w") as f:
+        json.dump(raw, f)
+    os.replace(tmp, path)
+
+
+def merge_summaries(a: dict, b: dict) -> dict:
+    """merge two cross repetition summaries, e.g. of separately written experiment copies.
+
+    Args:
+        a (dict): summary, see read_summary(). Updated in place.
+        b (dict): summary
+
+    Returns:
+        dict: the merged summary a
+    """
+    for n, metrics in b["stats"].items():
+        it = a["stats"].setdefault(n, {})
+        for k, s in metrics.items():
+            if k in it:
+                it[k].merge(s)
+            else:
+                it[k] = s
+    a["reps"] = sorted(set(a["reps"]) | set(b["reps"]))
+    return a
+
+
+def summary_to_frame(summary: dict, quantiles: Iterable[float] = ()) -> pd.DataFrame:
+    """convert a cross repetition summary into a DataFrame.
+
+    Args:
+        summary (dict): summary, see read_summary()
+        quantiles (Iterable[float], optional): quantiles in [0, 1]. Defaults to ().
+
+    Returns:
+        pd.DataFrame: index iter, columns (metric, statistic)
+    """
+    rows = {}
+    for n, metrics in summary["stats"].items():
+        row = {}
+        for k, s in metrics.items():
+            row[(k, "count")] = s.count
+            row[(k, "non_finite")] = s.non_finite
+            row[(k, "mean")] = s.mean
+            row[(k, "std")] = s.std
+            row[(k, "min")] = s.min
+            row[(k, "max")] = s.max
+            for q in quantiles:
+                row[(k, "q{:g}".format(q * 100))] = s.sketch.quantile(q)
+        rows[int(n)] = row
+
+    df = pd.DataFrame.from_dict(rows, orient="index").sort_index()
+    df.index.name = "iter"
+    if len(df.columns) > 0:
+        df.columns = pd.MultiIndex.from_tuples(df.columns, names=["metric", "stat"])
+    return df
+
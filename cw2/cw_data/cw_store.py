@@ -0,0 +1,148 @@
+import json
+import os
+from typing import Callable, Dict, List, Tuple
+
+import pandas as pd
+
+from cw2 import job
+from cw2.cw_config import cw_conf_keys as KEYS
+from cw2.cw_data import cw_archive, cw_logging
+
+
+class ResultStore:
+    """Consolidated, incrementally updated store of loaded results.
+    Holds one partition file per experiment and a manifest with the file signature of every repetition.
+    Only new or changed repetitions are read from their repetition directories.
+
+    Partitions are pickled DataFrames, as the nested logger results cannot be represented in a columnar file format.
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, store_dir: str):
+        """
+        Args:
+            store_dir (str): directory of the store. Created on the first update.
+        """
+        self.store_dir = store_dir
+
+    def update(
+        self,
+        tasks: List[Tuple[job.Job, Dict]],
+        load_fn: Callable[[List[Tuple[job.Job, Dict]]], List[pd.DataFrame]],
+        fingerprint: str = "",
+    ) -> pd.DataFrame:
+        """bring the store up to date and return the stored results of all given tasks.
+
+        Args:
+            tasks (List[Tuple[job.Job, Dict]]): list of (job, task configuration) tuples
+            load_fn (Callable): loads a list of tasks, returning one single row DataFrame per task
+            fingerprint (str, optional): identifies the loader setup. A changed fingerprint rebuilds the store. Defaults to "".
+
+        Returns:
+            pd.DataFrame: results of all given tasks, in task order
+        """
+        manifest = self._read_manifest()
+        if manifest.get("fingerprint") != fingerprint:
+            manifest = {"fingerprint": fingerprint, "reps": {}}
+        stored = manifest["reps"]
+
+        stale = []
+        current = {}
+        for j, c in tasks:
+            key = c[KEYS.i_REP_LOG_PATH]
+            sig = self.signature(os.path.join(j._root_dir, key))
+            current[key] = {"partition": c[KEYS.NAME], "signature": sig}
+            if stored.get(key) != current[key] or not os.path.exists(
+                self._partition_path(c[KEYS.NAME])
+            ):
+                stale.append((j, c))
+
+        partitions = {p["partition"] for p in current.values()}
+        dirty = {c[KEYS.NAME] for _, c in stale}
+
+        if len(stale) > 0:
+            cw_logging.getLogger().info(
+                "Updating result store with {}/{} repetitions".format(
+                    len(stale), len(tasks)
+                )
+            )
+            new_rows = pd.concat(load_fn(stale), ignore_index=True)
+            for p in dirty:
+                df = self._read_partition(p)
+                if df is not None:
+                    df = df[~df["rep_path"].isin(new_rows["rep_path"])]
+                df = pd.concat(
+                    [df, new_rows[new_rows["name"] == p]], ignore_index=True
+                )
+                self._write_partition(p, df)
+            stored.update(current)
+            if "load_error" in new_rows:
+                # errors might be transient, e.g. a file still being written. Retry them on every update.
+                for key in new_rows.loc[new_rows["load_error"].notna(), "rep_path"]:
+                    stored.pop(key, None)
+            self._write_manifest(manifest)
+
+        frames = [self._read_partition(p) for p in sorted(partitions)]
+        df = pd.concat([f for f in frames if f is not None], ignore_index=True)
+
+        # Restrict to the requested tasks and restore the task order
+        order = {key: i for i, key in enumerate(current)}
+        df = df[df["rep_path"].isin(order)]
+        return df.iloc[df["rep_path"].map(order).argsort()].reset_index(drop=True)
+
+    @staticmethod
+    def signature(rep_path: str) -> List:
+        """computes a cheap change signature of a repetition directory from file names, mtimes and sizes.
+
+        Args:
+            rep_path (str): repetition directory
+
+        Returns:
+            List: sorted [name, mtime_ns, size] entries. Empty if the directory is missing.
+        """
+        try:
+            entries = list(os.scandir(rep_path))
+        except FileNotFoundError:
+            entries = []
+        if len(entries) == 0:
+            # compacted repetition
+            return cw_archive.entries(rep_path)
+
+        sig = []
+        for e in entries:
+            if e.is_file():
+                st = e.stat()
+                sig.append([e.name, st.st_mtime_ns, st.st_size])
+        return sorted(sig)
+
+    def _partition_path(self, name: str) -> str:
+        return os.path.join(self.store_dir, "{}.pkl".format(name))
+
+    def _read_partition(self, name: str) -> pd.DataFrame:
+        try:
+            return pd.read_pickle(self._partition_path(name))
+        except FileNotFoundError:
+            return None
+
+    def _write_partition(self, name: str, df: pd.DataFrame) -> None:
+        os.makedirs(self.store_dir, exist_ok=True)
+        fpath = self._partition_path(name)
+        tmp = "{}.tmp{}".format(fpath, os.getpid())
+        df.to_pickle(tmp)
+        os.replace(tmp, fpath)
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(os.path.join(self.store_dir, self.MANIFEST), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write_manifest(self, manifest: dict) -> None:
+        os.makedirs(self.store_dir, exist_ok=True)
+        fpath = os.path.join(self.store_dir, self.MANIFEST)
+        tmp = "{}.tmp{}".format(fpath, os.getpid())
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, fpath)
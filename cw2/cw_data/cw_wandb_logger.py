@@ -1,4 +1,7 @@
+import concurrent.futures
+import numbers
 import os
+import subprocess
 import warnings
 from random import random
 from time import sleep
@@ -8,7 +11,7 @@ from time import sleep
 os.environ["WANDB_START_METHOD"] = "thread"
 
 from itertools import groupby
-from typing import Dict, Iterable, List, Optional
+from typing import Callable, Dict, Iterable, List, Optional
 
 import pandas as pd
 import wandb
@@ -61,17 +64,97 @@ def group_parameters(list_of_strings: List[str]):
     return substring[:-1], len(groups)
 
 
+def wandb_sync(run_dir: str) -> None:
+    """upload an offline run with the wandb command line tool.
+
+    Args:
+        run_dir (str): offline run directory
+    """
+    subprocess.run(["wandb", "sync", run_dir], check=True, capture_output=True)
+
+
+class WandBSyncUploader:
+    """Uploads offline runs in the background with bounded concurrency.
+    Failed uploads are retried with a randomized exponential backoff and never raise into the experiment.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        sync_fn: Callable[[str], None] = wandb_sync,
+        retries: int = 5,
+    ):
+        """
+        Args:
+            max_workers (int, optional): maximum number of concurrent uploads. Defaults to 2.
+            sync_fn (Callable[[str], None], optional): uploads a single run directory. Defaults to wandb_sync.
+            retries (int, optional): attempts per run. Defaults to 5.
+        """
+        self.sync_fn = sync_fn
+        self.retries = retries
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="cw2-wandb-sync"
+        )
+
+    def submit(self, run_dir: str) -> concurrent.futures.Future:
+        return self._pool.submit(self._sync, run_dir)
+
+    def _sync(self, run_dir: str) -> bool:
+        for i in range(self.retries):
+            try:
+                self.sync_fn(run_dir)
+                return True
+            except Exception as e:
+                waiting_time = ((random() / 50) + 0.01) * (2**i)
+                warnings.warn(
+                    "Problem with syncing {}: {}. Trying again in {} seconds".format(
+                        run_dir, e, waiting_time
+                    )
+                )
+                sleep(waiting_time)
+        cw_logging.getLogger().error("wandb sync of {} failed.".format(run_dir))
+        return False
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
+
+
+_uploaders = {}
+
+
+def get_uploader(max_workers: int = 2) -> WandBSyncUploader:
+    """returns the uploader of this process, shared between all repetitions.
+
+    Args:
+        max_workers (int, optional): maximum number of concurrent uploads. Defaults to 2.
+    """
+    key = (os.getpid(), max_workers)
+    if key not in _uploaders:
+        _uploaders[key] = WandBSyncUploader(max_workers)
+    return _uploaders[key]
+
+
 class WandBLogger(cw_logging.AbstractLogger):
     def __init__(
         self,
         ignore_keys: Optional[Iterable] = None,
         allow_keys: Optional[Iterable] = None,
+        uploader: WandBSyncUploader = None,
     ):
+        """
+        Args:
+            ignore_keys (Optional[Iterable], optional): keys which are not logged. Defaults to None.
+            allow_keys (Optional[Iterable], optional): only log these keys. Defaults to None.
+            uploader (WandBSyncUploader, optional): background uploader for the buffered mode. Defaults to a shared uploader per process.
+        """
         super(WandBLogger, self).__init__(
             ignore_keys=ignore_keys, allow_keys=allow_keys
         )
         self.log_path = ""
         self.run = None
+        self.uploader = uploader
+        self.buffered = False
+        self._buffer = []
 
     def initialize(self, config: Dict, rep: int, rep_log_path: str) -> None:
         if "wandb" in config.keys():
@@ -86,6 +169,9 @@ class WandBLogger(cw_logging.AbstractLogger):
         self.rep = rep
         self.config = config["wandb"]
         self.cw2_config = config
+        # optional: buffer steps and write an offline run, which is synced in the background
+        self.buffered = self.config.get("buffered", False)
+        self._buffer = []
         reset_wandb_env()
         self.job_name = config["_experiment_name"].replace("__", "_")
         self.use_group_parameters = self.config.get("use_group_parameters", False)
@@ -125,9 +211,7 @@ class WandBLogger(cw_logging.AbstractLogger):
                             "disable_stats", False
                         )
                     ),
-                    mode="online"
-                    if self.cw2_config["wandb"].get("enabled", True)
-                    else "disabled",
+                    mode=self._mode(),
                 )
                 return  # if starting the run is successful, exit the loop (and in this case the function)
             except Exception as e:
@@ -145,10 +229,23 @@ class WandBLogger(cw_logging.AbstractLogger):
         warnings.warn("wandb init failed several times.")
         raise last_error
 
+    def _mode(self) -> str:
+        if not self.cw2_config["wandb"].get("enabled", True):
+            return "disabled"
+        return "offline" if self.buffered else "online"
+
     def process(self, data: dict) -> None:
         if self.run is not None:
-            # Skip logging if interval is defined but not satisfied
             log_interval = self.config.get("log_interval", None)
+
+            if self.buffered:
+                self._buffer.append(data)
+                step = data.get("iter", len(self._buffer) - 1)
+                if log_interval is None or step % log_interval == log_interval - 1:
+                    self.flush()
+                return
+
+            # Skip logging if interval is defined but not satisfied
             if log_interval is not None and data["iter"] % log_interval != 0:
                 return
 
@@ -163,11 +260,46 @@ class WandBLogger(cw_logging.AbstractLogger):
             step = data.get("iter", None)
             self.run.log(filtered_data, step=step)
 
+    def flush(self) -> None:
+        """log the buffered steps as a single, aggregated step.
+        Numeric values are averaged, other values and histograms are taken from the latest step.
+        """
+        if self.run is None or len(self._buffer) == 0:
+            return
+
+        buffer, self._buffer = self._buffer, []
+        sums = {}
+        counts = {}
+        aggregated = {}
+        for data in buffer:
+            for k, v in self.filter(data).items():
+                if isinstance(v, numbers.Real) and not isinstance(v, bool):
+                    sums[k] = sums.get(k, 0.0) + v
+                    counts[k] = counts.get(k, 0) + 1
+                else:
+                    aggregated[k] = v
+            for el in self.config.get("histogram", []):
+                if el in data:
+                    aggregated[el] = wandb.Histogram(np_histogram=data[el])
+        for k in sums:
+            aggregated[k] = sums[k] / counts[k]
+
+        step = buffer[0].get("iter", None)
+        if step is not None:
+            aggregated["iter"] = step
+        self.run.log(aggregated, step=step)
+
     def finalize(self) -> None:
         if self.run is not None:
+            self.flush()
             self.log_model()
             self.run.finish()
 
+            if self.buffered and self._mode() == "offline":
+                if self.uploader is None:
+                    self.uploader = get_uploader(self.config.get("sync_workers", 2))
+                self.uploader.submit(os.path.dirname(self.run.dir))
+
     def load(self):
         pass
 
@@ -0,0 +1,248 @@
+import collections
+import contextlib
+import contextvars
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from typing import Dict, Optional
+
+from cw2.cw_config import cw_conf_keys as KEYS
+from cw2.cw_data import cw_logging
+
+MODE_CPU = "cpu"
+MODE_MEM = "mem"
+MODE_BOTH = "both"
+MODES = [MODE_CPU, MODE_MEM, MODE_BOTH]
+
+_current_profiler = contextvars.ContextVar("cw2_task_profiler", default=None)
+
+
+def current() -> Optional["TaskProfiler"]:
+    """
+    Returns:
+        Optional[TaskProfiler]: the profiler of the task running in this context, if it profiles single iterations.
+    """
+    return _current_profiler.get()
+
+
+def annotate_configs(
+    exp_configs: list, mode: str, tasks: list = None, every: int = None
+) -> int:
+    """mark task configurations for profiling.
+
+    Args:
+        exp_configs (list): list of all task configurations
+        mode (str): "cpu", "mem" or "both"
+        tasks (list, optional): only profile the tasks with these indices. Defaults to all.
+        every (int, optional): only profile every n-th iteration of iterative experiments. Defaults to the whole task.
+
+    Returns:
+        int: number of marked tasks
+    """
+    if mode not in MODES:
+        raise ValueError("Unknown profiling mode {}. Use one of {}".format(mode, MODES))
+    n = 0
+    for i, c in enumerate(exp_configs):
+        if tasks is None or i in tasks:
+            c[KEYS.i_PROFILE] = {"mode": mode, "every": every}
+            n += 1
+    return n
+
+
+def _frame_name(code) -> str:
+    return "{}:{}:{}".format(
+        os.path.basename(code.co_filename), code.co_name, code.co_firstlineno
+    )
+
+
+class StackSampler:
+    """Samples the call stack of one thread periodically.
+    The stacks are counted in collapsed form, as used by flamegraph tools.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, thread_id: int) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(thread_id,), name="cw2-stack-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, thread_id: int) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def write(self, file_name: str) -> None:
+        with open(file_name, "w") as f:
+            for stack, n in self.stacks.most_common():
+                f.write("{} {}\n".format(stack, n))
+
+
+class TaskProfiler:
+    """Profiles a task with cProfile and / or tracemalloc.
+    Either the whole task or only every n-th iteration of an iterative experiment is profiled.
+    """
+
+    def __init__(self, mode: str = MODE_CPU, every: int = None, n_frames: int = 25):
+        """
+        Args:
+            mode (str, optional): "cpu", "mem" or "both". Defaults to "cpu".
+            every (int, optional): only profile every n-th iteration. Defaults to the whole task.
+            n_frames (int, optional): depth of the recorded allocation tracebacks. Defaults to 25.
+        """
+        self.cpu = mode in [MODE_CPU, MODE_BOTH]
+        self.mem = mode in [MODE_MEM, MODE_BOTH]
+        self.every = every
+        self.n_frames = n_frames
+
+        self.profile = cProfile.Profile() if self.cpu else None
+        self.sampler = StackSampler() if self.cpu else None
+        self.snapshot = None
+        self.peak_bytes = 0
+        self.n_regions = 0
+        self._was_tracing = False
+
+    @staticmethod
+    def from_config(cw_config: dict) -> Optional["TaskProfiler"]:
+        """create a profiler if the task was marked by annotate_configs().
+
+        Args:
+            cw_config (dict): task configuration
+
+        Returns:
+            Optional[TaskProfiler]: profiler or None
+        """
+        conf = cw_config.get(KEYS.i_PROFILE, None)
+        if not conf:
+            return None
+        return TaskProfiler(conf["mode"], conf.get("every", None))
+
+    def _enable(self) -> None:
+        self.n_regions += 1
+        if self.mem:
+            # do not interfere with tracing started by the experiment itself
+            self._was_tracing = tracemalloc.is_tracing()
+            if self._was_tracing:
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start(self.n_frames)
+        if self.cpu:
+            self.sampler.start(threading.get_ident())
+            self.profile.enable()
+
+    def _disable(self) -> None:
+        if self.cpu:
+            self.profile.disable()
+            self.sampler.stop()
+        if self.mem:
+            self.peak_bytes = max(self.peak_bytes, tracemalloc.get_traced_memory()[1])
+            self.snapshot = tracemalloc.take_snapshot()
+            if not self._was_tracing:
+                tracemalloc.stop()
+
+    @contextlib.contextmanager
+    def task(self, iterative: bool = False):
+        """profiles the enclosed task.
+
+        Args:
+            iterative (bool, optional): the task runs an iterative experiment, which calls iteration(). Defaults to False.
+        """
+        if self.every is not None and iterative:
+            token = _current_profiler.set(self)
+            try:
+                yield self
+            finally:
+                _current_profiler.reset(token)
+            return
+
+        self._enable()
+        try:
+            yield self
+        finally:
+            self._disable()
+
+    @contextlib.contextmanager
+    def iteration(self, n: int):
+        """profiles the enclosed iteration, if it is sampled.
+
+        Args:
+            n (int): iteration counter
+        """
+        if n % self.every != 0:
+            yield self
+            return
+
+        self._enable()
+        try:
+            yield self
+        finally:
+            self._disable()
+
+    def write(self, rep_log_path: str) -> None:
+        """write the profiling results into the repetition directory.
+
+        Args:
+            rep_log_path (str): repetition directory
+        """
+        if self.n_regions == 0:
+            return
+
+        if self.cpu:
+            self.profile.dump_stats(os.path.join(rep_log_path, "profile_cpu.prof"))
+            s = io.StringIO()
+            pstats.Stats(self.profile, stream=s).sort_stats("cumulative").print_stats(50)
+            with open(os.path.join(rep_log_path, "profile_cpu.txt"), "w") as f:
+                f.write(s.getvalue())
+            self.sampler.write(os.path.join(rep_log_path, "profile_cpu.collapsed"))
+
+        if self.mem and self.snapshot is not None:
+            self._write_mem(rep_log_path)
+
+        cw_logging.getLogger().info(
+            "Profile written to {} ({} profiled regions)".format(rep_log_path, self.n_regions)
+        )
+
+    def _write_mem(self, rep_log_path: str) -> None:
+        snapshot = self.snapshot.filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ]
+        )
+        with open(os.path.join(rep_log_path, "profile_mem.txt"), "w") as f:
+            f.write("Peak traced memory: {:.1f} MiB\n".format(self.peak_bytes / 2**20))
+            f.write("Allocations alive at the end of the last profiled region:\n")
+            for stat in snapshot.statistics("lineno")[:50]:
+                f.write("{}\n".format(stat))
+
+        stacks = collections.Counter()
+        for stat in snapshot.statistics("traceback"):
+            stack = ";".join(
+                "{}:{}".format(os.path.basename(fr.filename), fr.lineno)
+                for fr in stat.traceback
+            )
+            stacks[stack] += stat.size
+        with open(os.path.join(rep_log_path, "profile_mem.collapsed"), "w") as f:
+            for stack, size in stacks.most_common():
+                f.write("{} {}\n".format(stack, size))
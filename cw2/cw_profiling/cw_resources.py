@@ -0,0 +1,214 @@
+import csv
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from cw2.cw_config import cw_conf_keys as KEYS
+from cw2.cw_data import cw_archive, cw_logging
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+FIELDS = [
+    "t",
+    "cpu_user_s",
+    "cpu_system_s",
+    "rss_bytes",
+    "peak_rss_bytes",
+    "read_bytes",
+    "write_bytes",
+    "threads",
+    "voluntary_ctxt_switches",
+    "nonvoluntary_ctxt_switches",
+]
+
+
+def _read_status() -> Dict:
+    res = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            k, _, v = line.partition(":")
+            if k == "VmRSS":
+                res["rss_bytes"] = int(v.split()[0]) * 1024
+            elif k == "VmHWM":
+                res["peak_rss_bytes"] = int(v.split()[0]) * 1024
+            elif k == "Threads":
+                res["threads"] = int(v)
+            elif k in ("voluntary_ctxt_switches", "nonvoluntary_ctxt_switches"):
+                res[k] = int(v)
+    return res
+
+
+def _read_stat() -> Dict:
+    with open("/proc/self/stat") as f:
+        # the process name may contain spaces, fields start after the closing bracket
+        fields = f.read().rpartition(")")[2].split()
+    return {
+        "cpu_user_s": int(fields[11]) / _CLK_TCK,
+        "cpu_system_s": int(fields[12]) / _CLK_TCK,
+    }
+
+
+def _read_io() -> Dict:
+    res = {}
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                k, _, v = line.partition(":")
+                if k in ("read_bytes", "write_bytes"):
+                    res[k] = int(v)
+    except OSError:
+        # /proc/self/io is not available on every kernel / container
+        pass
+    return res
+
+
+def sample() -> Dict:
+    """read the current resource usage of this process from /proc/self.
+
+    Returns:
+        Dict: resource usage, keys according to FIELDS
+    """
+    res = {"t": time.monotonic()}
+    res.update(_read_stat())
+    res.update(_read_status())
+    res.update(_read_io())
+    return res
+
+
+class ResourceSampler:
+    """Samples the resource usage of the process from /proc/self in a daemon thread.
+    Note that all tasks running in the same process share these counters.
+    """
+
+    def __init__(
+        self,
+        interval: float = 1.0,
+        csv_name: str = "resources.csv",
+        json_name: str = "resources.json",
+    ):
+        """
+        Args:
+            interval (float, optional): sampling interval in seconds. Defaults to 1.0.
+            csv_name (str, optional): file name of the time series in the repetition directory. Defaults to "resources.csv".
+            json_name (str, optional): file name of the summary in the repetition directory. Defaults to "resources.json".
+        """
+        self.interval = interval
+        self.csv_name = csv_name
+        self.json_name = json_name
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def from_config(cw_config: dict) -> Optional["ResourceSampler"]:
+        """create a sampler if the `resources` keyword is set in the configuration.
+
+        Args:
+            cw_config (dict): clusterwork experiment configuration
+
+        Returns:
+            Optional[ResourceSampler]: sampler or None
+        """
+        conf = cw_config.get(KEYS.RESOURCES, False)
+        if not conf or not os.path.exists("/proc/self/stat"):
+            return None
+        if isinstance(conf, dict):
+            return ResourceSampler(**conf)
+        return ResourceSampler()
+
+    def start(self) -> None:
+        self.samples = [sample()]
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="cw2-resource-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.samples.append(sample())
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.samples.append(sample())
+
+    def summary(self) -> Dict:
+        """
+        Returns:
+            Dict: usage of the sampled period. CPU time, I/O and context switches are differences.
+        """
+        first, last = self.samples[0], self.samples[-1]
+        wall = last["t"] - first["t"]
+        res = {"wall_s": wall, "n_samples": len(self.samples)}
+        for k in (
+            "cpu_user_s",
+            "cpu_system_s",
+            "read_bytes",
+            "write_bytes",
+            "voluntary_ctxt_switches",
+            "nonvoluntary_ctxt_switches",
+        ):
+            if k in first and k in last:
+                res[k] = last[k] - first[k]
+        res["cpu_s"] = res["cpu_user_s"] + res["cpu_system_s"]
+        res["cpu_utilization"] = res["cpu_s"] / wall if wall > 0 else 0.0
+        res["mean_rss_bytes"] = sum(s.get("rss_bytes", 0) for s in self.samples) / len(
+            self.samples
+        )
+        res["peak_rss_bytes"] = max(s.get("peak_rss_bytes", 0) for s in self.samples)
+        res["max_threads"] = max(s.get("threads", 0) for s in self.samples)
+        return res
+
+    def write(self, rep_log_path: str) -> Dict:
+        """write time series and summary into the repetition directory and log the summary.
+
+        Args:
+            rep_log_path (str): repetition directory
+
+        Returns:
+            Dict: summary
+        """
+        t0 = self.samples[0]["t"]
+        with open(os.path.join(rep_log_path, self.csv_name), "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            for s in self.samples:
+                writer.writerow(dict(s, t=s["t"] - t0))
+
+        summary = self.summary()
+        with open(os.path.join(rep_log_path, self.json_name), "w") as f:
+            json.dump(summary, f, indent=2)
+
+        cw_logging.getLogger().info(
+            "Resources: {:.1f} s CPU ({:.0f}% utilization), peak RSS {:.1f} MiB, "
+            "read {:.1f} MiB, written {:.1f} MiB".format(
+                summary["cpu_s"],
+                100 * summary["cpu_utilization"],
+                summary["peak_rss_bytes"] / 2**20,
+                summary.get("read_bytes", 0) / 2**20,
+                summary.get("write_bytes", 0) / 2**20,
+            )
+        )
+        return summary
+
+
+def read_resources(rep_log_path: str, json_name: str = "resources.json") -> Optional[Dict]:
+    """read the resource summary of a repetition.
+
+    Args:
+        rep_log_path (str): repetition directory
+        json_name (str, optional): name of the summary file. Defaults to "resources.json".
+
+    Returns:
+        Optional[Dict]: summary or None if it does not exist
+    """
+    path = os.path.join(rep_log_path, json_name)
+    if not cw_archive.exists(path):
+        return None
+    with cw_archive.open_file(path) as f:
+        return json.load(f)
@@ -0,0 +1,153 @@
+import collections
+import json
+import os
+import time
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from cw2.cw_config import cw_conf_keys as KEYS
+from cw2.cw_data import cw_archive, cw_logging
+
+
+class PhaseHistogram:
+    """Histogram of durations in nanoseconds with power-of-two buckets.
+    Additionally keeps the last `window` durations to describe the recent behaviour.
+    """
+
+    def __init__(self, window: int = 100):
+        self.buckets = collections.Counter()
+        self.recent = collections.deque(maxlen=window)
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = 0
+
+    def add(self, ns: int) -> None:
+        self.buckets[int(ns).bit_length()] += 1
+        self.recent.append(ns)
+        self.count += 1
+        self.total_ns += ns
+        self.max_ns = max(self.max_ns, ns)
+        self.min_ns = ns if self.min_ns is None else min(self.min_ns, ns)
+
+    def quantile(self, q: float) -> float:
+        """approximate quantile in ns. Returns the upper edge of the matching bucket."""
+        if self.count == 0:
+            return float("nan")
+        rank = q * (self.count - 1)
+        seen = 0
+        for b in sorted(self.buckets):
+            seen += self.buckets[b]
+            if seen > rank:
+                return float(min(2**b - 1, self.max_ns))
+        return float(self.max_ns)
+
+    def summary(self, quantiles: Iterable[float] = (0.5, 0.9, 0.99)) -> dict:
+        if self.count == 0:
+            return {"count": 0}
+        res = {
+            "count": self.count,
+            "total_s": self.total_ns / 1e9,
+            "mean_ms": self.total_ns / self.count / 1e6,
+            "min_ms": self.min_ns / 1e6,
+            "max_ms": self.max_ns / 1e6,
+            "recent_mean_ms": float(np.mean(self.recent)) / 1e6,
+        }
+        for q in quantiles:
+            res["p{:g}_ms".format(q * 100)] = self.quantile(q) / 1e6
+        res["histogram"] = {str(2**b): n for b, n in sorted(self.buckets.items())}
+        return res
+
+
+class IterationTimer:
+    """Measures the phases of each iteration of an AbstractIterativeExperiment
+    with the monotonic, high resolution time.perf_counter_ns clock.
+    """
+
+    PHASES = ("iterate", "log", "save_state")
+
+    def __init__(self, window: int = 100, file_name: str = "timing.json"):
+        """
+        Args:
+            window (int, optional): number of recent iterations for the rolling statistics. Defaults to 100.
+            file_name (str, optional): name of the summary file in the repetition directory. Defaults to "timing.json".
+        """
+        self.window = window
+        self.file_name = file_name
+        self.phases = {p: PhaseHistogram(window) for p in self.PHASES}
+        self._t0 = time.perf_counter_ns()
+
+    @staticmethod
+    def from_config(cw_config: dict) -> Optional["IterationTimer"]:
+        """create a timer if the `timing` keyword is set in the configuration.
+
+        Args:
+            cw_config (dict): clusterwork experiment configuration
+
+        Returns:
+            Optional[IterationTimer]: timer or None
+        """
+        conf = cw_config.get(KEYS.TIMING, False)
+        if not conf:
+            return None
+        if isinstance(conf, dict):
+            return IterationTimer(**conf)
+        return IterationTimer()
+
+    def start(self) -> int:
+        return time.perf_counter_ns()
+
+    def stop(self, phase: str, start: int) -> None:
+        self.phases[phase].add(time.perf_counter_ns() - start)
+
+    def summary(self) -> Dict:
+        """
+        Returns:
+            Dict: per phase statistics and the share of the wall time spent in each phase
+        """
+        wall = time.perf_counter_ns() - self._t0
+        res = {"wall_s": wall / 1e9, "phases": {}}
+        for p, h in self.phases.items():
+            res["phases"][p] = h.summary()
+            res["phases"][p]["share"] = h.total_ns / wall if wall else 0.0
+        return res
+
+    def write(self, rep_log_path: str) -> Dict:
+        """write the summary as json into the repetition directory and log a short overview.
+
+        Args:
+            rep_log_path (str): repetition directory
+
+        Returns:
+            Dict: summary
+        """
+        summary = self.summary()
+        with open(os.path.join(rep_log_path, self.file_name), "w") as f:
+            json.dump(summary, f, indent=2)
+
+        msg = ", ".join(
+            "{} {:.1f}% ({:.3f} ms/iter)".format(
+                p, 100 * s["share"], s.get("mean_ms", 0.0)
+            )
+            for p, s in summary["phases"].items()
+        )
+        cw_logging.getLogger().info("Timing: {}".format(msg))
+        return summary
+
+
+def read_timing(rep_log_path: str, file_name: str = "timing.json") -> Optional[Dict]:
+    """read the timing summary of a repetition.
+
+    Args:
+        rep_log_path (str): repetition directory
+        file_name (str, optional): name of the summary file. Defaults to "timing.json".
+
+    Returns:
+        Optional[Dict]: summary or None if it does not exist
+    """
+    path = os.path.join(rep_log_path, file_name)
+    if not cw_archive.exists(path):
+        return None
+    with cw_archive.open_file(path) as f:
+        return json.load(f)
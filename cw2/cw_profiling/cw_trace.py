@@ -0,0 +1,168 @@
+import contextlib
+import contextvars
+import glob
+import json
+import os
+import socket
+import threading
+import time
+from typing import Dict, List, Optional
+
+ENV_TRACE_DIR = "CW2_TRACE_DIR"
+TRACE_FILE = "trace.json"
+
+_slot = contextvars.ContextVar("cw2_trace_slot", default=None)
+_lock = threading.Lock()
+_files = {}
+
+
+def trace_dir() -> Optional[str]:
+    """
+    Returns:
+        Optional[str]: directory of the trace events, if tracing is enabled via the CW2_TRACE_DIR environment variable.
+    """
+    return os.environ.get(ENV_TRACE_DIR) or None
+
+
+def _now_us() -> float:
+    # wall clock, so events of different processes can be merged
+    return time.time_ns() / 1000
+
+
+def _emit(event: Dict) -> None:
+    """internal function. appends an event to the trace file of this process."""
+    d = trace_dir()
+    if d is None:
+        return
+
+    event["pid"] = os.getpid()
+    event["tid"] = threading.get_native_id()
+    slot = _slot.get()
+    if slot is not None:
+        event.setdefault("args", {})["slot"] = slot
+
+    line = json.dumps(event, default=str) + "\n"
+    with _lock:
+        key = (d, os.getpid())
+        f = _files.get(key)
+        if f is None:
+            os.makedirs(d, exist_ok=True)
+            f = open(
+                os.path.join(
+                    d, "trace_{}_{}.jsonl".format(socket.gethostname(), os.getpid())
+                ),
+                "a",
+            )
+            _files[key] = f
+        f.write(line)
+        f.flush()
+
+
+def instant(name: str, **kwargs) -> None:
+    """record a point in time, e.g. when a task was queued.
+
+    Args:
+        name (str): event name
+        **kwargs: additional event arguments
+    """
+    if trace_dir() is None:
+        return
+    _emit({"name": name, "cat": "cw2", "ph": "i", "s": "p", "ts": _now_us(), "args": kwargs})
+
+
+@contextlib.contextmanager
+def span(name: str, **kwargs):
+    """record the duration of the enclosed block.
+
+    Args:
+        name (str): event name
+        **kwargs: additional event arguments
+    """
+    if trace_dir() is None:
+        yield
+        return
+
+    start = _now_us()
+    try:
+        yield
+    finally:
+        _emit(
+            {
+                "name": name,
+                "cat": "cw2",
+                "ph": "X",
+                "ts": start,
+                "dur": _now_us() - start,
+                "args": kwargs,
+            }
+        )
+
+
+@contextlib.contextmanager
+def slot(idx: int, **kwargs):
+    """record the time a resource slot is held. All events in the block are annotated with the slot.
+
+    Args:
+        idx (int): index of the slot
+        **kwargs: additional event arguments
+    """
+    token = _slot.set(idx)
+    try:
+        with span("slot {}".format(idx), **kwargs):
+            yield
+    finally:
+        _slot.reset(token)
+
+
+def merge(directory: str, out: str = None) -> str:
+    """merge the per-process event files into one Chrome trace-event JSON file.
+    The result can be opened in chrome://tracing or Perfetto.
+
+    Args:
+        directory (str): trace directory
+        out (str, optional): output file. Defaults to trace.json in the trace directory.
+
+    Returns:
+        str: path of the merged trace
+    """
+    if out is None:
+        out = os.path.join(directory, TRACE_FILE)
+
+    events = []
+    processes = {}
+    for path in sorted(glob.glob(os.path.join(directory, "trace_*.jsonl"))):
+        host = os.path.basename(path)[len("trace_") : -len(".jsonl")].rpartition("_")[0]
+        with open(path) as f:
+            for line in f:
+                try:
+                    e = json.loads(line)
+                except ValueError:
+                    # incomplete last line of a killed process
+                    continue
+                processes[e["pid"]] = "{}:{}".format(host, e["pid"])
+                events.append(e)
+
+    events.sort(key=lambda e: e["ts"])
+    meta = [
+        {"name": "process_name", "ph": "M", "pid": pid, "args": {"name": name}}
+        for pid, name in processes.items()
+    ]
+
+    tmp = out + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"traceEvents": meta + events, "displayTimeUnit": "ms"}, f)
+    os.replace(tmp, out)
+    return out
+
+
+def load(path: str) -> List[Dict]:
+    """read the events of a merged trace file.
+
+    Args:
+        path (str): trace file
+
+    Returns:
+        List[Dict]: trace events
+    """
+    with open(path) as f:
+        return json.load(f)["traceEvents"]
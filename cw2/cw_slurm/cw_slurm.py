@@ -86,6 +86,16 @@ class SlurmConfig:
             sc[SKEYS.CW_ARGS] += " -o"
         if cw_options["experiments"] is not None:
             sc[SKEYS.CW_ARGS] += " -e " + " ".join(cw_options["experiments"])
+        if cw_options.get("profile") is not None:
+            sc[SKEYS.CW_ARGS] += " --profile " + cw_options["profile"]
+            if cw_options.get("profile_tasks") is not None:
+                sc[SKEYS.CW_ARGS] += " --profile-tasks " + " ".join(
+                    str(t) for t in cw_options["profile_tasks"]
+                )
+            if cw_options.get("profile_every") is not None:
+                sc[SKEYS.CW_ARGS] += " --profile-every {}".format(
+                    cw_options["profile_every"]
+                )
 
     def _complete_sbatch_args(self):
         """if optional SBATCH arguments are present, build a corresponding string."""
@@ -1,11 +1,28 @@
 import abc
 import datetime as dt
+from typing import List, Optional
 
-from cw2.cw_data import cw_logging
+from cw2.cw_config import cw_conf_keys as KEYS
+from cw2.cw_data import cw_checkpoint, cw_logging
 from cw2.cw_error import ExperimentSurrender
+from cw2.cw_profiling import cw_profiler, cw_timing
 
 
 class AbstractExperiment(abc.ABC):
+    def setup_job(self, cw_configs: List[dict]):
+        """optional. Called once per job before its repetitions start, e.g. to load a dataset or build simulators
+        needed by all repetitions. The result is available as `self.job_resources` in initialize() and run().
+        Local schedulers call it before the worker processes are forked, so the workers share the result copy-on-write
+        instead of receiving a pickled copy per task.
+
+        Args:
+            cw_configs (List[dict]): task configurations of the job
+
+        Returns:
+            any object shared by the tasks of the job
+        """
+        return None
+
     @abc.abstractmethod
     def initialize(
         self, cw_config: dict, rep: int, logger: cw_logging.LoggerArray
@@ -74,21 +91,239 @@ class AbstractIterativeExperiment(AbstractExperiment):
         """
         raise NotImplementedError
 
+    def snapshot_state(self, cw_config: dict, rep: int, n: int):
+        """optional. Needed for asynchronous checkpointing.
+        Returns an in-memory copy of the state, which is not modified by later iterations.
+
+        Arguments:
+            cw_config {dict} -- clusterwork experiment configuration
+            rep {int} -- repitition counter
+            n {int} -- iteration counter
+
+        Returns:
+            snapshot of the state
+        """
+        raise NotImplementedError(
+            "Asynchronous checkpointing requires an implementation of snapshot_state()."
+        )
+
+    def write_state(self, snapshot, path: str) -> None:
+        """optional. Writes a snapshot of snapshot_state() to disk for asynchronous checkpointing.
+        Called on a background thread. Defaults to pickling the snapshot.
+
+        Arguments:
+            snapshot -- snapshot of the state
+            path {str} -- file path, renamed to the checkpoint file afterwards
+        """
+        cw_checkpoint.write_pickle(snapshot, path)
+
     def run(self, cw_config: dict, rep: int, logger: cw_logging.LoggerArray) -> None:
+        timer = cw_timing.IterationTimer.from_config(cw_config)
+        if timer is None:
+            self._run_iterations(cw_config, rep, logger)
+            return
+
+        try:
+            self._run_iterations(cw_config, rep, logger, timer)
+        finally:
+            timer.write(cw_config[KEYS.i_REP_LOG_PATH])
+
+    def _run_iterations(
+        self,
+        cw_config: dict,
+        rep: int,
+        logger: cw_logging.LoggerArray,
+        timer: cw_timing.IterationTimer = None,
+    ) -> None:
+        checkpoint = cw_checkpoint.Checkpointer.from_config(cw_config)
+        if checkpoint is None:
+            self._iterate_all(cw_config, rep, logger, timer)
+            return
+
+        checkpoint.start(self, cw_config, rep)
+        crashed = True
+        try:
+            self._iterate_all(cw_config, rep, logger, timer, checkpoint)
+            crashed = False
+        except ExperimentSurrender:
+            crashed = False
+            raise
+        finally:
+            # final synchronous flush, also on surrender
+            checkpoint.close(final=not crashed)
+
+    def _iterate_all(
+        self,
+        cw_config: dict,
+        rep: int,
+        logger: cw_logging.LoggerArray,
+        timer: cw_timing.IterationTimer = None,
+        checkpoint: cw_checkpoint.Checkpointer = None,
+    ) -> None:
+        profiler = cw_profiler.current()
         for n in range(cw_config["iterations"]):
             surrender = False
+            t = timer.start() if timer else 0
             try:
-                res = self.iterate(cw_config, rep, n)
+                if profiler is not None:
+                    with profiler.iteration(n):
+                        res = self.iterate(cw_config, rep, n)
+                else:
+                    res = self.iterate(cw_config, rep, n)
             except ExperimentSurrender as e:
                 res = e.payload
                 surrender = True
 
+            if timer:
+                timer.stop("iterate", t)
+                t = timer.start()
             res["ts"] = dt.datetime.now()
             res["rep"] = rep
             res["iter"] = n
             logger.process(res)
 
-            self.save_state(cw_config, rep, n)
+            if timer:
+                timer.stop("log", t)
+                t = timer.start()
+            if checkpoint is None:
+                self.save_state(cw_config, rep, n)
+            else:
+                checkpoint.step(n, res)
+            if timer:
+                timer.stop("save_state", t)
+
+            if surrender:
+                raise ExperimentSurrender()
+
+
+class AbstractBatchedExperiment(AbstractExperiment):
+    """Runs a batch of tasks of the same job in a single call, e.g. vectorized over seeds or parameter settings.
+    The batch size is set by the `reps_batched` keyword. Each task keeps its own loggers and repetition directory,
+    as if it had run separately.
+    """
+
+    @abc.abstractmethod
+    def initialize(
+        self,
+        cw_configs: List[dict],
+        reps: List[int],
+        loggers: List[cw_logging.LoggerArray],
+    ) -> None:
+        """needs to be implemented by subclass.
+        Called once at the start of each batch for initialization purposes.
+
+        Args:
+            cw_configs (List[dict]): clusterwork experiment configurations of the tasks
+            reps (List[int]): repetition counters of the tasks
+            loggers (List[cw_logging.LoggerArray]): initialized loggers of the tasks
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def run(
+        self,
+        cw_configs: List[dict],
+        reps: List[int],
+        loggers: List[cw_logging.LoggerArray],
+    ) -> Optional[List[dict]]:
+        """needs to be implemented by subclass.
+        Called after initialize(). Should be the main procedure of the experiment.
+
+        Args:
+            cw_configs (List[dict]): clusterwork experiment configurations of the tasks
+            reps (List[int]): repetition counters of the tasks
+            loggers (List[cw_logging.LoggerArray]): loggers of the tasks
+
+        Returns:
+            Optional[List[dict]]: one result per task, processed by the loggers of the task. None if the experiment logged itself.
+        """
+        raise NotImplementedError
+
+
+class AbstractBatchedIterativeExperiment(AbstractBatchedExperiment):
+    @abc.abstractmethod
+    def iterate(self, cw_configs: List[dict], reps: List[int], n: int) -> List[dict]:
+        """needs to be implemented by subclass.
+        The iteration procedure for the whole batch.
+
+        Args:
+            cw_configs (List[dict]): clusterwork experiment configurations of the tasks
+            reps (List[int]): repetition counters of the tasks
+            n (int): iteration counter
+
+        Returns:
+            List[dict]: one result map per task
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def save_state(self, cw_configs: List[dict], reps: List[int], n: int) -> None:
+        """needs to be implemented by subclass.
+        Intended to save an intermediate state after each iteration.
+
+        Args:
+            cw_configs (List[dict]): clusterwork experiment configurations of the tasks
+            reps (List[int]): repetition counters of the tasks
+            n (int): iteration counter
+        """
+        raise NotImplementedError
+
+    def run(
+        self,
+        cw_configs: List[dict],
+        reps: List[int],
+        loggers: List[cw_logging.LoggerArray],
+    ) -> None:
+        timer = cw_timing.IterationTimer.from_config(cw_configs[0])
+        if timer is None:
+            self._run_iterations(cw_configs, reps, loggers)
+            return
+
+        try:
+            self._run_iterations(cw_configs, reps, loggers, timer)
+        finally:
+            for c in cw_configs:
+                timer.write(c[KEYS.i_REP_LOG_PATH])
+
+    def _run_iterations(
+        self,
+        cw_configs: List[dict],
+        reps: List[int],
+        loggers: List[cw_logging.LoggerArray],
+        timer: cw_timing.IterationTimer = None,
+    ) -> None:
+        profiler = cw_profiler.current()
+        for n in range(cw_configs[0]["iterations"]):
+            surrender = False
+            t = timer.start() if timer else 0
+            try:
+                if profiler is not None:
+                    with profiler.iteration(n):
+                        results = self.iterate(cw_configs, reps, n)
+                else:
+                    results = self.iterate(cw_configs, reps, n)
+            except ExperimentSurrender as e:
+                results = e.payload
+                if not isinstance(results, list):
+                    results = [dict(results) for _ in cw_configs]
+                surrender = True
+
+            if timer:
+                timer.stop("iterate", t)
+                t = timer.start()
+            ts = dt.datetime.now()
+            for res, rep, logger in zip(results, reps, loggers):
+                res["ts"] = ts
+                res["rep"] = rep
+                res["iter"] = n
+                logger.process(res)
+
+            if timer:
+                timer.stop("log", t)
+                t = timer.start()
+            self.save_state(cw_configs, reps, n)
+            if timer:
+                timer.stop("save_state", t)
 
             if surrender:
                 raise ExperimentSurrender()
@@ -1,9 +1,23 @@
+import contextlib
+import copy
+import itertools
+import json
 import os
-from typing import Dict, List, Type
+import time
+from typing import Dict, List, Optional, Type
 
 from cw2 import cw_error, experiment
+from cw2.cw_config import conf_index, conf_path
 from cw2.cw_config import cw_conf_keys as KEYS
-from cw2.cw_data import cw_logging
+from cw2.cw_data import cw_archive, cw_logging, cw_scratch
+from cw2.cw_profiling import cw_profiler, cw_resources, cw_trace
+
+SETUP_FILE = "job_setup.json"
+
+# setup_job() results: job key -> (pid of the setup, result, setup seconds).
+# Filled before worker processes are forked, so they inherit the results instead of unpickling copies.
+_job_resources = {}
+_job_counter = itertools.count()
 
 
 class Job:
@@ -12,6 +26,10 @@ class Job:
     A task is an experiment configuration with unique repetition idx.
     """
 
+    # Only set for jobs with a setup_job() hook, most jobs never need them.
+    _key = None
+    setup_stats = None
+
     def __init__(
         self,
         tasks: List[Dict],
@@ -63,57 +81,290 @@ class Job:
             """
             os.makedirs(rep_path, exist_ok=True)
 
+    @property
+    def key(self) -> tuple:
+        """
+        Returns:
+            tuple: identifies the setup_job() result of this job in _job_resources. Created on first use.
+        """
+        if self._key is None:
+            self._key = (os.getpid(), next(_job_counter))
+        return self._key
+
+    def has_setup(self) -> bool:
+        """
+        Returns:
+            bool: True if the experiment implements the setup_job() hook
+        """
+        exp = getattr(self, "exp", None)
+        return (
+            exp is not None
+            and type(exp).setup_job is not experiment.AbstractExperiment.setup_job
+        )
+
+    def setup(self) -> bool:
+        """runs the setup_job() hook of the experiment, once per job and process.
+
+        Returns:
+            bool: True if the setup ran in this call, False if the result already existed
+        """
+        if not self.has_setup() or self.key in _job_resources:
+            return False
+        t = time.perf_counter()
+        res = self.exp.setup_job(self.tasks)
+        duration = time.perf_counter() - t
+        _job_resources[self.key] = (os.getpid(), res, duration)
+        cw_logging.getLogger().info(
+            "setup_job() took {:.2f}s, shared by {} tasks".format(duration, len(self.tasks))
+        )
+        return True
+
+    def teardown(self) -> Optional[Dict]:
+        """releases the setup_job() result of this process and summarizes the setup time saved by sharing it,
+        from the records the tasks wrote into their repetition directories.
+
+        Returns:
+            Optional[Dict]: number of tasks and setups, seconds per setup and saved seconds. None without setup in this process.
+                Also stored in `setup_stats`.
+        """
+        if self._key is None:
+            return None
+        entry = _job_resources.pop(self._key, None)
+        if entry is None:
+            return None
+
+        tasks, setups = 0, 1
+        for c in self.tasks:
+            fpath = os.path.join(self._root_dir, c[KEYS.i_REP_LOG_PATH], SETUP_FILE)
+            try:
+                with open(fpath) as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                continue
+            tasks += 1
+            setups += record["ran_setup"]
+
+        duration = entry[2]
+        stats = {
+            "tasks": tasks,
+            "setups": setups,
+            "setup_s": duration,
+            "saved_s": (tasks - setups) * duration,
+        }
+        self.setup_stats = stats
+        cw_logging.getLogger().info(
+            "setup_job(): {} setups for {} tasks, saved {:.2f}s".format(
+                setups, tasks, stats["saved_s"]
+            )
+        )
+        return stats
+
+    def batches(self) -> List[List[Dict]]:
+        """groups the tasks of the job into batches of `reps_batched` tasks for an AbstractBatchedExperiment.
+        All tasks of the job form one batch if the key is missing. Other experiments get batches of a single task.
+
+        Returns:
+            List[List[attrdict.AttrDict]]: batches of task configurations
+        """
+        size = 1
+        if isinstance(getattr(self, "exp", None), experiment.AbstractBatchedExperiment):
+            size = self.tasks[0].get(KEYS.REPS_BATCHED, len(self.tasks))
+        return [self.tasks[i : i + size] for i in range(0, len(self.tasks), size)]
+
     def run_task(self, c: Dict, overwrite: bool):
         """Execute a single task of the job.
 
         Args:
             c (attrdict.AttrDict): task configuration
         """
-        rep_path = c[KEYS.i_REP_LOG_PATH]
-        r = c[KEYS.i_REP_IDX]
-        print(rep_path)
+        self.run_batch([c], overwrite)
+
+    def run_batch(self, cs: List[Dict], overwrite: bool):
+        """Execute a batch of tasks with a single call of an AbstractBatchedExperiment.
+        Each task gets its own copy of the loggers, so the results are written as if the tasks had run separately.
+        Other experiments only run batches with a single task.
 
-        if not overwrite and self._check_task_exists(c, r):
-            cw_logging.getLogger().warning(
-                "Skipping run, as {} is not empty. Use -o to overwrite.".format(
-                    rep_path
+        Args:
+            cs (List[attrdict.AttrDict]): task configurations
+        """
+        todo = []
+        for c in cs:
+            rep_path = c[KEYS.i_REP_LOG_PATH]
+            print(rep_path)
+
+            if not overwrite and self._check_task_exists(c, c[KEYS.i_REP_IDX]):
+                cw_logging.getLogger().warning(
+                    "Skipping run, as {} is not empty. Use -o to overwrite.".format(
+                        rep_path
+                    )
                 )
-            )
+                continue
+            todo.append(c)
+        if len(todo) == 0:
             return
 
+        setup = None
+        if self.has_setup():
+            ran_setup = self.setup()
+            pid, self.exp.job_resources, duration = _job_resources[self.key]
+            setup = {
+                "setup_s": duration,
+                "ran_setup": ran_setup,
+                "setup_pid": pid,
+                "pid": os.getpid(),
+            }
+
+        for c in todo:
+            # a repetition which runs again is unfinished until it completes
+            conf_index.unmark_completed(c, self._root_dir)
+
+        configs = todo
+        scratches = []
+        try:
+            todo = []
+            for c in configs:
+                s = cw_scratch.Scratch.from_config(c)
+                if s is not None:
+                    c = s.stage_in(c)
+                    # only staged in scratch directories are staged out, also if a later stage-in fails
+                    scratches.append(s)
+                todo.append(c)
+
+            if setup is not None:
+                for c in todo:
+                    with open(os.path.join(c[KEYS.i_REP_LOG_PATH], SETUP_FILE), "w") as f:
+                        json.dump(setup, f)
+                    # only the first task of a batch accounts for a setup in this process
+                    setup = dict(setup, ran_setup=False)
+            status = self._execute_tasks(todo)
+        finally:
+            for s in scratches:
+                with cw_trace.span("stage out", task=s.final_path):
+                    s.stage_out()
+
+        for c in configs:
+            conf_index.mark_completed(c, status, self._root_dir)
+
+    def _execute_tasks(self, cs: List[Dict]) -> str:
+        """internal function. runs the experiment and the loggers of a batch of tasks.
+
+        Args:
+            cs (List[attrdict.AttrDict]): task configurations
+
+        Returns:
+            str: "done", "surrender" or "crash"
+        """
+        reps = [c[KEYS.i_REP_IDX] for c in cs]
+        rep_paths = [c[KEYS.i_REP_LOG_PATH] for c in cs]
+        rep_path = rep_paths[0]
+        batched = isinstance(self.exp, experiment.AbstractBatchedExperiment)
+        if len(cs) == 1:
+            loggers = [self.logger]
+        else:
+            # Loggers are stateful. Each task needs its own copy.
+            loggers = [copy.deepcopy(self.logger) for _ in cs]
+        if batched:
+            args = (cs, reps, loggers)
+        else:
+            args = (cs[0], reps[0], loggers[0])
+
         surrender = None
         crash = False
 
-        self.logger.initialize(c, r, rep_path)
+        sampler = cw_resources.ResourceSampler.from_config(cs[0])
+        if sampler is not None:
+            sampler.start()
+
         try:
-            self.exp.initialize(c, r, self.logger)
-            self.exp.run(c, r, self.logger)
-        except cw_error.ExperimentSurrender as s:
-            cw_logging.getLogger().warning("SURRENDER: {}".format(rep_path))
-            surrender = s
-        except:
-            crash = True
-            cw_logging.getLogger().exception("EXCEPTION: {}".format(rep_path))
-
-        self.exp.finalize(surrender, crash)
-        self.logger.finalize()
-
-    def load_task(self, c: Dict) -> Dict:
+            profiler = None
+            for c in cs:
+                profiler = profiler or cw_profiler.TaskProfiler.from_config(c)
+            if profiler is not None:
+                profile_ctx = profiler.task(
+                    isinstance(
+                        self.exp,
+                        (
+                            experiment.AbstractIterativeExperiment,
+                            experiment.AbstractBatchedIterativeExperiment,
+                        ),
+                    )
+                )
+            else:
+                profile_ctx = contextlib.nullcontext()
+
+            with cw_trace.span("logger initialize", task=rep_path, batch=len(cs)):
+                with cw_logging.task_batch(rep_paths):
+                    for c, r, p, logger in zip(cs, reps, rep_paths, loggers):
+                        logger.initialize(c, r, p)
+            with profile_ctx:
+                try:
+                    with cw_trace.span("initialize", task=rep_path, batch=len(cs)):
+                        self.exp.initialize(*args)
+                    with cw_trace.span("run", task=rep_path, batch=len(cs)):
+                        results = self.exp.run(*args)
+                    if batched and results is not None:
+                        for res, logger in zip(results, loggers):
+                            logger.process(res)
+                except cw_error.ExperimentSurrender as s:
+                    cw_logging.getLogger().warning("SURRENDER: {}".format(rep_path))
+                    surrender = s
+                except:
+                    crash = True
+                    cw_logging.getLogger().exception("EXCEPTION: {}".format(rep_path))
+
+                with cw_trace.span(
+                    "finalize", task=rep_path, surrender=surrender is not None, crash=crash
+                ):
+                    self.exp.finalize(surrender, crash)
+
+            if profiler is not None:
+                for p in rep_paths:
+                    profiler.write(p)
+        finally:
+            # the sampler thread must not outlive the task, also if a logger or the profiler failed
+            if sampler is not None:
+                sampler.stop()
+
+        if sampler is not None:
+            for p in rep_paths:
+                try:
+                    sampler.write(p)
+                except OSError:
+                    cw_logging.getLogger().exception(
+                        "Could not write resource usage to {}".format(p)
+                    )
+        with cw_trace.span("logger finalize", task=rep_path, batch=len(cs)):
+            for logger in loggers:
+                logger.finalize()
+
+        return "crash" if crash else "surrender" if surrender else "done"
+
+    def load_task(
+        self, c: Dict, logger: cw_logging.AbstractLogger = None, lazy: bool = False
+    ) -> Dict:
         """Load the results of a single task.
 
         Args:
             c (attrdict.AttrDict): task configuration
+            logger (cw_logging.AbstractLogger, optional): logger used for loading. Needed for concurrent loading, as loggers are stateful. Defaults to the job logger.
+            lazy (bool, optional): only load light handles, which read the data on demand. Defaults to False.
 
         Returns:
             dict: the loaded data
         """
+        if logger is None:
+            logger = self.logger
+
         rep_path = os.path.join(self._root_dir, c[KEYS.i_REP_LOG_PATH])
         r = c[KEYS.i_REP_IDX]
-        self.logger.initialize(c, r, rep_path)
-        return self.logger.load()
+        logger.initialize_load(c, r, rep_path)
+        if lazy:
+            return logger.load_lazy()
+        return logger.load()
 
     def _check_task_exists(self, c: Dict, r: int) -> bool:
         """internal function. checks if the task has already been run in the past.
+        With the sharded layout, the completion log of the experiment is read instead of the directory.
 
         Args:
             c (attrdict.AttrDict): task configuration
@@ -121,8 +372,10 @@ class Job:
         Returns:
             bool: True if the repetition was already run
         """
-        rep_path = c[KEYS.i_REP_LOG_PATH]
-        return len(os.listdir(rep_path)) != 0
+        if conf_path.is_sharded(c):
+            return conf_index.is_completed(c, self._root_dir)
+        rep_path = os.path.join(self._root_dir, c[KEYS.i_REP_LOG_PATH])
+        return len(cw_archive.listdir(rep_path)) != 0
 
 
 class JobFactory:
@@ -0,0 +1,199 @@
+import collections
+import os
+import sys
+import time
+from typing import Dict, List
+
+from cw2 import util
+from cw2.cw_config import cw_conf_keys as KEYS
+from cw2.cw_config import cw_config
+
+
+class RepTail:
+    """Follows the CSV output of a single repetition.
+    The PandasLogger rewrites the whole file after each iteration, possibly with new columns,
+    so the rows are counted again whenever the modification time or size of the file changed.
+    """
+
+    def __init__(self, csv_path: str, iterations: int = None):
+        self.csv_path = csv_path
+        self.iterations = iterations
+        self.rows = 0
+        self.exists = False
+        self._signature = None
+
+    def poll(self) -> int:
+        """count the rows again, if the file changed since the last poll.
+
+        Returns:
+            int: number of new rows since the last poll. All rows if the file was rewritten with fewer rows.
+        """
+        if self.done:
+            return 0
+
+        try:
+            st = os.stat(self.csv_path)
+        except FileNotFoundError:
+            return 0
+        self.exists = True
+
+        # stat before reading: a rewrite during the read changes the signature, so it is counted again on the next poll
+        signature = (st.st_mtime_ns, st.st_size)
+        if signature == self._signature:
+            return 0
+        self._signature = signature
+
+        lines = 0
+        with open(self.csv_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                lines += chunk.count(b"\n")
+        # Only complete lines count, without the header
+        rows = max(lines - 1, 0)
+
+        new_rows = rows if rows < self.rows else rows - self.rows
+        self.rows = rows
+        return new_rows
+
+    @property
+    def done(self) -> bool:
+        return self.iterations is not None and self.rows >= self.iterations
+
+
+class ExperimentProgress:
+    """Aggregated progress of all repetitions of one experiment."""
+
+    def __init__(self, name: str, window: float = 60.0):
+        self.name = name
+        self.reps: List[RepTail] = []
+        self.window = window
+        self._history = collections.deque()
+
+    def poll(self, now: float) -> None:
+        for r in self.reps:
+            r.poll()
+        self._history.append((now, self.rows))
+        while len(self._history) > 2 and now - self._history[1][0] > self.window:
+            self._history.popleft()
+
+    @property
+    def rows(self) -> int:
+        return sum(r.rows for r in self.reps)
+
+    @property
+    def total(self) -> int:
+        if any(r.iterations is None for r in self.reps):
+            return None
+        return sum(r.iterations for r in self.reps)
+
+    @property
+    def rate(self) -> float:
+        """iterations per second over the sliding window."""
+        if len(self._history) < 2:
+            return 0.0
+        (t0, n0), (t1, n1) = self._history[0], self._history[-1]
+        if t1 <= t0:
+            return 0.0
+        return (n1 - n0) / (t1 - t0)
+
+    @property
+    def eta(self) -> float:
+        total = self.total
+        if total is None or self.rate <= 0:
+            return None
+        return (total - self.rows) / self.rate
+
+    def summary(self) -> Dict:
+        done = sum(r.done for r in self.reps)
+        running = sum(r.exists and not r.done for r in self.reps)
+        return {
+            "name": self.name,
+            "reps": len(self.reps),
+            "done": done,
+            "running": running,
+            "pending": len(self.reps) - done - running,
+            "iterations": self.rows,
+            "total": self.total,
+            "rate": self.rate,
+            "eta": self.eta,
+        }
+
+
+class Monitor:
+    """Live progress monitor for the repetitions of a configuration.
+    Follows the PandasLogger CSV output of every repetition.
+    """
+
+    def __init__(self, conf: cw_config.Config, root_dir: str = "", window: float = 60.0):
+        self.experiments: Dict[str, ExperimentProgress] = {}
+        for c in conf.exp_configs:
+            name = c[KEYS.NAME]
+            if name not in self.experiments:
+                self.experiments[name] = ExperimentProgress(name, window)
+            csv_path = os.path.join(
+                root_dir,
+                c[KEYS.i_REP_LOG_PATH],
+                "rep_{}.csv".format(c[KEYS.i_REP_IDX]),
+            )
+            self.experiments[name].reps.append(RepTail(csv_path, c.get("iterations")))
+
+    def poll(self) -> List[Dict]:
+        now = time.monotonic()
+        for e in self.experiments.values():
+            e.poll(now)
+        return [e.summary() for e in self.experiments.values()]
+
+    @property
+    def finished(self) -> bool:
+        return all(r.done for e in self.experiments.values() for r in e.reps)
+
+    def run(self, interval: float = 5.0, once: bool = False, out=sys.stdout) -> None:
+        """poll and print the progress until all repetitions are done.
+
+        Args:
+            interval (float, optional): seconds between polls. Defaults to 5.0.
+            once (bool, optional): only print a single status. Defaults to False.
+            out (optional): output stream. Defaults to sys.stdout.
+        """
+        try:
+            while True:
+                table = format_table(self.poll())
+                if out.isatty() and not once:
+                    out.write("\033[2J\033[H")
+                out.write(table + "\n")
+                out.flush()
+                if once or self.finished:
+                    return
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+
+
+def format_table(rows: List[Dict]) -> str:
+    """format experiment summaries as a text table.
+
+    Args:
+        rows (List[Dict]): summaries, see ExperimentProgress.summary()
+
+    Returns:
+        str: table
+    """
+    header = ["EXPERIMENT", "DONE", "RUNNING", "PENDING", "ITERATIONS", "IT/S", "ETA"]
+    lines = [header]
+    for r in rows:
+        total = "?" if r["total"] is None else str(r["total"])
+        eta = "-" if r["eta"] is None else util.format_time(int(r["eta"]))
+        lines.append(
+            [
+                r["name"],
+                "{}/{}".format(r["done"], r["reps"]),
+                str(r["running"]),
+                str(r["pending"]),
+                "{}/{}".format(r["iterations"], total),
+                "{:.2f}".format(r["rate"]),
+                eta,
+            ]
+        )
+    widths = [max(len(l[i]) for l in lines) for i in range(len(header))]
+    return "\n".join(
+        "  ".join(v.ljust(w) for v, w in zip(l, widths)).rstrip() for l in lines
+    )
@@ -0,0 +1,247 @@
+import fnmatch
+import json
+import os
+from typing import Dict, List
+
+from cw2 import job
+from cw2.cw_config import cw_conf_keys as KEYS
+from cw2.cw_config import cw_config
+from cw2.cw_slurm import cw_slurm_keys as SKEYS
+
+# files ignored by the code copy, see cw_slurm.SlurmDirectoryManager._copy_files()
+COPY_IGNORE = ["*.pyc", "tmp*", ".git*"]
+
+
+def parse_slurm_time(t) -> float:
+    """convert a SLURM time limit into hours.
+    Accepted formats: minutes (int), "minutes", "minutes:seconds", "hours:minutes:seconds",
+    "days-hours", "days-hours:minutes", "days-hours:minutes:seconds".
+
+    Args:
+        t: time limit
+
+    Returns:
+        float: time limit in hours
+    """
+    if isinstance(t, (int, float)):
+        return t / 60
+
+    days = 0
+    t = str(t).strip()
+    if "-" in t:
+        d, t = t.split("-", 1)
+        days = int(d)
+        parts = [int(p) for p in t.split(":")]
+        # days-hours[:minutes[:seconds]]
+        parts += [0] * (3 - len(parts))
+        h, m, s = parts
+    else:
+        parts = [int(p) for p in t.split(":")]
+        if len(parts) == 1:
+            h, m, s = 0, parts[0], 0
+        elif len(parts) == 2:
+            h, m, s = 0, parts[0], parts[1]
+        else:
+            h, m, s = parts
+    return days * 24 + h + m / 60 + s / 3600
+
+
+def _num_gpus(slurm_conf: dict) -> int:
+    """number of GPUs per job requested by the gres sbatch argument,
+    e.g. gpu, gpu:4, gpu:a100:2 or tmpfs:10G,gpu:4."""
+    gres = slurm_conf.get(SKEYS.SBATCH_ARGS, {}).get("gres", None)
+    if gres is None:
+        return 0
+    for entry in str(gres).split(","):
+        parts = entry.strip().split(":")
+        if parts[0] != "gpu":
+            continue
+        # gpu[:type][:count], the count defaults to 1
+        if len(parts) > 1 and parts[-1].isdigit():
+            return int(parts[-1])
+        return 1
+    return 0
+
+
+def _copy_size(src: str) -> int:
+    """size in bytes of a code copy of src, honoring the ignore patterns of the copy."""
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(src):
+        if dirpath != src:
+            dirnames[:] = [
+                d for d in dirnames if not any(fnmatch.fnmatch(d, p) for p in COPY_IGNORE)
+            ]
+            filenames = [
+                f for f in filenames if not any(fnmatch.fnmatch(f, p) for p in COPY_IGNORE)
+            ]
+        for f in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, f))
+            except OSError:
+                pass
+    return total
+
+
+def _directories(configs: List[dict], root_dir: str) -> int:
+    """number of directories Job.__create_experiment_directory() would create, including parents."""
+    dirs = set()
+    for c in configs:
+        for p in [c[KEYS.PATH], c[KEYS.LOG_PATH], c[KEYS.i_REP_LOG_PATH]]:
+            p = os.path.normpath(os.path.join(root_dir, p))
+            while p not in dirs and p not in ("", ".", os.sep):
+                dirs.add(p)
+                p = os.path.dirname(p)
+    return sum(not os.path.isdir(d) for d in dirs)
+
+
+def _code_copy(slurm_conf: dict, args: dict, n_jobs: int) -> Dict:
+    """code copy mode and size, see cw_slurm.SlurmDirectoryManager.set_mode()."""
+    if args.get("nocodecopy"):
+        return {"mode": "NOCOPY", "size_mb": 0.0, "copies": 0, "total_mb": 0.0}
+
+    has_dst = SKEYS.EXP_CP_AUTO in slurm_conf or SKEYS.EXP_CP_DST in slurm_conf
+    has_src = SKEYS.EXP_CP_SRC in slurm_conf
+    src = slurm_conf.get(SKEYS.EXP_CP_SRC, os.getcwd())
+
+    if args.get("zip"):
+        mode, copies = "ZIP", 1
+    elif has_src and has_dst:
+        mode, copies = ("MULTI", n_jobs) if args.get("multicopy") else ("COPY", 1)
+    else:
+        mode, copies = "NOCOPY", 0
+
+    size = _copy_size(src) / 1e6 if copies > 0 else 0.0
+    return {
+        "mode": mode,
+        "src": src,
+        "size_mb": size,
+        "copies": copies,
+        # ZIP: the uncompressed size is an upper bound
+        "total_mb": size * copies,
+    }
+
+
+def plan(conf: cw_config.Config, args: dict = None, root_dir: str = "") -> Dict:
+    """expands the configuration and estimates the cost of a run without touching the filesystem.
+
+    Args:
+        conf (cw_config.Config): loaded configuration
+        args (dict, optional): CLI arguments. Defaults to None.
+        root_dir (str, optional): root directory of the experiment output. Defaults to "".
+
+    Returns:
+        Dict: run plan
+    """
+    if args is None:
+        args = {}
+    configs = conf.exp_configs
+    jobs = job.JobFactory(None, None, read_only=True).create_jobs(configs)
+
+    experiments = {}
+    for j in jobs:
+        name = j.tasks[0][KEYS.NAME]
+        e = experiments.setdefault(
+            name,
+            {
+                "settings": 0,
+                "tasks": 0,
+                "jobs": 0,
+                "tasks_per_job": len(j.tasks),
+                "reps_in_parallel": j.n_parallel,
+            },
+        )
+        e["tasks"] += len(j.tasks)
+        e["jobs"] += 1
+    for c in configs:
+        if c[KEYS.i_REP_IDX] == 0:
+            experiments[c[KEYS.NAME]]["settings"] += 1
+
+    res = {
+        "experiments": experiments,
+        "tasks": len(configs),
+        "jobs": len(jobs),
+        "slurm": bool(args.get("slurm")),
+        "new_directories": _directories(configs, root_dir),
+        # global config + one per experiment, see Config.to_yaml()
+        "config_files": 1 + len(experiments),
+    }
+
+    sc = conf.slurm_config
+    if sc is not None:
+        hours = parse_slurm_time(sc[SKEYS.TIME]) if SKEYS.TIME in sc else None
+        cpus = sc.get("cpus-per-task", 1) * sc.get("ntasks", 1)
+        gpus = _num_gpus(sc)
+        res["array"] = {
+            "size": len(jobs),
+            "max_parallel": sc.get("num_parallel_jobs", None),
+        }
+        res["time_limit_h"] = hours
+        res["cpus_per_job"] = cpus
+        res["gpus_per_job"] = gpus
+        if hours is not None:
+            # upper bounds: every array job may use its full time limit
+            res["core_hours"] = len(jobs) * cpus * hours
+            res["gpu_hours"] = len(jobs) * gpus * hours
+        if res["slurm"]:
+            # sbatch.sh and one out / err log per array job
+            res["slurm_files"] = 1 + 2 * len(jobs)
+            res["code_copy"] = _code_copy(sc, args, len(jobs))
+    return res
+
+
+def format_table(p: Dict) -> str:
+    """human readable summary of a run plan.
+
+    Args:
+        p (Dict): plan as returned by plan()
+
+    Returns:
+        str: table
+    """
+    lines = [
+        "{:<30} {:>10} {:>10} {:>10} {:>10} {:>10}".format(
+            "experiment", "settings", "tasks", "jobs", "tasks/job", "parallel"
+        )
+    ]
+    for name, e in p["experiments"].items():
+        lines.append(
+            "{:<30} {:>10} {:>10} {:>10} {:>10} {:>10}".format(
+                name,
+                e["settings"],
+                e["tasks"],
+                e["jobs"],
+                e["tasks_per_job"],
+                e["reps_in_parallel"],
+            )
+        )
+    lines.append("")
+
+    rows = [("tasks", p["tasks"]), ("jobs", p["jobs"])]
+    if "array" in p:
+        rows.append(("array size", p["array"]["size"]))
+        rows.append(("array max parallel", p["array"]["max_parallel"]))
+        rows.append(("time limit [h]", p["time_limit_h"]))
+        rows.append(("cpus per job", p["cpus_per_job"]))
+        rows.append(("gpus per job", p["gpus_per_job"]))
+        if "core_hours" in p:
+            rows.append(("core-hours (max)", "{:.1f}".format(p["core_hours"])))
+            rows.append(("gpu-hours (max)", "{:.1f}".format(p["gpu_hours"])))
+    rows.append(("new directories", p["new_directories"]))
+    rows.append(("config files", p["config_files"]))
+    if "slurm_files" in p:
+        rows.append(("slurm files", p["slurm_files"]))
+    if "code_copy" in p:
+        cc = p["code_copy"]
+        rows.append(
+            (
+                "code copy",
+                "{} x {} ({:.1f} MB)".format(cc["copies"], cc["mode"], cc["total_mb"]),
+            )
+        )
+    for k, v in rows:
+        lines.append("{:<30} {:>10}".format(k, str(v)))
+    return "\n".join(lines)
+
+
+def to_json(p: Dict) -> str:
+    return json.dumps(p, indent=2, default=str)
@@ -1,5 +1,6 @@
 import abc
 import concurrent.futures
+import contextlib
 import multiprocessing
 import os
 import socket
@@ -11,6 +12,7 @@ from joblib import Parallel, delayed
 from cw2 import cw_error, job
 from cw2.cw_config import cw_conf_keys as KEYS
 from cw2.cw_config import cw_config
+from cw2.cw_profiling import cw_trace
 from cw2.cw_slurm import cw_slurm
 
 
@@ -36,6 +38,19 @@ class AbstractScheduler(abc.ABC):
         """
         raise NotImplementedError
 
+    @contextlib.contextmanager
+    def _shared_setup(self):
+        """runs the setup_job() hook of all assigned jobs before worker processes are forked,
+        so the workers inherit the results copy-on-write. The results are released afterwards.
+        """
+        for j in self.joblist:
+            j.setup()
+        try:
+            yield
+        finally:
+            for j in self.joblist:
+                j.teardown()
+
 
 class GPUDistributingLocalScheduler(AbstractScheduler):
     def __init__(self, conf: cw_config.Config = None):
@@ -123,7 +138,9 @@ class MPGPUDistributingLocalScheduler(GPUDistributingLocalScheduler):
                 "parallel. Fix for optimal resource usage!!"
             )
 
-        with multiprocessing.Pool(processes=num_parallel) as pool:
+        with self._shared_setup(), multiprocessing.Pool(
+            processes=num_parallel
+        ) as pool:
             # setup gpu resource queue
             m = multiprocessing.Manager()
             gpu_queue = m.Queue(maxsize=self._queue_elements)
@@ -132,6 +149,7 @@ class MPGPUDistributingLocalScheduler(GPUDistributingLocalScheduler):
 
             for j in self.joblist:
                 for c in j.tasks:
+                    cw_trace.instant("task queued", task=c[KEYS.i_REP_LOG_PATH])
                     pool.apply_async(
                         MPGPUDistributingLocalScheduler._execute_task,
                         (j, c, gpu_queue, self._gpus_per_rep, overwrite),
@@ -147,11 +165,13 @@ class MPGPUDistributingLocalScheduler(GPUDistributingLocalScheduler):
         gpus_per_rep: int,
         overwrite: bool = False,
     ):
-        queue_idx = q.get()
+        with cw_trace.span("wait for slot", task=c[KEYS.i_REP_LOG_PATH]):
+            queue_idx = q.get()
         gpu_str = MPGPUDistributingLocalScheduler.get_gpu_str(queue_idx, gpus_per_rep)
         try:
             os.environ["CUDA_VISIBLE_DEVICES"] = gpu_str
-            j.run_task(c, overwrite)
+            with cw_trace.slot(queue_idx):
+                j.run_task(c, overwrite)
         except cw_error.ExperimentSurrender as _:
             return
         finally:
@@ -181,7 +201,7 @@ class HOREKAAffinityGPUDistributingLocalScheduler(GPUDistributingLocalScheduler)
                 "parallel. Fix for optimal resource usage!!"
             )
 
-        with concurrent.futures.ProcessPoolExecutor(
+        with self._shared_setup(), concurrent.futures.ProcessPoolExecutor(
             max_workers=num_parallel,
         ) as pool:
             # setup gpu resource queue
@@ -192,6 +212,7 @@ class HOREKAAffinityGPUDistributingLocalScheduler(GPUDistributingLocalScheduler)
 
             for j in self.joblist:
                 for c in j.tasks:
+                    cw_trace.instant("task queued", task=c[KEYS.i_REP_LOG_PATH])
                     pool.submit(
                         HOREKAAffinityGPUDistributingLocalScheduler._execute_task,
                         j,
@@ -212,7 +233,8 @@ class HOREKAAffinityGPUDistributingLocalScheduler(GPUDistributingLocalScheduler)
         overwrite: bool = False,
     ):
         print("Seeing CPUs:", os.sched_getaffinity(0))
-        queue_idx = q.get()
+        with cw_trace.span("wait for slot", task=c[KEYS.i_REP_LOG_PATH]):
+            queue_idx = q.get()
         gpu_str = HOREKAAffinityGPUDistributingLocalScheduler.get_gpu_str(
             queue_idx, gpus_per_rep
         )
@@ -222,7 +244,8 @@ class HOREKAAffinityGPUDistributingLocalScheduler(GPUDistributingLocalScheduler)
             os.sched_setaffinity(0, cpus)
             c[KEYS.i_CPU_CORES] = cpus
             os.environ["CUDA_VISIBLE_DEVICES"] = gpu_str
-            j.run_task(c, overwrite)
+            with cw_trace.slot(queue_idx):
+                j.run_task(c, overwrite)
         except cw_error.ExperimentSurrender as _:
             return
         finally:
@@ -247,7 +270,9 @@ class KlusterThreadLimitingScheduler(GPUDistributingLocalScheduler):
                 "parallel. Fix for optimal resource usage!!"
             )
 
-        with multiprocessing.Pool(processes=num_parallel) as pool:
+        with self._shared_setup(), multiprocessing.Pool(
+            processes=num_parallel
+        ) as pool:
             # setup gpu resource queue
             m = multiprocessing.Manager()
             gpu_queue = m.Queue(maxsize=self._queue_elements)
@@ -256,6 +281,7 @@ class KlusterThreadLimitingScheduler(GPUDistributingLocalScheduler):
 
             for j in self.joblist:
                 for c in j.tasks:
+                    cw_trace.instant("task queued", task=c[KEYS.i_REP_LOG_PATH])
                     args = (
                         j,
                         c,
@@ -277,7 +303,8 @@ class KlusterThreadLimitingScheduler(GPUDistributingLocalScheduler):
         num_threads: int,
         overwrite: bool = False,
     ):
-        queue_idx = q.get()
+        with cw_trace.span("wait for slot", task=c[KEYS.i_REP_LOG_PATH]):
+            queue_idx = q.get()
         gpu_str = KlusterThreadLimitingScheduler.get_gpu_str(queue_idx, gpus_per_rep)
         try:
             os.environ["MKL_NUM_THREADS"] = str(num_threads)
@@ -292,7 +319,8 @@ class KlusterThreadLimitingScheduler(GPUDistributingLocalScheduler):
                 pass
 
             os.environ["CUDA_VISIBLE_DEVICES"] = gpu_str
-            j.run_task(c, overwrite)
+            with cw_trace.slot(queue_idx):
+                j.run_task(c, overwrite)
         except cw_error.ExperimentSurrender as _:
             return
         finally:
@@ -339,7 +367,7 @@ class CpuDistributingLocalScheduler(AbstractScheduler):
                 "parallel. Fix for optimal resource usage!!"
             )
 
-        with concurrent.futures.ProcessPoolExecutor(
+        with self._shared_setup(), concurrent.futures.ProcessPoolExecutor(
             max_workers=num_parallel,
         ) as pool:
             # setup gpu resource queue
@@ -350,6 +378,7 @@ class CpuDistributingLocalScheduler(AbstractScheduler):
 
             for j in self.joblist:
                 for c in j.tasks:
+                    cw_trace.instant("task queued", task=c[KEYS.i_REP_LOG_PATH])
                     pool.submit(
                         CpuDistributingLocalScheduler._execute_task,
                         j,
@@ -368,13 +397,15 @@ class CpuDistributingLocalScheduler(AbstractScheduler):
         overwrite: bool = False,
     ):
         print("Seeing CPUs:", os.sched_getaffinity(0))
-        queue_idx = q.get()
+        with cw_trace.span("wait for slot", task=c[KEYS.i_REP_LOG_PATH]):
+            queue_idx = q.get()
         cpus = set(range(queue_idx * cpus_per_rep, (queue_idx + 1) * cpus_per_rep))
         print("Job {}: Using CPUs: {}".format(queue_idx, cpus))
         try:
             os.sched_setaffinity(0, cpus)
             c[KEYS.i_CPU_CORES] = cpus
-            j.run_task(c, overwrite)
+            with cw_trace.slot(queue_idx):
+                j.run_task(c, overwrite)
         except cw_error.ExperimentSurrender as _:
             return
         finally:
@@ -392,13 +423,24 @@ class CpuDistributingLocalScheduler(AbstractScheduler):
 class LocalScheduler(AbstractScheduler):
     def run(self, overwrite: bool = False):
         for j in self.joblist:
-            Parallel(n_jobs=j.n_parallel)(
-                delayed(self.execute_task)(j, c, overwrite) for c in j.tasks
-            )
+            for c in j.tasks:
+                cw_trace.instant("task queued", task=c[KEYS.i_REP_LOG_PATH])
+            j.setup()
+            # forked workers inherit the setup_job() results, loky workers would set up again
+            backend = "multiprocessing" if j.has_setup() and j.n_parallel > 1 else None
+            try:
+                Parallel(n_jobs=j.n_parallel, backend=backend)(
+                    delayed(self.execute_batch)(j, cs, overwrite) for cs in j.batches()
+                )
+            finally:
+                j.teardown()
 
     def execute_task(self, j: job.Job, c: dict, overwrite: bool = False):
+        self.execute_batch(j, [c], overwrite)
+
+    def execute_batch(self, j: job.Job, cs: List[dict], overwrite: bool = False):
         try:
-            j.run_task(c, overwrite)
+            j.run_batch(cs, overwrite)
         except cw_error.ExperimentSurrender as _:
             return
 
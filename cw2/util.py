@@ -1,4 +1,5 @@
 import datetime
+import fcntl
 import os
 import re
 
@@ -172,3 +173,20 @@ def get_file_names_in_directory(directory: str) -> [str]:
     except StopIteration as e:
         print("Cannot read files from directory: ", directory)
     return file_names
+
+
+class FileLock:
+    """Exclusive advisory lock on a lock file, shared between processes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f = None
+
+    def __enter__(self):
+        self._f = open(self.path, "a")
+        fcntl.flock(self._f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        fcntl.flock(self._f, fcntl.LOCK_UN)
+        self._f.close()
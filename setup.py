@@ -50,4 +50,5 @@ setup(
     packages=find_packages(),
     package_data={"cw2": ["default_sbatch.sh"]},
     install_requires=["PyYAML", "numpy", "pandas", "joblib"],
+    entry_points={"console_scripts": ["cw2=cw2.__main__:main"]},
 )
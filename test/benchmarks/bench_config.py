@@ -0,0 +1,145 @@
+"""Benchmarks of the configuration pipeline on synthetic YAML sweeps:
+Config loading (import resolution + grid/list/ablative expansion), JobFactory.create_jobs and Config.to_yaml.
+"""
+import os
+import shutil
+import tempfile
+from typing import List
+
+import yaml
+
+from bench_util import Case
+
+from cw2 import job
+from cw2.cw_config import cw_config
+from cw2.cw_data import cw_logging
+
+MIXES = ["grid", "list", "ablative", "mixed"]
+REPS = 10
+
+PROFILES = {
+    "quick": {"sizes": [10**2, 10**3, 10**4], "depths": [0, 3]},
+    "full": {"sizes": [10**2, 10**3, 10**4, 10**5, 10**6], "depths": [0, 3, 8]},
+}
+
+
+def _sweep(mix: str, n_combinations: int) -> dict:
+    """parameter section of an experiment with n_combinations parameter settings."""
+    n = max(n_combinations, 1)
+    if mix == "grid":
+        a = min(10, n)
+        return {"grid": {"a": list(range(a)), "b": list(range(n // a))}}
+    if mix == "list":
+        return {"list": {"a": list(range(n)), "b": [0.1 * i for i in range(n)]}}
+    if mix == "ablative":
+        half = n // 2
+        return {"ablative": {"a": list(range(half)), "b": list(range(n - half))}}
+    if mix == "mixed":
+        # grid x list x ablative
+        a = max(int(round(n ** (1 / 3))), 1)
+        c = max(n // (a * a), 1)
+        return {
+            "grid": {"a": list(range(a))},
+            "list": {"b": list(range(a)), "opt": {"lr": [10**-i for i in range(a)]}},
+            "ablative": {"c": list(range(c))},
+        }
+    raise ValueError(mix)
+
+
+def write_sweep(
+    dir_path: str, n_tasks: int, mix: str = "grid", import_depth: int = 0
+) -> str:
+    """write a synthetic sweep with about n_tasks tasks.
+
+    Args:
+        dir_path (str): directory for the YAML files and the experiment output
+        n_tasks (int): number of tasks (parameter settings x repetitions)
+        mix (str, optional): "grid", "list", "ablative" or "mixed". Defaults to "grid".
+        import_depth (int, optional): length of the chain of imported external YAML files. Defaults to 0.
+
+    Returns:
+        str: path of the main YAML file
+    """
+    # Chain of imports: base_0 <- base_1 <- ... <- main
+    prev = None
+    for d in range(import_depth):
+        conf = {
+            "name": "DEFAULT",
+            "params": {"level_{}".format(d): d, "shared": {"x": d, "y": [d] * 4}},
+        }
+        if prev is not None:
+            conf["import_path"] = prev
+        prev = "base_{}.yml".format(d)
+        with open(os.path.join(dir_path, prev), "w") as f:
+            yaml.dump(conf, f)
+
+    default = {
+        "name": "DEFAULT",
+        "repetitions": REPS,
+        "reps_per_job": REPS,
+        "reps_in_parallel": 1,
+        "iterations": 100,
+        "params": {"net": {"layers": [64, 64], "act": "relu"}, "batch_size": 32},
+    }
+    exp = {"name": "bench", "path": os.path.join(dir_path, "out")}
+    if prev is not None:
+        exp["import_path"] = prev
+    exp.update(_sweep(mix, n_tasks // REPS))
+
+    path = os.path.join(dir_path, "sweep.yml")
+    with open(path, "w") as f:
+        yaml.dump_all([default, exp], f)
+    return path
+
+
+def _tmp_sweep(n: int, mix: str, depth: int):
+    tmp = tempfile.mkdtemp()
+    return tmp, write_sweep(tmp, n, mix, depth)
+
+
+def _cleanup(state) -> None:
+    shutil.rmtree(state[0])
+
+
+def cases(profile: str = "quick") -> List[Case]:
+    p = PROFILES[profile]
+    res = []
+
+    for n in p["sizes"]:
+        for mix in MIXES:
+            for depth in p["depths"]:
+                if depth > 0 and mix != "mixed":
+                    continue
+                res.append(
+                    Case(
+                        "config_load[{}-{}-d{}]".format(mix, n, depth),
+                        lambda s: cw_config.Config(s[1]),
+                        setup=lambda n=n, mix=mix, depth=depth: _tmp_sweep(n, mix, depth),
+                        teardown=_cleanup,
+                    )
+                )
+
+    def setup_configs(n):
+        tmp, path = _tmp_sweep(n, "grid", 0)
+        return tmp, cw_config.Config(path)
+
+    for n in p["sizes"]:
+        res.append(
+            Case(
+                "create_jobs[{}]".format(n),
+                lambda s: job.JobFactory(
+                    None, cw_logging.LoggerArray(), read_only=True
+                ).create_jobs(s[1].exp_configs),
+                setup=lambda n=n: setup_configs(n),
+                teardown=_cleanup,
+            )
+        )
+        res.append(
+            Case(
+                "to_yaml[{}]".format(n),
+                lambda s: s[1].to_yaml(os.path.join(s[0], "yaml")),
+                setup=lambda n=n: setup_configs(n),
+                teardown=_cleanup,
+            )
+        )
+    return res
@@ -0,0 +1,117 @@
+"""Benchmarks of cw_loading.Loader on synthetic repetition output trees."""
+import atexit
+import os
+import shutil
+import tempfile
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from bench_util import Case
+
+from cw2 import job
+from cw2.cw_data import cw_loading, cw_logging, cw_pd_logger
+
+PROFILES = {
+    "quick": {"sizes": [10**2, 10**3], "iterations": 100},
+    "full": {"sizes": [10**2, 10**3, 10**4], "iterations": 1000},
+}
+
+_trees = {}
+
+
+def write_tree(dir_path: str, n_reps: int, iterations: int, reps_per_setting: int = 10) -> List[job.Job]:
+    """write a synthetic output tree with PandasLogger results.
+
+    Args:
+        dir_path (str): root of the tree
+        n_reps (int): total number of repetitions
+        iterations (int): rows per repetition log
+        reps_per_setting (int, optional): repetitions per parameter setting. Defaults to 10.
+
+    Returns:
+        List[job.Job]: read only jobs covering the tree
+    """
+    logger = cw_logging.LoggerArray()
+    logger.add(cw_pd_logger.PandasLogger())
+    rng = np.random.default_rng(0)
+
+    jobs = []
+    for s in range(n_reps // reps_per_setting):
+        tasks = []
+        for r in range(reps_per_setting):
+            rep_path = os.path.join(
+                dir_path, "bench", "bench__a{}".format(s), "log", "rep_{:02d}".format(r)
+            )
+            os.makedirs(rep_path)
+            pd.DataFrame(
+                {
+                    "iter": np.arange(iterations),
+                    "loss": rng.normal(size=iterations),
+                    "acc": rng.uniform(size=iterations),
+                }
+            ).to_pickle(os.path.join(rep_path, "rep_{}.pkl".format(r)))
+            tasks.append(
+                {
+                    "name": "bench",
+                    "params": {"a": s, "opt": {"lr": 0.1}},
+                    "_rep_idx": r,
+                    "_rep_log_path": rep_path,
+                }
+            )
+        jobs.append(job.Job(tasks, None, logger, read_only=True))
+    return jobs
+
+
+def _tree(n_reps: int, iterations: int):
+    """the trees are expensive to write, so they are shared by all cases and repeats."""
+    key = (n_reps, iterations)
+    if key not in _trees:
+        tmp = tempfile.mkdtemp()
+        atexit.register(shutil.rmtree, tmp, True)
+        _trees[key] = (tmp, write_tree(tmp, n_reps, iterations))
+    return _trees[key]
+
+
+def _load(jobs, **kwargs):
+    loader = cw_loading.Loader(progress=False, **kwargs)
+    loader.assign(jobs)
+    return loader.run()
+
+
+def cases(profile: str = "quick") -> List[Case]:
+    p = PROFILES[profile]
+    res = []
+    for n in p["sizes"]:
+        tree = lambda n=n: _tree(n, p["iterations"])
+        variants = {
+            "sequential": {"n_workers": 1},
+            "threads": {"n_workers": 8},
+            "lazy": {"n_workers": 8, "lazy": True},
+        }
+        for name, kwargs in variants.items():
+            res.append(
+                Case(
+                    "loader[{}-{}]".format(name, n),
+                    lambda s, kwargs=kwargs: _load(s[1], **kwargs),
+                    setup=tree,
+                )
+            )
+
+        def setup_store(n=n):
+            tmp, jobs = tree(n)
+            store_dir = tempfile.mkdtemp()
+            # warm the store, the measured run only validates signatures
+            _load(jobs, n_workers=8, store_dir=store_dir)
+            return store_dir, jobs
+
+        res.append(
+            Case(
+                "loader[incremental-warm-{}]".format(n),
+                lambda s: _load(s[1], n_workers=8, store_dir=s[0]),
+                setup=setup_store,
+                teardown=lambda s: shutil.rmtree(s[0]),
+            )
+        )
+    return res
@@ -0,0 +1,305 @@
+"""End-to-end overhead benchmark of the local schedulers with synthetic experiments.
+
+    python test/benchmarks/bench_schedulers.py
+    python test/benchmarks/bench_schedulers.py -s local mp_gpu -x noop sleep -p 1 2 4 -n 64
+
+For every scheduler, experiment and parallelism level, a sweep of synthetic tasks is run and reported:
+    tasks/s      throughput over the makespan
+    dispatch     mean / p95 idle time of a worker before it started a task, i.e. the scheduling overhead
+    efficiency   summed task time / (makespan * parallelism)
+    rss/worker   mean of the peak RSS of the worker processes
+
+GPUs are simulated: the GPU schedulers get a fake "gres=gpu:<parallelism>" allocation and only set
+CUDA_VISIBLE_DEVICES to fake device ids. Each run validates that no device id was used by two tasks at once.
+"""
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+from typing import Dict, List
+
+import numpy as np
+
+from cw2 import alternative_schedulers, experiment, job, scheduler
+from cw2.cw_config import cw_conf_keys as KEYS
+from cw2.cw_data import cw_logging
+
+RESULT_FILE = "bench.json"
+
+
+def _peak_rss() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+class SyntheticExperiment(experiment.AbstractExperiment):
+    """Base of the synthetic experiments. Records start, end, process and device of the task."""
+
+    def initialize(self, cw_config: dict, rep: int, logger: cw_logging.LoggerArray) -> None:
+        self.start = time.time()
+        self.rep_path = cw_config[KEYS.i_REP_LOG_PATH]
+        self.params = cw_config[KEYS.PARAMS]
+
+    def run(self, cw_config: dict, rep: int, logger: cw_logging.LoggerArray) -> None:
+        self.work()
+
+    def work(self) -> None:
+        raise NotImplementedError
+
+    def finalize(self, surrender=None, crash: bool = False):
+        res = {
+            "start": self.start,
+            "end": time.time(),
+            "pid": os.getpid(),
+            "device": os.environ.get("CUDA_VISIBLE_DEVICES"),
+            "peak_rss": _peak_rss(),
+            "crash": crash,
+        }
+        with open(os.path.join(self.rep_path, RESULT_FILE), "w") as f:
+            json.dump(res, f)
+
+
+class NoOpExperiment(SyntheticExperiment):
+    def work(self) -> None:
+        pass
+
+
+class SleepExperiment(SyntheticExperiment):
+    def work(self) -> None:
+        time.sleep(self.params["sleep_ms"] / 1000)
+
+
+class CpuExperiment(SyntheticExperiment):
+    def work(self) -> None:
+        x = 0
+        for i in range(self.params["cpu_loops"]):
+            x += i * i
+
+
+class MemoryExperiment(SyntheticExperiment):
+    def work(self) -> None:
+        # np.ones touches every page, so the memory is resident
+        a = np.ones(self.params["mem_mb"] * 2**20 // 8)
+        a.sum()
+
+
+EXPERIMENTS = {
+    "noop": NoOpExperiment,
+    "sleep": SleepExperiment,
+    "cpu": CpuExperiment,
+    "memory": MemoryExperiment,
+}
+
+# scheduler name -> (class, pins CPUs)
+SCHEDULERS = {
+    "local": (scheduler.LocalScheduler, False),
+    "mp_gpu": (scheduler.MPGPUDistributingLocalScheduler, False),
+    "kluster": (scheduler.KlusterThreadLimitingScheduler, False),
+    "horeka": (scheduler.HOREKAAffinityGPUDistributingLocalScheduler, True),
+    "cpu_distribute": (scheduler.CpuDistributingLocalScheduler, True),
+    "starmap_gpu": (alternative_schedulers.StarmapGPUDistributingLocalScheduler, False),
+    "concurrent_gpu": (alternative_schedulers.ConcurrentGPUDistributingLocalScheduler, False),
+    "joblib_gpu": (alternative_schedulers.JoblibGPUDistributingLocalScheduler, False),
+}
+
+
+def fake_conf(parallel: int) -> types.SimpleNamespace:
+    """a configuration stand-in with a fake GPU allocation of one GPU per parallel task."""
+    n_cpus = len(os.sched_getaffinity(0))
+    return types.SimpleNamespace(
+        slurm_config={
+            "sbatch_args": {"gres": "gpu:{}".format(parallel)},
+            "gpus_per_rep": 1,
+            "cpus-per-task": n_cpus - n_cpus % parallel,
+            "ntasks": 1,
+            "cpus_per_rep": max(n_cpus // parallel, 1),
+        }
+    )
+
+
+@contextlib.contextmanager
+def _silenced():
+    """silence stdout on file descriptor level, so the worker processes inherit it."""
+    sys.stdout.flush()
+    saved = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved, 1)
+        os.close(saved)
+        os.close(devnull)
+
+
+def make_job(root: str, exp_cls, n_tasks: int, parallel: int, params: Dict) -> job.Job:
+    tasks = []
+    for r in range(n_tasks):
+        tasks.append(
+            {
+                KEYS.NAME: "bench",
+                KEYS.PATH: os.path.join(root, "bench"),
+                KEYS.LOG_PATH: os.path.join(root, "bench", "log"),
+                KEYS.REPS_PARALL: parallel,
+                KEYS.PARAMS: params,
+                KEYS.i_REP_IDX: r,
+                KEYS.i_REP_LOG_PATH: os.path.join(root, "bench", "log", "rep_{:04d}".format(r)),
+            }
+        )
+    return job.Job(tasks, exp_cls, cw_logging.LoggerArray())
+
+
+def summarize(records: List[Dict], t0: float, t1: float, parallel: int) -> Dict:
+    makespan = t1 - t0
+    busy = sum(r["end"] - r["start"] for r in records)
+
+    # idle time of each worker before it started its next task
+    latencies = []
+    by_pid = {}
+    for r in records:
+        by_pid.setdefault(r["pid"], []).append(r)
+    for recs in by_pid.values():
+        prev_end = t0
+        for r in sorted(recs, key=lambda r: r["start"]):
+            latencies.append(max(r["start"] - prev_end, 0.0))
+            prev_end = r["end"]
+
+    # fake devices must never be shared by concurrently running tasks
+    overlaps = 0
+    by_device = {}
+    for r in records:
+        if r["device"] is not None:
+            by_device.setdefault(r["device"], []).append(r)
+    for recs in by_device.values():
+        recs = sorted(recs, key=lambda r: r["start"])
+        overlaps += sum(a["end"] > b["start"] for a, b in zip(recs, recs[1:]))
+
+    return {
+        "tasks": len(records),
+        "crashed": sum(r["crash"] for r in records),
+        "makespan_s": makespan,
+        "tasks_per_s": len(records) / makespan if makespan > 0 else float("nan"),
+        "dispatch_mean_ms": 1000 * float(np.mean(latencies)) if latencies else float("nan"),
+        "dispatch_p95_ms": 1000 * float(np.percentile(latencies, 95)) if latencies else float("nan"),
+        "efficiency": busy / (makespan * parallel) if makespan > 0 else float("nan"),
+        "workers": len(by_pid),
+        "rss_per_worker_mb": float(
+            np.mean([max(r["peak_rss"] for r in recs) for recs in by_pid.values()])
+        )
+        / 2**20
+        if by_pid
+        else float("nan"),
+        "device_overlaps": overlaps,
+    }
+
+
+def run_sweep(
+    sch_name: str, exp_name: str, parallel: int, n_tasks: int, params: Dict, quiet: bool = True
+) -> Dict:
+    """run one synthetic sweep and summarize its task records.
+
+    Args:
+        sch_name (str): key of SCHEDULERS
+        exp_name (str): key of EXPERIMENTS
+        parallel (int): tasks in parallel
+        n_tasks (int): number of tasks
+        params (Dict): experiment parameters
+        quiet (bool, optional): suppress the console output of the schedulers. Defaults to True.
+
+    Returns:
+        Dict: summary
+    """
+    sch_cls, _ = SCHEDULERS[sch_name]
+    root = tempfile.mkdtemp()
+    try:
+        with _silenced() if quiet else contextlib.nullcontext():
+            j = make_job(root, EXPERIMENTS[exp_name], n_tasks, parallel, params)
+            if sch_cls is scheduler.LocalScheduler:
+                s = sch_cls()
+            else:
+                s = sch_cls(fake_conf(parallel))
+            s.assign([j])
+
+            t0 = time.time()
+            s.run(overwrite=True)
+            t1 = time.time()
+
+        records = []
+        for c in j.tasks:
+            path = os.path.join(c[KEYS.i_REP_LOG_PATH], RESULT_FILE)
+            if os.path.exists(path):
+                with open(path) as f:
+                    records.append(json.load(f))
+        res = summarize(records, t0, t1, parallel)
+        res["missing"] = n_tasks - len(records)
+        return res
+    finally:
+        shutil.rmtree(root)
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="cw2 scheduler overhead benchmark")
+    p.add_argument("-s", "--schedulers", nargs="+", default=list(SCHEDULERS), choices=list(SCHEDULERS))
+    p.add_argument("-x", "--experiments", nargs="+", default=list(EXPERIMENTS), choices=list(EXPERIMENTS))
+    p.add_argument("-p", "--parallel", nargs="+", type=int, default=[1, 2, 4])
+    p.add_argument("-n", "--tasks", type=int, default=32, help="Tasks per sweep.")
+    p.add_argument("--sleep-ms", type=float, default=20)
+    p.add_argument("--cpu-loops", type=int, default=200000)
+    p.add_argument("--mem-mb", type=int, default=64)
+    p.add_argument("--json", default=None, help="Write all results to this file.")
+    args = p.parse_args(argv)
+
+    params = {"sleep_ms": args.sleep_ms, "cpu_loops": args.cpu_loops, "mem_mb": args.mem_mb}
+    n_cpus = len(os.sched_getaffinity(0))
+
+    print(
+        "{:<15} {:<7} {:>3} {:>9} {:>10} {:>10} {:>6} {:>9}".format(
+            "scheduler", "exp", "par", "tasks/s", "disp ms", "p95 ms", "eff", "rss MiB"
+        )
+    )
+    results = []
+    for sch_name in args.schedulers:
+        for parallel in args.parallel:
+            if SCHEDULERS[sch_name][1] and parallel > n_cpus:
+                print("{:<15} skipped parallelism {} > {} CPUs".format(sch_name, parallel, n_cpus))
+                continue
+            for exp_name in args.experiments:
+                res = run_sweep(sch_name, exp_name, parallel, args.tasks, params)
+                res.update(scheduler=sch_name, experiment=exp_name, parallel=parallel)
+                results.append(res)
+                print(
+                    "{:<15} {:<7} {:>3} {:>9.1f} {:>10.2f} {:>10.2f} {:>6.2f} {:>9.1f}{}".format(
+                        sch_name,
+                        exp_name,
+                        parallel,
+                        res["tasks_per_s"],
+                        res["dispatch_mean_ms"],
+                        res["dispatch_p95_ms"],
+                        res["efficiency"],
+                        res["rss_per_worker_mb"],
+                        "  INVALID: {} missing, {} crashed, {} device overlaps".format(
+                            res["missing"], res["crashed"], res["device_overlaps"]
+                        )
+                        if res["missing"] or res["crashed"] or res["device_overlaps"]
+                        else "",
+                    ),
+                    flush=True,
+                )
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,137 @@
+"""Shared harness of the cw2 benchmark suite.
+
+Benchmarks are not collected by pytest. Run them with
+    python test/benchmarks/run_benchmarks.py
+"""
+import contextlib
+import gc
+import io
+import json
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+
+class Case:
+    """A single benchmark case.
+    setup() prepares the input and is not measured, run(state) is measured.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        run: Callable,
+        setup: Callable = None,
+        teardown: Callable = None,
+    ):
+        self.name = name
+        self._run = run
+        self._setup = setup
+        self._teardown = teardown
+
+    def setup(self):
+        if self._setup is None:
+            return None
+        return self._setup()
+
+    def run(self, state) -> None:
+        if state is None:
+            self._run()
+        else:
+            self._run(state)
+
+    def teardown(self, state) -> None:
+        if self._teardown is not None:
+            self._teardown(state)
+
+
+def measure(case: Case, repeat: int = 3, quiet: bool = True) -> Dict:
+    """measure wall time and peak memory of a case.
+    The wall time is the minimum over `repeat` runs. The peak of the Python heap is measured
+    in an additional run with tracemalloc, so the tracing does not distort the timing.
+
+    Args:
+        case (Case): benchmark case
+        repeat (int, optional): number of timed runs. Defaults to 3.
+        quiet (bool, optional): suppress the stdout and stderr output of the benchmarked code. Defaults to True.
+
+    Returns:
+        Dict: wall_s and peak_mb
+    """
+    out = contextlib.ExitStack()
+    if quiet:
+        out.enter_context(contextlib.redirect_stdout(io.StringIO()))
+        out.enter_context(contextlib.redirect_stderr(io.StringIO()))
+    with out:
+        times = []
+        for _ in range(repeat):
+            state = case.setup()
+            gc.collect()
+            t = time.perf_counter()
+            case.run(state)
+            times.append(time.perf_counter() - t)
+            case.teardown(state)
+
+        state = case.setup()
+        gc.collect()
+        tracemalloc.start()
+        case.run(state)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        case.teardown(state)
+
+    return {"wall_s": min(times), "peak_mb": peak / 2**20}
+
+
+def load_baseline(path: str) -> Dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"thresholds": {}, "floors": {}, "results": {}}
+
+
+def write_baseline(path: str, results: Dict, thresholds: Dict, floors: Dict = None) -> None:
+    with open(path, "w") as f:
+        json.dump(
+            {"thresholds": thresholds, "floors": floors or {}, "results": results},
+            f,
+            indent=2,
+            sort_keys=True,
+        )
+        f.write("\n")
+
+
+def compare(results: Dict, baseline: Dict, thresholds: Dict, floors: Dict = None) -> List[str]:
+    """compare results against a baseline.
+    Increases below the absolute floor of a metric are ignored, so timer noise on
+    sub-millisecond cases is not reported as a regression.
+
+    Args:
+        results (Dict): benchmark results by case name
+        baseline (Dict): baseline results by case name
+        thresholds (Dict): allowed relative increase per metric, e.g. {"wall_s": 0.3}
+        floors (Dict, optional): ignored absolute increase per metric, e.g. {"wall_s": 0.005}. Defaults to None.
+
+    Returns:
+        List[str]: descriptions of all regressions
+    """
+    floors = floors or {}
+    regressions = []
+    for name, res in results.items():
+        if name not in baseline:
+            continue
+        for metric, tol in thresholds.items():
+            old = baseline[name].get(metric)
+            new = res.get(metric)
+            if old is None or new is None or old <= 0:
+                continue
+            if new - old < floors.get(metric, 0):
+                continue
+            if new > old * (1 + tol):
+                regressions.append(
+                    "{} {}: {:.4g} -> {:.4g} (+{:.0f}%, allowed +{:.0f}%)".format(
+                        name, metric, old, new, 100 * (new / old - 1), 100 * tol
+                    )
+                )
+    return regressions
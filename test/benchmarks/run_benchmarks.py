@@ -0,0 +1,77 @@
+"""Runs the cw2 benchmark suite and compares the results against a stored baseline.
+
+    python test/benchmarks/run_benchmarks.py                   # quick profile, compare to baseline.json
+    python test/benchmarks/run_benchmarks.py -k loader         # only cases containing "loader"
+    python test/benchmarks/run_benchmarks.py --update-baseline # store the results as new baseline
+
+Exits with 1 if a case regressed beyond the thresholds of the baseline.
+Wall time increases below the absolute floor (5 ms by default) are ignored.
+The end-to-end scheduler benchmark spawns worker processes and is run separately with bench_schedulers.py.
+"""
+import argparse
+import importlib
+import json
+import os
+import sys
+
+import bench_util
+
+BENCHMARK_MODULES = ["bench_config", "bench_loading"]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_THRESHOLDS = {"wall_s": 0.3, "peak_mb": 0.15}
+# wall time differences of a few milliseconds are timer and scheduling noise
+DEFAULT_FLOORS = {"wall_s": 0.005}
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="cw2 benchmark suite")
+    p.add_argument("--profile", choices=["quick", "full"], default="quick")
+    p.add_argument("-k", "--filter", default="", help="Only run cases containing this string.")
+    p.add_argument("--repeat", type=int, default=5, help="Timed runs per case.")
+    p.add_argument("--baseline", default=DEFAULT_BASELINE)
+    p.add_argument("--update-baseline", action="store_true")
+    p.add_argument("--json", default=None, help="Write the results to this file.")
+    args = p.parse_args(argv)
+
+    baseline = bench_util.load_baseline(args.baseline)
+    thresholds = baseline.get("thresholds") or DEFAULT_THRESHOLDS
+    floors = baseline.get("floors") or DEFAULT_FLOORS
+
+    results = {}
+    for mod_name in BENCHMARK_MODULES:
+        mod = importlib.import_module(mod_name)
+        for case in mod.cases(args.profile):
+            if args.filter not in case.name:
+                continue
+            res = bench_util.measure(case, args.repeat)
+            results[case.name] = res
+            old = baseline["results"].get(case.name)
+            rel = ""
+            if old is not None and old["wall_s"] > 0:
+                rel = "{:+.0f}%".format(100 * (res["wall_s"] / old["wall_s"] - 1))
+            print(
+                "{:<40} {:>10.4f} s {:>10.1f} MiB {:>7}".format(
+                    case.name, res["wall_s"], res["peak_mb"], rel
+                ),
+                flush=True,
+            )
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        merged = dict(baseline["results"])
+        merged.update(results)
+        bench_util.write_baseline(args.baseline, merged, thresholds, floors)
+        print("Baseline written to {}".format(args.baseline))
+        return 0
+
+    regressions = bench_util.compare(results, baseline["results"], thresholds, floors)
+    for r in regressions:
+        print("REGRESSION: {}".format(r))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,66 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from cw2.cw_data import cw_cache
+
+
+def _load_slowly(cache_dir: str, counter: str):
+    def loader():
+        with open(counter, "a") as f:
+            f.write("x")
+        time.sleep(0.2)
+        return {"x": np.arange(100.0), "y": np.ones((10, 3), dtype=np.int32)}
+
+    data = cw_cache.DatasetCache(cache_dir).get("dataset", loader)
+    assert float(data["x"].sum()) == 4950.0
+
+
+class TestDatasetCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_single_loader(self):
+        counter = os.path.join(self.tmp_dir, "counter")
+        cache_dir = os.path.join(self.tmp_dir, "cache")
+        procs = [
+            multiprocessing.Process(target=_load_slowly, args=(cache_dir, counter))
+            for _ in range(3)
+        ]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        self.assertTrue(all(p.exitcode == 0 for p in procs))
+        with open(counter) as f:
+            self.assertEqual(f.read(), "x")
+
+        data = cw_cache.DatasetCache(cache_dir).get("dataset", None)
+        self.assertIsInstance(data["y"], np.memmap)
+        self.assertFalse(data["y"].flags.writeable)
+        np.testing.assert_array_equal(data["y"], np.ones((10, 3)))
+
+    def test_lru_eviction(self):
+        cache = cw_cache.DatasetCache(self.tmp_dir, max_bytes=3 * 800)
+        for key in ["a", "b", "c"]:
+            arr = cache.get(key, lambda: np.zeros(100))
+            self.assertEqual(arr.shape, (100,))
+            time.sleep(0.01)
+        cache.get("a", None)
+        time.sleep(0.01)
+        cache.get("d", lambda: np.zeros(100))
+
+        keys = [e["key"] for e in cache.entries()]
+        self.assertListEqual(keys, ["c", "a", "d"])
+
+
+if __name__ == "__main__":
+    unittest.main()
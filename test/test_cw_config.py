@@ -1,8 +1,13 @@
+import os
+import shutil
+import tempfile
 import unittest
 from typing import Dict
 from unittest import main
 
-from cw2.cw_config import conf_unfolder, cw_config
+from cw2 import experiment, job
+from cw2.cw_config import conf_index, conf_io, conf_unfolder, cw_config
+from cw2.cw_data import cw_loading, cw_logging
 
 
 class TestParamsExpansion(unittest.TestCase):
@@ -175,5 +180,149 @@ class TestParamsExpansion(unittest.TestCase):
         self.assertEqual(6, len(res))
 
 
+class TestWriteYaml(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fpath = os.path.join(self.tmp_dir, "sub", "relative_conf.yml")
+        self.data = [
+            {"name": "exp", "params": {"a": 1, "b": [0.1, 0.2]}, "_rep_idx": 0},
+            {"name": "exp", "params": {"a": 2, "b": [0.1, 0.2]}, "_rep_idx": 1},
+        ]
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_write_once(self):
+        self.assertTrue(conf_io.write_yaml(self.fpath, self.data))
+        self.assertListEqual(conf_io.read_yaml(self.fpath), self.data)
+        mtime = os.stat(self.fpath).st_mtime_ns
+
+        self.assertFalse(conf_io.write_yaml(self.fpath, self.data))
+        self.assertEqual(mtime, os.stat(self.fpath).st_mtime_ns)
+
+        self.data[1]["params"]["a"] = 3
+        self.assertTrue(conf_io.write_yaml(self.fpath, self.data))
+        self.assertEqual(conf_io.read_yaml(self.fpath)[1]["params"]["a"], 3)
+        # no temporary files left behind
+        self.assertListEqual(
+            sorted(os.listdir(os.path.dirname(self.fpath))),
+            [".relative_conf.yml.sha256", "relative_conf.yml"],
+        )
+
+    def test_mixed_keys(self):
+        data = [{"name": "exp", "params": {1: "a", "b": "c"}}]
+        self.assertTrue(conf_io.write_yaml(self.fpath, data))
+        self.assertListEqual(conf_io.read_yaml(self.fpath), data)
+        self.assertFalse(conf_io.write_yaml(self.fpath, data))
+        self.assertNotEqual(
+            conf_io.content_hash(data),
+            conf_io.content_hash([{"name": "exp", "params": {"1": "a", "b": "c"}}]),
+        )
+
+    def test_rewrite_deleted_file(self):
+        conf_io.write_yaml(self.fpath, self.data)
+        os.remove(self.fpath)
+        self.assertTrue(conf_io.write_yaml(self.fpath, self.data))
+        self.assertListEqual(conf_io.read_yaml(self.fpath), self.data)
+
+    def test_rewrite_modified_file(self):
+        conf_io.write_yaml(self.fpath, self.data)
+        with open(self.fpath, "a") as f:
+            f.write("# hand edit\n")
+        self.assertTrue(conf_io.write_yaml(self.fpath, self.data))
+        with open(self.fpath) as f:
+            self.assertNotIn("hand edit", f.read())
+        self.assertFalse(conf_io.write_yaml(self.fpath, self.data))
+
+
+class NoOpExperiment(experiment.AbstractExperiment):
+    def initialize(self, cw_config, rep, logger):
+        pass
+
+    def run(self, cw_config, rep, logger):
+        pass
+
+    def finalize(self, surrender=None, crash=False):
+        pass
+
+
+class TestShardedLayout(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        conf = {
+            "name": "exp",
+            "path": self.tmp_dir,
+            "repetitions": 2,
+            "layout": "sharded",
+            "grid": {"a": list(range(20)), "some_very_long_parameter_name": ["x" * 50]},
+        }
+        self.configs = conf_unfolder.unfold_exps([conf], False, False)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_paths(self):
+        self.assertEqual(len(self.configs), 40)
+        paths = {c["path"] for c in self.configs}
+        self.assertEqual(len(paths), 20)
+        for c in self.configs:
+            rel = os.path.relpath(c["path"], os.path.join(self.tmp_dir, "exp"))
+            shard1, shard2, tid = rel.split(os.sep)
+            self.assertEqual(tid, c["_task_id"])
+            self.assertEqual(shard1 + shard2, tid[:4])
+            self.assertEqual(c["log_path"], os.path.join(c["path"], "log"))
+
+        single = {
+            "name": "exp",
+            "path": self.tmp_dir,
+            "repetitions": 1,
+            "layout": "sharded",
+            "grid": {"a": [3], "some_very_long_parameter_name": ["x" * 50]},
+        }
+        # ids are stable across expansions
+        again = conf_unfolder.unfold_exps([single], False, False)
+        self.assertIn(again[0]["path"], paths)
+
+    def test_index_and_completion(self):
+        index_path = conf_index.write_index(self.configs)[0]
+        index = conf_index.read_index(os.path.dirname(index_path))
+        self.assertEqual(len(index), 20)
+        c = self.configs[0]
+        self.assertEqual(index[c["_task_id"]]["params"], c["params"])
+        self.assertEqual(index[c["_task_id"]]["name"], c["_experiment_name"])
+
+        j = job.Job(self.configs[:2], NoOpExperiment, cw_logging.LoggerArray())
+        self.assertFalse(j._check_task_exists(self.configs[1], 1))
+        j.run_task(self.configs[1], overwrite=False)
+        self.assertTrue(j._check_task_exists(self.configs[1], 1))
+        self.assertFalse(j._check_task_exists(self.configs[0], 0))
+
+        loader = cw_loading.Loader(n_workers=1, progress=False)
+        loader.assign([job.Job(self.configs, None, cw_logging.LoggerArray(), read_only=True)])
+        df = loader.run()
+        self.assertEqual(len(df), 1)
+        self.assertEqual(list(df.index), [("exp", 1)])
+
+    def test_completion_with_root_dir(self):
+        conf = {"name": "exp", "path": "out", "repetitions": 2, "layout": "sharded"}
+        configs = conf_unfolder.unfold_exps([conf], False, False)
+        conf_index.write_index(configs, self.tmp_dir)
+
+        j = job.Job(configs, NoOpExperiment, cw_logging.LoggerArray(), root_dir=self.tmp_dir)
+        j.run_task(configs[1], overwrite=False)
+        self.assertTrue(
+            os.path.exists(os.path.join(self.tmp_dir, "out", "exp", conf_index.COMPLETED_FILE))
+        )
+        self.assertTrue(j._check_task_exists(configs[1], 1))
+        self.assertFalse(j._check_task_exists(configs[0], 0))
+
+        loader = cw_loading.Loader(n_workers=1, progress=False)
+        reader = job.Job(
+            configs, None, cw_logging.LoggerArray(), root_dir=self.tmp_dir, read_only=True
+        )
+        loader.assign([reader])
+        self.assertEqual(list(loader.run().index), [("exp", 1)])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,340 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import yaml
+
+import numpy as np
+import pandas as pd
+
+from cw2 import experiment, job, scheduler
+from cw2.cw_config import conf_index, conf_unfolder, cw_config
+from cw2.cw_data import (
+    cw_aggregate,
+    cw_archive,
+    cw_array_store,
+    cw_loading,
+    cw_logging,
+    cw_pd_logger,
+)
+
+
+class Constant(experiment.AbstractExperiment):
+    def initialize(self, config: dict, rep: int, logger: cw_logging.LoggerArray) -> None:
+        pass
+
+    def run(self, config: dict, rep: int, logger: cw_logging.LoggerArray) -> None:
+        logger.process({"iter": 0, "loss": float(rep)})
+
+    def finalize(self, surrender=None, crash: bool = False):
+        pass
+
+
+class LoadingTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.logger = cw_logging.LoggerArray()
+        self.logger.add(cw_pd_logger.PandasLogger())
+
+        self.joblist = []
+        for a in [1, 2]:
+            tasks = []
+            for r in range(3):
+                rep_path = os.path.join(
+                    self.tmp_dir, "exp", "exp__a{}".format(a), "log", "rep_{:02d}".format(r)
+                )
+                os.makedirs(rep_path)
+                tasks.append(
+                    {
+                        "name": "exp",
+                        "params": {"a": a, "b": {"c": "x"}},
+                        "_rep_idx": r,
+                        "_rep_log_path": rep_path,
+                    }
+                )
+                if a == 2 and r == 2:
+                    # missing results
+                    continue
+                pd.DataFrame({"iter": range(a + 1), "loss": [float(r)] * (a + 1)}).to_pickle(
+                    os.path.join(rep_path, "rep_{}.pkl".format(r))
+                )
+                conf_index.mark_completed(tasks[-1], "done")
+            self.joblist.append(job.Job(tasks, None, self.logger, read_only=True))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def load(self, **kwargs) -> pd.DataFrame:
+        loader = cw_loading.Loader(progress=False, **kwargs)
+        loader.assign(self.joblist)
+        return loader.run()
+
+
+class TestLoading(LoadingTestCase):
+    def test_parallel_equals_sequential(self):
+        seq = self.load(n_workers=1)
+        par = self.load(n_workers=4)
+
+        self.assertEqual(6, len(par))
+        self.assertListEqual(list(seq.index), list(par.index))
+        self.assertListEqual(list(seq["a"]), [1, 1, 1, 2, 2, 2])
+        self.assertListEqual(list(seq["b_c"]), list(par["b_c"]))
+        self.assertDictEqual({"a": 1, "b": {"c": "x"}}, par["params"].iloc[0])
+        pd.testing.assert_frame_equal(
+            seq["PandasLogger"].iloc[4], par["PandasLogger"].iloc[4]
+        )
+
+    def test_missing_rep(self):
+        df = self.load(n_workers=2)
+        self.assertIsInstance(df["PandasLogger"].iloc[5], str)
+        self.assertIsInstance(df["PandasLogger"].iloc[0], pd.DataFrame)
+
+    def test_process_backend(self):
+        df = self.load(n_workers=2, backend="process")
+        self.assertEqual(6, len(df))
+        self.assertEqual(3, len(df["PandasLogger"].iloc[3]))
+
+    def test_flatten_pd_log(self):
+        df = self.load(n_workers=1)
+        flat = df.cw2.flatten_pd_log()
+
+        # 3 reps with 2 iterations, 2 reps with 3 iterations, 1 rep missing
+        self.assertEqual(12, len(flat))
+        self.assertListEqual(["name", "r", "iter"], list(flat.index.names))
+
+        row = flat.reset_index().iloc[11]
+        self.assertListEqual([1, 2, 2, 1.0], list(row[["r", "iter", "a", "loss"]]))
+        self.assertDictEqual({"a": 2, "b": {"c": "x"}}, row["params"])
+
+    def test_select(self):
+        df = self.load(n_workers=1)
+        self.assertEqual(3, len(df.cw2.filter({"a": 2})))
+        self.assertEqual(3, len(df.cw2.filter({"a": 2, "b": {"c": "x"}})))
+        self.assertEqual(0, len(df.cw2.filter({"a": 3})))
+        self.assertEqual(2, len(df.cw2.repetition(1)))
+        self.assertEqual(6, len(df.cw2.name("exp")))
+        self.assertEqual(1, len(df.cw2.filter({"a": 1}).cw2.repetition(2)))
+
+    def test_select_after_mutation(self):
+        df = self.load(n_workers=1)
+        self.assertEqual(3, len(df.cw2.filter({"a": 2})))
+
+        # in-place edits keep the shape, the cached lookup must not be reused
+        df["a"] = [2, 2, 1, 1, 1, 1]
+        self.assertListEqual(
+            list(df["rep_path"].iloc[:2]), list(df.cw2.filter({"a": 2})["rep_path"])
+        )
+        last = df["rep_path"].iloc[5]
+        df.loc[df["rep_path"] == last, "a"] = 5
+        self.assertListEqual([last], list(df.cw2.filter({"a": 5})["rep_path"]))
+        self.assertEqual(3, len(df.cw2.filter({"a": 1})))
+
+    def test_lazy(self):
+        df = self.load(n_workers=2, lazy=True)
+        self.assertIsInstance(
+            df["PandasLogger"].iloc[0], cw_pd_logger.LazyPandasLog
+        )
+        self.assertIsInstance(df["PandasLogger"].iloc[5], str)
+
+        logs = df.cw2.filter({"a": 2}).cw2.load_logs(columns=["loss"])
+        self.assertEqual(3, len(logs))
+        self.assertListEqual(["loss"], list(logs["PandasLogger"].iloc[1].columns))
+
+        eager = self.load(n_workers=1).cw2.flatten_pd_log()
+        pd.testing.assert_frame_equal(eager, df.cw2.flatten_pd_log())
+
+    def test_aggregate(self):
+        df = self.load(n_workers=1, lazy=True)
+        agg = df.cw2.aggregate(metrics=["loss"], quantiles=[0.5])
+
+        self.assertListEqual(["name", "a", "b_c", "iter"], list(agg.index.names))
+        # a=1: 2 iterations, a=2: 3 iterations
+        self.assertEqual(5, len(agg))
+
+        row = agg.loc[("exp", 1, "x", 1)]
+        self.assertEqual(3, row[("loss", "count")])
+        self.assertAlmostEqual(1.0, row[("loss", "mean")])
+        self.assertAlmostEqual(1.0, row[("loss", "std")])
+        self.assertAlmostEqual(1.0, row[("loss", "q50")])
+        self.assertAlmostEqual(2.0, row[("loss", "max")])
+
+        row = agg.loc[("exp", 2, "x", 2)]
+        self.assertEqual(2, row[("loss", "count")])
+        self.assertAlmostEqual(0.5, row[("loss", "mean")])
+
+    def test_aggregate_chunks(self):
+        logs = [
+            pd.DataFrame({"iter": range(n), "m": [float(i)] * n})
+            for i, n in enumerate([2, 3, 1, 4])
+        ]
+        codes = np.array([0, 1, 0, 1])
+        small = cw_aggregate.aggregate(logs, codes, ["m"], [0.5], max_cells=1)
+        large = cw_aggregate.aggregate(logs, codes, ["m"], [0.5])
+        pd.testing.assert_frame_equal(small, large)
+        self.assertEqual(3, large.loc[(1, 3), ("m", "q50")])
+        self.assertEqual(2, large.loc[(1, 2), ("m", "q50")])
+        self.assertEqual(1, large.loc[(0, 1), ("m", "count")])
+
+
+class TestResultStore(LoadingTestCase):
+    def test_incremental_update(self):
+        store_dir = os.path.join(self.tmp_dir, "store")
+        full = self.load(n_workers=1)
+        first = self.load(n_workers=1, store_dir=store_dir)
+        self.assertTrue(os.path.exists(os.path.join(store_dir, "exp.pkl")))
+        self.assertListEqual(list(full.index), list(first.index))
+
+        # Add the missing repetition
+        c = self.joblist[1].tasks[2]
+        pd.DataFrame({"iter": [0], "loss": [7.0]}).to_pickle(
+            os.path.join(c["_rep_log_path"], "rep_2.pkl")
+        )
+
+        loaded = []
+        original = cw_loading._load_rep
+
+        def counting_load_rep(j, c, *args, **kwargs):
+            loaded.append(c["_rep_log_path"])
+            return original(j, c, *args, **kwargs)
+
+        cw_loading._load_rep = counting_load_rep
+        try:
+            second = self.load(n_workers=1, store_dir=store_dir)
+            third = self.load(n_workers=1, store_dir=store_dir)
+        finally:
+            cw_loading._load_rep = original
+
+        self.assertListEqual([c["_rep_log_path"]], loaded)
+        self.assertListEqual(list(full.index), list(second.index))
+        self.assertEqual(7.0, second["PandasLogger"].iloc[5]["loss"].iloc[0])
+        self.assertEqual(7.0, third["PandasLogger"].iloc[5]["loss"].iloc[0])
+
+    def test_retry_load_error(self):
+        store_dir = os.path.join(self.tmp_dir, "store")
+        broken = self.joblist[0].tasks[0]["_rep_log_path"]
+        original = job.Job.load_task
+
+        def flaky_load_task(j, c, *args, **kwargs):
+            if c["_rep_log_path"] == broken:
+                raise OSError("transient")
+            return original(j, c, *args, **kwargs)
+
+        job.Job.load_task = flaky_load_task
+        try:
+            first = self.load(n_workers=1, store_dir=store_dir)
+        finally:
+            job.Job.load_task = original
+        self.assertIsInstance(first["load_error"].iloc[0], str)
+
+        # nothing changed on disk, the failed repetition is retried anyway
+        second = self.load(n_workers=1, store_dir=store_dir)
+        self.assertTrue(second["load_error"].isna().all())
+        self.assertEqual(0.0, second["PandasLogger"].iloc[0]["loss"].iloc[0])
+
+
+class TestCompact(LoadingTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.exp_dir = os.path.join(self.tmp_dir, "exp")
+        rep_path = self.joblist[0].tasks[1]["_rep_log_path"]
+        ref = cw_array_store.ArrayStore(rep_path).append("w", np.arange(6.0))
+        pd.DataFrame({"iter": [0], "w": [ref]}).to_pickle(
+            os.path.join(rep_path, "rep_1.pkl")
+        )
+
+    def test_pack(self):
+        loose = self.load(n_workers=1)
+        stats = cw_archive.pack(self.exp_dir, subdirs_only=True)
+
+        # 5 result files, 5 completion markers, 2 array store files
+        self.assertEqual(stats["files"], 12)
+        self.assertEqual(os.listdir(self.exp_dir), [cw_archive.ARCHIVE_NAME])
+        packed = self.load(n_workers=2)
+        self.assertListEqual(list(loose.index), list(packed.index))
+        for i in [0, 3, 4]:
+            pd.testing.assert_frame_equal(
+                loose["PandasLogger"].iloc[i], packed["PandasLogger"].iloc[i]
+            )
+        self.assertIsInstance(packed["PandasLogger"].iloc[5], str)
+
+        # arrays are mapped directly from the archive
+        w = packed["PandasLogger"].iloc[1]["w"].iloc[0]
+        self.assertIsInstance(w, np.memmap)
+        np.testing.assert_array_equal(w, np.arange(6.0))
+
+        lazy = self.load(n_workers=1, lazy=True)
+        pd.testing.assert_frame_equal(
+            lazy["PandasLogger"].iloc[3].load(), loose["PandasLogger"].iloc[3]
+        )
+
+    def test_finished_and_merge(self):
+        tasks = self.joblist[1].tasks
+        cw_archive.pack(self.exp_dir, subdirs_only=True)
+        self.assertTrue(cw_archive.is_finished(tasks[0]))
+        self.assertFalse(cw_archive.is_finished(tasks[2]))
+        self.assertTrue(self.joblist[1]._check_task_exists(tasks[0], 0))
+
+        # repetitions finished later are merged into the archive
+        os.makedirs(tasks[2]["_rep_log_path"])
+        pd.DataFrame({"iter": [0], "loss": [2.0]}).to_pickle(
+            os.path.join(tasks[2]["_rep_log_path"], "rep_2.pkl")
+        )
+        self.assertFalse(cw_archive.is_finished(tasks[2]))
+        conf_index.mark_completed(tasks[2], "done")
+        self.assertEqual(cw_archive.pack(self.exp_dir, subdirs_only=True)["files"], 2)
+        self.assertTrue(cw_archive.is_finished(tasks[2]))
+        df = self.load(n_workers=1)
+        self.assertEqual(len(df["PandasLogger"].iloc[5]), 1)
+        self.assertEqual(len(df["PandasLogger"].iloc[4]), 3)
+
+    def test_end_to_end_python_logger(self):
+        conf = {"name": "run", "path": self.exp_dir, "repetitions": 2}
+        configs = conf_unfolder.unfold_exps([conf], False, False)
+        logger = cw_logging.LoggerArray()
+        logger.add(cw_logging.PythonLogger())
+        logger.add(cw_pd_logger.PandasLogger())
+        factory = job.JobFactory(Constant, logger)
+        s = scheduler.LocalScheduler()
+        s.assign(factory.create_jobs(configs))
+        s.run()
+
+        run_dir = os.path.join(self.exp_dir, "run")
+        cw_archive.pack(run_dir, subdirs_only=True)
+        loader = cw_loading.Loader(n_workers=1, progress=False)
+        loader.assign(job.JobFactory(None, logger, read_only=True).create_jobs(configs))
+        df = loader.run()
+
+        self.assertNotIn("load_error", df.columns)
+        self.assertListEqual([d["loss"].iloc[0] for d in df["PandasLogger"]], [0.0, 1.0])
+        # loading must not recreate the compacted repetition directories
+        self.assertListEqual(os.listdir(run_dir), [cw_archive.ARCHIVE_NAME])
+
+    def test_compact_skips_running(self):
+        config_path = os.path.join(self.tmp_dir, "conf.yml")
+        with open(config_path, "w") as f:
+            yaml.dump({"name": "run", "path": self.exp_dir, "repetitions": 2}, f)
+        conf = cw_config.Config(config_path)
+        logger = cw_logging.LoggerArray()
+        logger.add(cw_logging.PythonLogger())
+        logger.add(cw_pd_logger.PandasLogger())
+        s = scheduler.LocalScheduler()
+        s.assign(job.JobFactory(Constant, logger).create_jobs(conf.exp_configs))
+        s.run()
+
+        # a running repetition already has its logs, but no completion marker yet
+        running = conf.exp_configs[1]
+        os.remove(os.path.join(running["_rep_log_path"], conf_index.REP_COMPLETED_FILE))
+        self.assertTrue(cw_archive.is_finished(conf.exp_configs[0]))
+        self.assertFalse(cw_archive.is_finished(running))
+        self.assertIn("err.log", os.listdir(running["_rep_log_path"]))
+
+        results = cw_archive.compact(conf)
+        self.assertEqual(results[0]["skipped"], "1 unfinished")
+        self.assertFalse(
+            os.path.exists(os.path.join(self.exp_dir, "run", cw_archive.ARCHIVE_NAME))
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
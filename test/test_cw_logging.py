@@ -0,0 +1,191 @@
+import concurrent.futures
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from cw2.cw_data import cw_array_store, cw_logging, cw_pd_logger, cw_stats_logger
+
+
+def log_rep(rep_path: str, n: int = 50) -> None:
+    l = cw_logging.PythonLogger()
+    l.initialize({}, 0, rep_path)
+    for i in range(n):
+        cw_logging.getLogger().info("{} {}".format(rep_path, i))
+    cw_logging.getLogger().error("{} error".format(rep_path))
+    l.finalize()
+
+
+class TestPythonLogger(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.rep_paths = []
+        for r in range(4):
+            rep_path = os.path.join(self.tmp_dir, "rep_{:02d}".format(r))
+            os.makedirs(rep_path)
+            self.rep_paths.append(rep_path)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def read(self, rep_path: str, f_name: str) -> list:
+        with open(os.path.join(rep_path, f_name)) as f:
+            return f.read().splitlines()
+
+    def check_reps(self, n: int = 50):
+        for rep_path in self.rep_paths:
+            out = self.read(rep_path, "out.log")
+            self.assertEqual(n + 1, len(out))
+            self.assertTrue(all(rep_path in line for line in out))
+            err = self.read(rep_path, "err.log")
+            self.assertEqual(1, len(err))
+            self.assertIn("error", err[0])
+
+    def test_threads(self):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(log_rep, self.rep_paths))
+        self.check_reps()
+
+    def test_processes(self):
+        ctx = multiprocessing.get_context("fork")
+        with concurrent.futures.ProcessPoolExecutor(2, mp_context=ctx) as pool:
+            list(pool.map(log_rep, self.rep_paths))
+        self.check_reps()
+
+    def test_missing_finalize(self):
+        l = cw_logging.PythonLogger()
+        l.initialize({}, 0, self.rep_paths[0])
+        cw_logging.getLogger().info("first")
+
+        # the next repetition in the same context closes the unfinished one
+        l2 = cw_logging.PythonLogger()
+        l2.initialize({}, 1, self.rep_paths[1])
+        cw_logging.getLogger().info("second")
+        l2.finalize()
+
+        self.assertListEqual(["[cw2] [INFO] first"], self.read(self.rep_paths[0], "out.log"))
+        self.assertListEqual(["[cw2] [INFO] second"], self.read(self.rep_paths[1], "out.log"))
+        self.assertEqual(1, sum(
+            isinstance(h, cw_logging._TaskQueueHandler)
+            for h in cw_logging.getLogger().handlers
+        ))
+
+
+class TestPandasLogger(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def run_rep(self, n_iter: int, **kwargs) -> cw_pd_logger.PandasLogger:
+        l = cw_pd_logger.PandasLogger(**kwargs)
+        l.initialize({}, 0, self.tmp_dir)
+        for n in range(n_iter):
+            l.process(
+                {"iter": n, "loss": float(n), "weights": np.full((3, 2), n, dtype=np.float32)}
+            )
+        l.finalize()
+        return l
+
+    def test_arrays_out_of_line(self):
+        l = self.run_rep(5, chunk_bytes=64)
+        # 24 bytes per array, two arrays per chunk
+        chunks = [f for f in os.listdir(os.path.join(self.tmp_dir, "arrays")) if f.endswith(".bin")]
+        self.assertEqual(len(chunks), 3)
+        self.assertIsInstance(l.df["weights"].iloc[0], cw_array_store.ArrayRef)
+
+        df = l.load()["PandasLogger"]
+        self.assertEqual(list(df["loss"]), [0.0, 1.0, 2.0, 3.0, 4.0])
+        for n, w in enumerate(df["weights"]):
+            self.assertEqual(w.shape, (3, 2))
+            self.assertEqual(w.dtype, np.float32)
+            np.testing.assert_array_equal(w, n)
+
+        lazy = l.load_lazy()["PandasLogger"].load(columns=["weights"])
+        np.testing.assert_array_equal(lazy["weights"].iloc[4], 4)
+
+    def test_rerun_clears_arrays(self):
+        self.run_rep(5, chunk_bytes=64)
+        l = self.run_rep(1, chunk_bytes=64)
+        self.assertEqual(len(l.array_store.index()), 1)
+        self.assertEqual(len(l.load()["PandasLogger"]), 1)
+
+    def test_inline_arrays(self):
+        l = self.run_rep(2, store_arrays=False)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir, "arrays")))
+        np.testing.assert_array_equal(l.load()["PandasLogger"]["weights"].iloc[1], 1)
+
+
+class TestOnlineStatsLogger(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.tmp_dir, "log")
+        self.config = {"log_path": self.log_path}
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def run_rep(self, rep: int, values: list) -> cw_stats_logger.OnlineStatsLogger:
+        rep_path = os.path.join(self.log_path, "rep_{:02d}".format(rep))
+        os.makedirs(rep_path, exist_ok=True)
+        l = cw_stats_logger.OnlineStatsLogger(quantiles=[0.5])
+        l.initialize(self.config, rep, rep_path)
+        for n, v in enumerate(values):
+            l.process({"iter": n, "rep": rep, "loss": v, "name": "ignored"})
+        l.finalize()
+        return l
+
+    def test_cross_rep_stats(self):
+        rng = np.random.default_rng(0)
+        values = rng.normal(size=(5, 4))
+        for r in range(5):
+            l = self.run_rep(r, list(values[r]))
+
+        # repeated merges are ignored
+        self.run_rep(0, [100.0] * 4)
+
+        df = l.load()["OnlineStatsLogger"]
+        self.assertEqual(4, len(df))
+        np.testing.assert_allclose(df[("loss", "mean")], values.mean(axis=0))
+        np.testing.assert_allclose(df[("loss", "std")], values.std(axis=0, ddof=1))
+        np.testing.assert_allclose(df[("loss", "max")], values.max(axis=0))
+        np.testing.assert_allclose(
+            df[("loss", "q50")], np.median(values, axis=0), rtol=0.02
+        )
+        self.assertListEqual([5] * 4, list(df[("loss", "count")]))
+
+    def test_non_finite(self):
+        self.run_rep(0, [1.0, float("inf")])
+        self.run_rep(1, [3.0, float("nan")])
+        l = self.run_rep(2, [np.float32(-np.inf), 4.0])
+
+        df = l.load()["OnlineStatsLogger"]
+        self.assertListEqual([2, 1], list(df[("loss", "count")]))
+        self.assertListEqual([1, 2], list(df[("loss", "non_finite")]))
+        self.assertListEqual([2.0, 4.0], list(df[("loss", "mean")]))
+        self.assertAlmostEqual(4.0, df[("loss", "q50")].iloc[1], delta=0.05)
+
+    def test_merge(self):
+        rng = np.random.default_rng(1)
+        x = rng.uniform(-10, 10, size=1000)
+        a = cw_stats_logger.RunningStat()
+        b = cw_stats_logger.RunningStat()
+        for v in x[:300]:
+            a.add(v)
+        for v in x[300:]:
+            b.add(v)
+        a.merge(b)
+
+        self.assertEqual(1000, a.count)
+        self.assertAlmostEqual(x.mean(), a.mean)
+        self.assertAlmostEqual(x.std(ddof=1), a.std)
+        for q in [0.1, 0.5, 0.9]:
+            self.assertAlmostEqual(np.quantile(x, q), a.sketch.quantile(q), delta=0.15)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,263 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import pandas as pd
+
+from cw2 import __main__ as cw2_main
+from cw2 import experiment, job, scheduler
+from cw2.cw_config import conf_index
+from cw2.cw_config import cw_conf_keys as KEYS
+from cw2.cw_data import cw_loading, cw_logging
+from cw2.cw_profiling import cw_profiler, cw_resources, cw_timing, cw_trace
+
+
+class SleepExperiment(experiment.AbstractIterativeExperiment):
+    def initialize(self, cw_config, rep, logger):
+        pass
+
+    def iterate(self, cw_config, rep, n):
+        time.sleep(0.002)
+        return {"n": n}
+
+    def save_state(self, cw_config, rep, n):
+        time.sleep(0.01)
+
+    def finalize(self, surrender=None, crash=False):
+        pass
+
+
+class TestIterationTimer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.config = {
+            "iterations": 5,
+            KEYS.i_REP_LOG_PATH: self.tmp_dir,
+        }
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_disabled(self):
+        SleepExperiment().run(self.config, 0, cw_logging.LoggerArray())
+        self.assertIsNone(cw_timing.read_timing(self.tmp_dir))
+
+    def test_phases(self):
+        self.config[KEYS.TIMING] = {"window": 3}
+        SleepExperiment().run(self.config, 0, cw_logging.LoggerArray())
+
+        summary = cw_timing.read_timing(self.tmp_dir)
+        phases = summary["phases"]
+        self.assertEqual(set(phases), {"iterate", "log", "save_state"})
+        for p in phases.values():
+            self.assertEqual(p["count"], 5)
+        self.assertGreaterEqual(phases["save_state"]["min_ms"], 10)
+        self.assertGreater(phases["save_state"]["share"], phases["iterate"]["share"])
+        self.assertLessEqual(phases["iterate"]["p50_ms"], phases["iterate"]["max_ms"])
+
+    def test_histogram(self):
+        h = cw_timing.PhaseHistogram(window=2)
+        for ns in [1, 2, 3, 1000]:
+            h.add(ns)
+        self.assertEqual(h.count, 4)
+        self.assertEqual(list(h.recent), [3, 1000])
+        self.assertEqual(h.quantile(0.0), 1)
+        self.assertEqual(h.quantile(1.0), 1000)
+
+
+@unittest.skipUnless(os.path.exists("/proc/self/stat"), "requires /proc")
+class TestResourceSampler(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.config = {
+            "name": "exp",
+            "path": os.path.join(self.tmp_dir, "exp"),
+            "log_path": os.path.join(self.tmp_dir, "exp", "log"),
+            "iterations": 3,
+            KEYS.i_REP_IDX: 0,
+            KEYS.i_REP_LOG_PATH: os.path.join(self.tmp_dir, "exp", "log", "rep_00"),
+        }
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_sample(self):
+        s = cw_resources.sample()
+        self.assertGreater(s["rss_bytes"], 0)
+        self.assertGreaterEqual(s["peak_rss_bytes"], s["rss_bytes"])
+        self.assertGreaterEqual(s["threads"], 1)
+
+    def test_run_task(self):
+        self.config[KEYS.RESOURCES] = {"interval": 0.005}
+        j = job.Job([self.config], SleepExperiment, cw_logging.LoggerArray())
+        j.run_task(self.config, overwrite=True)
+
+        rep_path = self.config[KEYS.i_REP_LOG_PATH]
+        summary = cw_resources.read_resources(rep_path)
+        self.assertGreater(summary["wall_s"], 0.03)
+        self.assertGreater(summary["n_samples"], 2)
+        series = pd.read_csv(os.path.join(rep_path, "resources.csv"))
+        self.assertEqual(len(series), summary["n_samples"])
+        self.assertListEqual(list(series.columns), cw_resources.FIELDS)
+
+        df = pd.DataFrame({"name": ["exp", "exp"], "r": [0, 1], "rep_path": [rep_path, "missing"]})
+        res = df.cw2.resources()
+        self.assertEqual(list(res.index), [("exp", 0)])
+        self.assertIn("peak_rss_bytes", res.columns)
+
+    def test_disabled(self):
+        j = job.Job([self.config], SleepExperiment, cw_logging.LoggerArray())
+        j.run_task(self.config, overwrite=True)
+        self.assertIsNone(cw_resources.read_resources(self.config[KEYS.i_REP_LOG_PATH]))
+
+    def test_stopped_on_logger_error(self):
+        class FailingLogger(cw_logging.AbstractLogger):
+            def initialize(self, config, rep, rep_log_path):
+                raise RuntimeError("logger init")
+
+            def process(self, data):
+                pass
+
+            def finalize(self):
+                pass
+
+            def load(self):
+                pass
+
+        self.config[KEYS.RESOURCES] = {"interval": 0.005}
+        loggers = cw_logging.LoggerArray()
+        loggers.add(FailingLogger())
+        j = job.Job([self.config], SleepExperiment, loggers)
+        with self.assertRaises(RuntimeError):
+            j.run_task(self.config, overwrite=True)
+
+        names = [t.name for t in threading.enumerate()]
+        self.assertNotIn("cw2-resource-sampler", names)
+
+
+class AllocExperiment(SleepExperiment):
+    def initialize(self, cw_config, rep, logger):
+        self.data = []
+
+    def iterate(self, cw_config, rep, n):
+        self.data.append(bytearray(2**20))
+        return super().iterate(cw_config, rep, n)
+
+
+class TestTaskProfiler(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.configs = [
+            {
+                "name": "exp",
+                "path": os.path.join(self.tmp_dir, "exp"),
+                "log_path": os.path.join(self.tmp_dir, "exp", "log"),
+                "iterations": 4,
+                KEYS.i_REP_IDX: r,
+                KEYS.i_REP_LOG_PATH: os.path.join(
+                    self.tmp_dir, "exp", "log", "rep_{:02d}".format(r)
+                ),
+            }
+            for r in range(2)
+        ]
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def run_tasks(self, exp_cls=SleepExperiment):
+        j = job.Job(self.configs, exp_cls, cw_logging.LoggerArray())
+        for c in self.configs:
+            j.run_task(c, overwrite=True)
+
+    def test_task_selection(self):
+        n = cw_profiler.annotate_configs(self.configs, "cpu", tasks=[1])
+        self.assertEqual(n, 1)
+        self.run_tasks()
+
+        self.assertListEqual(
+            os.listdir(self.configs[0][KEYS.i_REP_LOG_PATH]), [conf_index.REP_COMPLETED_FILE]
+        )
+        files = os.listdir(self.configs[1][KEYS.i_REP_LOG_PATH])
+        for f in ["profile_cpu.prof", "profile_cpu.txt", "profile_cpu.collapsed"]:
+            self.assertIn(f, files)
+        with open(os.path.join(self.configs[1][KEYS.i_REP_LOG_PATH], "profile_cpu.txt")) as f:
+            self.assertIn("iterate", f.read())
+
+    def test_sampled_iterations(self):
+        cw_profiler.annotate_configs(self.configs, "both", tasks=[0], every=2)
+        self.run_tasks(AllocExperiment)
+
+        rep_path = self.configs[0][KEYS.i_REP_LOG_PATH]
+        with open(os.path.join(rep_path, "profile_mem.txt")) as f:
+            self.assertIn("test_cw_profiling.py", f.read())
+        with open(os.path.join(rep_path, "profile_mem.collapsed")) as f:
+            self.assertIn("test_cw_profiling.py", f.read())
+        self.assertIsNone(cw_profiler.current())
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            cw_profiler.annotate_configs(self.configs, "gpu")
+
+
+class TestTrace(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.trace_dir = os.path.join(self.tmp_dir, "trace")
+        os.environ[cw_trace.ENV_TRACE_DIR] = self.trace_dir
+        self.configs = [
+            {
+                "name": "exp",
+                "path": os.path.join(self.tmp_dir, "exp"),
+                "log_path": os.path.join(self.tmp_dir, "exp", "log"),
+                "iterations": 2,
+                KEYS.REPS_PARALL: 2,
+                KEYS.i_REP_IDX: r,
+                KEYS.i_REP_LOG_PATH: os.path.join(
+                    self.tmp_dir, "exp", "log", "rep_{:02d}".format(r)
+                ),
+            }
+            for r in range(4)
+        ]
+        self.job = job.Job(self.configs, SleepExperiment, cw_logging.LoggerArray())
+
+    def tearDown(self) -> None:
+        del os.environ[cw_trace.ENV_TRACE_DIR]
+        shutil.rmtree(self.tmp_dir)
+
+    def test_disabled(self):
+        del os.environ[cw_trace.ENV_TRACE_DIR]
+        self.job.run_task(self.configs[0], overwrite=True)
+        os.environ[cw_trace.ENV_TRACE_DIR] = self.trace_dir
+        self.assertFalse(os.path.exists(self.trace_dir))
+
+    def test_slot_scheduler(self):
+        s = scheduler.MPGPUDistributingLocalScheduler.__new__(
+            scheduler.MPGPUDistributingLocalScheduler
+        )
+        s.joblist = [self.job]
+        s._queue_elements = 2
+        s._gpus_per_rep = 1
+        s.run(overwrite=True)
+
+        cw2_main.main(["trace-merge", self.trace_dir])
+        events = cw_trace.load(os.path.join(self.trace_dir, "trace.json"))
+        names = [e["name"] for e in events]
+        self.assertEqual(names.count("task queued"), 4)
+        for n in ["wait for slot", "logger initialize", "initialize", "run", "finalize", "logger finalize"]:
+            self.assertEqual(names.count(n), 4, n)
+
+        runs = [e for e in events if e["name"] == "run"]
+        self.assertTrue(all(e["args"]["slot"] in [0, 1] for e in runs))
+        self.assertTrue(all(e["dur"] > 0 for e in runs))
+        # queued in the main process, executed in the pool workers
+        queued = [e for e in events if e["name"] == "task queued"]
+        self.assertTrue(all(e["pid"] == os.getpid() for e in queued))
+        self.assertTrue(all(e["pid"] != os.getpid() for e in runs))
+        self.assertTrue(any(e["ph"] == "M" for e in events))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from cw2 import cw_error, experiment, job
+from cw2.cw_data import cw_logging, cw_scratch
+
+
+class WritingExperiment(experiment.AbstractExperiment):
+    def initialize(self, config: dict, rep: int, logger: cw_logging.LoggerArray) -> None:
+        self.rep_path = config["_rep_log_path"]
+        self.final_path = config["_final_rep_log_path"]
+
+    def run(self, config: dict, rep: int, logger: cw_logging.LoggerArray) -> None:
+        with open(os.path.join(self.rep_path, "model.ckpt"), "w") as f:
+            f.write("weights")
+        os.remove(os.path.join(self.rep_path, "old.ckpt"))
+
+        mode = config["params"]["mode"]
+        if mode == "sync":
+            deadline = time.monotonic() + 5
+            while not os.path.exists(os.path.join(self.final_path, "model.ckpt")):
+                if time.monotonic() > deadline:
+                    raise RuntimeError("no periodic stage-out")
+                time.sleep(0.01)
+        elif mode == "crash":
+            raise RuntimeError("crash")
+        elif mode == "surrender":
+            raise cw_error.ExperimentSurrender()
+
+    def finalize(self, surrender=None, crash: bool = False):
+        with open(os.path.join(self.rep_path, "status.txt"), "w") as f:
+            f.write("crash" if crash else "surrender" if surrender else "done")
+
+
+class TestScratch(unittest.TestCase):
+    def setUp(self) -> None:
+        self.shared = tempfile.mkdtemp()
+        self.scratch = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.shared)
+        shutil.rmtree(self.scratch)
+
+    def make_config(self, mode: str, sync_interval: float = 0.0, rep: int = 0) -> dict:
+        rep_path = os.path.join(self.shared, mode, "log", "rep_{:02d}".format(rep))
+        os.makedirs(rep_path)
+        with open(os.path.join(rep_path, "old.ckpt"), "w") as f:
+            f.write("stale")
+        return {
+            "name": mode,
+            "params": {"mode": mode},
+            "path": os.path.join(self.shared, mode),
+            "log_path": os.path.join(self.shared, mode, "log"),
+            "_rep_idx": rep,
+            "_rep_log_path": rep_path,
+            "scratch": {"dir": self.scratch, "sync_interval": sync_interval},
+        }
+
+    def run_rep(self, mode: str, sync_interval: float = 0.0) -> str:
+        c = self.make_config(mode, sync_interval)
+        j = job.Job([c], WritingExperiment, cw_logging.LoggerArray())
+        j.run_task(c, overwrite=True)
+        return c["_rep_log_path"]
+
+    def test_stage_out(self):
+        for mode, status in [("done", "done"), ("crash", "crash"), ("surrender", "surrender")]:
+            rep_path = self.run_rep(mode)
+            self.assertListEqual(
+                sorted(os.listdir(rep_path)), ["completed.json", "model.ckpt", "status.txt"]
+            )
+            with open(os.path.join(rep_path, "status.txt")) as f:
+                self.assertEqual(f.read(), status)
+            with open(os.path.join(rep_path, "completed.json")) as f:
+                self.assertEqual(json.load(f)["status"], status)
+        self.assertListEqual(os.listdir(self.scratch), [])
+
+    def test_skip_file_written_during_sync(self):
+        c = self.make_config("partial")
+        s = cw_scratch.Scratch(self.scratch)
+        local = s.stage_in(c)["_rep_log_path"]
+        ckpt = os.path.join(local, "model.ckpt")
+        with open(ckpt, "w") as f:
+            f.write("half")
+
+        copy2 = cw_scratch.shutil.copy2
+
+        def copy_while_writing(src, dst):
+            copy2(src, dst)
+            if src == ckpt:
+                with open(ckpt, "a") as f:
+                    f.write(" of the weights")
+
+        cw_scratch.shutil.copy2 = copy_while_writing
+        try:
+            s.sync()
+        finally:
+            cw_scratch.shutil.copy2 = copy2
+        final = os.path.join(c["_rep_log_path"], "model.ckpt")
+        self.assertFalse(os.path.exists(final))
+
+        # the next sync publishes the completely written file
+        self.assertEqual(1, s.sync())
+        with open(final) as f:
+            self.assertEqual(f.read(), "half of the weights")
+        s.stage_out()
+
+    def test_failed_stage_in(self):
+        cs = [self.make_config("done", rep=r) for r in range(2)]
+        # the scratch base of the second task is a file, its stage-in fails
+        blocked = os.path.join(self.scratch, "blocked")
+        open(blocked, "w").close()
+        cs[1]["scratch"] = {"dir": blocked}
+
+        j = job.Job(cs, WritingExperiment, cw_logging.LoggerArray())
+        with self.assertRaises(OSError):
+            j.run_batch(cs, overwrite=True)
+        # the first scratch directory was staged out and removed
+        self.assertListEqual(os.listdir(self.scratch), ["blocked"])
+        self.assertListEqual(os.listdir(cs[0]["_rep_log_path"]), ["old.ckpt"])
+
+    def test_periodic_sync(self):
+        rep_path = self.run_rep("sync", sync_interval=0.02)
+        with open(os.path.join(rep_path, "status.txt")) as f:
+            self.assertEqual(f.read(), "done")
+
+
+if __name__ == "__main__":
+    unittest.main()
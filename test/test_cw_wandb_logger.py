@@ -0,0 +1,126 @@
+import os
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+
+
+class FakeRun:
+    def __init__(self, dir: str):
+        self.dir = os.path.join(dir, "wandb", "offline-run-0", "files")
+        self.logged = []
+        self.finished = False
+
+    def log(self, data: dict, step: int = None):
+        self.logged.append((step, data))
+
+    def finish(self):
+        self.finished = True
+
+
+def make_fake_wandb() -> types.ModuleType:
+    """local stand-in for the wandb backend"""
+    fake = types.ModuleType("wandb")
+    fake.runs = []
+
+    def init(**kwargs):
+        fake.init_kwargs = kwargs
+        run = FakeRun(kwargs["dir"])
+        fake.runs.append(run)
+        return run
+
+    fake.init = init
+    fake.Settings = lambda **kwargs: kwargs
+    fake.Histogram = lambda np_histogram: ("histogram", np_histogram)
+    return fake
+
+
+# The logger module imports wandb on import
+if "wandb" not in sys.modules:
+    try:
+        import wandb  # noqa
+    except ImportError:
+        sys.modules["wandb"] = make_fake_wandb()
+
+from cw2.cw_data import cw_wandb_logger
+
+
+class TestBufferedWandBLogger(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fake = make_fake_wandb()
+        self._wandb = cw_wandb_logger.wandb
+        cw_wandb_logger.wandb = self.fake
+
+        self.synced = []
+        self.uploader = cw_wandb_logger.WandBSyncUploader(
+            max_workers=1, sync_fn=self.synced.append
+        )
+
+    def tearDown(self) -> None:
+        cw_wandb_logger.wandb = self._wandb
+        self.uploader.shutdown()
+        shutil.rmtree(self.tmp_dir)
+
+    def config(self, **wandb_conf) -> dict:
+        return {
+            "_experiment_name": "exp__a1",
+            "params": {"a": 1},
+            "wandb": dict(project="p", **wandb_conf),
+        }
+
+    def test_buffered(self):
+        l = cw_wandb_logger.WandBLogger(uploader=self.uploader)
+        l.initialize(
+            self.config(buffered=True, log_interval=3, histogram=["h"]), 0, self.tmp_dir
+        )
+        self.assertEqual("offline", self.fake.init_kwargs["mode"])
+
+        for n in range(7):
+            l.process({"iter": n, "loss": float(n), "h": ([n], [0, 1])})
+        run = self.fake.runs[0]
+        self.assertEqual(2, len(run.logged))
+
+        l.finalize()
+        self.uploader.shutdown()
+
+        self.assertListEqual([0, 3, 6], [step for step, _ in run.logged])
+        self.assertEqual(1.0, run.logged[0][1]["loss"])
+        self.assertEqual(4.0, run.logged[1][1]["loss"])
+        self.assertEqual(("histogram", ([5], [0, 1])), run.logged[1][1]["h"])
+        self.assertTrue(run.finished)
+        self.assertListEqual([os.path.dirname(run.dir)], self.synced)
+
+    def test_unbuffered(self):
+        l = cw_wandb_logger.WandBLogger(uploader=self.uploader)
+        l.initialize(self.config(log_interval=3), 0, self.tmp_dir)
+        self.assertEqual("online", self.fake.init_kwargs["mode"])
+
+        for n in range(7):
+            l.process({"iter": n, "loss": float(n)})
+        l.finalize()
+        self.uploader.shutdown()
+
+        run = self.fake.runs[0]
+        self.assertListEqual([0, 3, 6], [step for step, _ in run.logged])
+        self.assertEqual(3.0, run.logged[1][1]["loss"])
+        self.assertListEqual([], self.synced)
+
+    def test_sync_retry(self):
+        calls = []
+
+        def flaky_sync(run_dir):
+            calls.append(run_dir)
+            if len(calls) < 2:
+                raise RuntimeError("network down")
+
+        uploader = cw_wandb_logger.WandBSyncUploader(sync_fn=flaky_sync)
+        with self.assertWarns(UserWarning):
+            self.assertTrue(uploader.submit("run").result())
+        uploader.shutdown()
+        self.assertEqual(2, len(calls))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,261 @@
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from cw2 import cw_error, experiment, job, scheduler
+from cw2.cw_config import conf_unfolder
+from cw2.cw_data import cw_loading, cw_logging, cw_pd_logger
+
+
+class RandomWalk(experiment.AbstractIterativeExperiment):
+    def initialize(self, config: dict, rep: int, logger: cw_logging.LoggerArray) -> None:
+        self.rng = np.random.default_rng(rep)
+        self.x = 0.0
+
+    def iterate(self, config: dict, rep: int, n: int) -> dict:
+        self.x += config["params"]["step"] * self.rng.standard_normal()
+        return {"x": self.x}
+
+    def save_state(self, config: dict, rep: int, n: int) -> None:
+        pass
+
+    def finalize(self, surrender=None, crash: bool = False):
+        pass
+
+
+class BatchedRandomWalk(experiment.AbstractBatchedIterativeExperiment):
+    def initialize(self, configs, reps, loggers) -> None:
+        self.batch_sizes = getattr(self, "batch_sizes", []) + [len(reps)]
+        self.rngs = [np.random.default_rng(r) for r in reps]
+        self.step = np.array([c["params"]["step"] for c in configs])
+        self.x = np.zeros(len(reps))
+
+    def iterate(self, configs, reps, n: int):
+        noise = np.array([rng.standard_normal() for rng in self.rngs])
+        self.x += self.step * noise
+        return [{"x": x} for x in self.x]
+
+    def save_state(self, configs, reps, n: int) -> None:
+        pass
+
+    def finalize(self, surrender=None, crash: bool = False):
+        pass
+
+
+class LoggingBatchedRandomWalk(BatchedRandomWalk):
+    def initialize(self, configs, reps, loggers) -> None:
+        super().initialize(configs, reps, loggers)
+        cw_logging.getLogger().info("batch {}".format(list(reps)))
+
+
+class Counting(experiment.AbstractIterativeExperiment):
+    def initialize(self, config: dict, rep: int, logger: cw_logging.LoggerArray) -> None:
+        self.saved = []
+        self.state = {"n": None}
+
+    def iterate(self, config: dict, rep: int, n: int) -> dict:
+        self.state["n"] = n
+        if n == config["params"].get("surrender_at"):
+            raise cw_error.ExperimentSurrender({"loss": 0.0})
+        return {"loss": config["params"]["losses"][n]}
+
+    def save_state(self, config: dict, rep: int, n: int) -> None:
+        self.saved.append(n)
+
+    def snapshot_state(self, config: dict, rep: int, n: int):
+        self.saved.append(n)
+        return dict(self.state)
+
+    def write_state(self, snapshot, path: str) -> None:
+        time.sleep(0.01)
+        super().write_state(snapshot, path)
+
+    def finalize(self, surrender=None, crash: bool = False):
+        pass
+
+
+class TestCheckpointing(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def run_exp(self, checkpoint, **params) -> Counting:
+        losses = [5, 4, 6, 3, 3, 7, 8, 1, 9, 9]
+        config = {
+            "iterations": len(losses),
+            "params": dict(losses=losses, **params),
+            "_rep_log_path": self.tmp_dir,
+            "checkpoint": checkpoint,
+        }
+        exp = Counting()
+        exp.initialize(config, 0, cw_logging.LoggerArray())
+        try:
+            exp.run(config, 0, cw_logging.LoggerArray())
+        except cw_error.ExperimentSurrender:
+            pass
+        return exp
+
+    def test_policies(self):
+        self.assertListEqual(self.run_exp(False).saved, list(range(10)))
+        self.assertListEqual(self.run_exp({"every": 3}).saved, [2, 5, 8, 9])
+        self.assertListEqual(self.run_exp({"best": "loss"}).saved, [0, 1, 3, 7])
+        self.assertListEqual(
+            self.run_exp({"best": "loss", "mode": "max"}).saved, [0, 2, 5, 6, 8]
+        )
+        self.assertListEqual(self.run_exp({"every": 4}, surrender_at=5).saved, [3, 5])
+
+    def test_async(self):
+        exp = self.run_exp({"async": True})
+        self.assertListEqual(exp.saved, list(range(10)))
+        with open(os.path.join(self.tmp_dir, "state.pkl"), "rb") as f:
+            self.assertEqual(pickle.load(f), {"n": 9})
+        with open(os.path.join(self.tmp_dir, "checkpoint.json")) as f:
+            self.assertEqual(json.load(f)["iter"], 9)
+
+        self.run_exp({"async": True, "every": 2}, surrender_at=6)
+        with open(os.path.join(self.tmp_dir, "state.pkl"), "rb") as f:
+            self.assertEqual(pickle.load(f), {"n": 6})
+        self.assertListEqual(
+            sorted(os.listdir(self.tmp_dir)), ["checkpoint.json", "state.pkl"]
+        )
+
+
+class SharedSetup(experiment.AbstractExperiment):
+    def setup_job(self, cw_configs):
+        with open(os.path.join(cw_configs[0]["path"], "..", "setup_calls"), "a") as f:
+            f.write("{}\n".format(os.getpid()))
+        return {"data": np.arange(1000), "pid": os.getpid()}
+
+    def initialize(self, config: dict, rep: int, logger: cw_logging.LoggerArray) -> None:
+        pass
+
+    def run(self, config: dict, rep: int, logger: cw_logging.LoggerArray) -> None:
+        logger.process({"sum": int(self.job_resources["data"].sum())})
+
+    def finalize(self, surrender=None, crash: bool = False):
+        pass
+
+
+class TestSharedSetup(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_setup_once_per_job(self):
+        for parallel in [1, 2]:
+            name = "p{}".format(parallel)
+            conf = {
+                "name": name,
+                "path": self.tmp_dir,
+                "repetitions": 4,
+                "reps_per_job": 4,
+                "reps_in_parallel": parallel,
+            }
+            configs = conf_unfolder.unfold_exps([conf], False, False)
+            logger = cw_logging.LoggerArray()
+            logger.add(cw_pd_logger.PandasLogger())
+            joblist = job.JobFactory(SharedSetup, logger).create_jobs(configs)
+            self.assertTrue(joblist[0].has_setup())
+            s = scheduler.LocalScheduler()
+            s.assign(joblist)
+            s.run()
+            stats = joblist[0].setup_stats
+            self.assertEqual(stats["tasks"], 4)
+            self.assertEqual(stats["setups"], 1)
+            self.assertAlmostEqual(stats["saved_s"], 3 * stats["setup_s"])
+
+            with open(os.path.join(self.tmp_dir, "setup_calls")) as f:
+                calls = f.read().split()
+            os.remove(os.path.join(self.tmp_dir, "setup_calls"))
+            self.assertListEqual(calls, [str(os.getpid())])
+            self.assertDictEqual(job._job_resources, {})
+
+            for c in configs:
+                with open(os.path.join(c["_rep_log_path"], job.SETUP_FILE)) as f:
+                    record = json.load(f)
+                # the setup ran before the workers started
+                self.assertFalse(record["ran_setup"])
+                self.assertEqual(record["setup_pid"], os.getpid())
+                df = pd.read_pickle(
+                    os.path.join(c["_rep_log_path"], "rep_{}.pkl".format(c["_rep_idx"]))
+                )
+                self.assertEqual(df["sum"].iloc[0], 499500)
+
+
+class TestBatchedExperiment(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def run_exp(self, name: str, exp_cls, python_logger: bool = False, **keys):
+        conf = {
+            "name": name,
+            "path": self.tmp_dir,
+            "repetitions": 3,
+            "iterations": 4,
+            "reps_per_job": 6,
+            "grid": {"step": [1.0, 0.5]},
+        }
+        conf.update(keys)
+        configs = conf_unfolder.unfold_exps([conf], False, False)
+        logger = cw_logging.LoggerArray()
+        if python_logger:
+            logger.add(cw_logging.PythonLogger())
+        logger.add(cw_pd_logger.PandasLogger())
+        factory = job.JobFactory(exp_cls, logger)
+        joblist = factory.create_jobs(configs)
+        s = scheduler.LocalScheduler()
+        s.assign(joblist)
+        s.run()
+
+        loader = cw_loading.Loader(n_workers=1, progress=False)
+        loader.assign(factory.create_jobs(configs))
+        return joblist, loader.run()
+
+    def test_same_results_as_separate_runs(self):
+        _, single = self.run_exp("single", RandomWalk)
+        joblist, batched = self.run_exp("batched", BatchedRandomWalk, reps_batched=4)
+
+        self.assertListEqual([len(b) for b in joblist[0].batches()], [4, 2])
+        self.assertListEqual(joblist[0].exp.batch_sizes, [4, 2])
+        self.assertEqual(len(batched), 6)
+        for i in range(6):
+            a = single["PandasLogger"].iloc[i]
+            b = batched["PandasLogger"].iloc[i]
+            self.assertListEqual(list(a["rep"]), list(b["rep"]))
+            np.testing.assert_allclose(a["x"], b["x"])
+
+        rep_dirs = [c["_rep_log_path"] for c in joblist[0].tasks]
+        for c, p in zip(joblist[0].tasks, rep_dirs):
+            self.assertTrue(
+                os.path.exists(os.path.join(p, "rep_{}.pkl".format(c["_rep_idx"])))
+            )
+
+    def test_python_logger_per_task(self):
+        joblist, _ = self.run_exp(
+            "logged", LoggingBatchedRandomWalk, python_logger=True, reps_batched=3
+        )
+        self.assertListEqual([len(b) for b in joblist[0].batches()], [3, 3])
+        for c in joblist[0].tasks:
+            with open(os.path.join(c["_rep_log_path"], "out.log")) as f:
+                lines = [line for line in f.read().splitlines() if "batch" in line]
+            # each repetition gets the records of its own batch only
+            self.assertEqual(1, len(lines), c["_rep_log_path"])
+            self.assertIn(str(c["_rep_idx"]), lines[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
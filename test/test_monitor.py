@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from cw2 import monitor
+
+
+class TestRepTail(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.csv_path = os.path.join(self.tmp_dir, "rep_0.csv")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def append(self, text: str) -> None:
+        with open(self.csv_path, "a") as f:
+            f.write(text)
+
+    def test_tail(self):
+        t = monitor.RepTail(self.csv_path, iterations=3)
+        self.assertEqual(0, t.poll())
+        self.assertFalse(t.exists)
+
+        self.append("index,x\n0,1\n1,")
+        self.assertEqual(1, t.poll())
+        self.assertEqual(1, t.rows)
+
+        self.append("2\n2,3\n")
+        self.assertEqual(2, t.poll())
+        self.assertTrue(t.done)
+
+    def test_rewrite(self):
+        t = monitor.RepTail(self.csv_path)
+        self.append("index,x,y\n0,1,1\n1,2,2\n")
+        self.assertEqual(2, t.poll())
+
+        # the logger rewrites the whole file with a new, shorter header
+        with open(self.csv_path, "w") as f:
+            f.write("a\n0\n")
+        self.assertEqual(1, t.poll())
+        self.assertEqual(1, t.rows)
+
+    def test_rewrite_new_column(self):
+        t = monitor.RepTail(self.csv_path, iterations=4)
+        self.append("index,x\n0,1\n1,2\n")
+        self.assertEqual(2, t.poll())
+
+        # a result key appears in the third iteration, the whole file is rewritten with a longer header
+        with open(self.csv_path, "w") as f:
+            f.write("index,x,some_new_metric\n0,1,\n1,2,\n2,3,0.5\n")
+        self.assertEqual(1, t.poll())
+        self.assertEqual(3, t.rows)
+
+        # a poll during the next rewrite sees a truncated file, the final file is counted again
+        with open(self.csv_path, "w") as f:
+            f.write("index,x,some_new_metric\n0,1,\n")
+        t.poll()
+        with open(self.csv_path, "w") as f:
+            f.write("index,x,some_new_metric\n0,1,\n1,2,\n2,3,0.5\n3,4,0.25\n")
+        t.poll()
+        self.assertEqual(4, t.rows)
+        self.assertTrue(t.done)
+
+    def test_progress(self):
+        e = monitor.ExperimentProgress("exp")
+        e.reps.append(monitor.RepTail(self.csv_path, iterations=4))
+        e.poll(0.0)
+        self.append("index\n0\n1\n")
+        e.poll(2.0)
+        self.assertAlmostEqual(1.0, e.rate)
+        self.assertAlmostEqual(2.0, e.eta)
+        self.assertIn("exp", monitor.format_table([e.summary()]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import yaml
+
+from cw2 import planner
+from cw2.cw_config import cw_config
+
+
+class TestPlanner(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmp_dir, "src")
+        os.makedirs(os.path.join(self.src, "pkg", "__pycache__"))
+        with open(os.path.join(self.src, "main.py"), "w") as f:
+            f.write("x" * 1000)
+        with open(os.path.join(self.src, "pkg", "__pycache__", "main.pyc"), "w") as f:
+            f.write("x" * 1000)
+
+        docs = [
+            {
+                "name": "SLURM",
+                "partition": "single",
+                "job-name": "test",
+                "num_parallel_jobs": 20,
+                "ntasks": 1,
+                "cpus-per-task": 4,
+                "time": "1-12:00:00",
+                "sbatch_args": {"gres": "gpu:2"},
+                "experiment_copy_src": self.src,
+                "experiment_copy_dst": os.path.join(self.tmp_dir, "code"),
+            },
+            {
+                "name": "exp",
+                "path": os.path.join(self.tmp_dir, "out"),
+                "repetitions": 6,
+                "reps_per_job": 3,
+                "reps_in_parallel": 3,
+                "grid": {"a": [1, 2], "b": [1, 2, 3]},
+            },
+        ]
+        self.config_path = os.path.join(self.tmp_dir, "conf.yml")
+        with open(self.config_path, "w") as f:
+            yaml.dump_all(docs, f)
+        self.conf = cw_config.Config(self.config_path)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_plan(self):
+        before = sorted(os.listdir(self.tmp_dir))
+        p = planner.plan(self.conf, {"slurm": True})
+        self.assertListEqual(before, sorted(os.listdir(self.tmp_dir)))
+
+        self.assertEqual(p["tasks"], 36)
+        self.assertEqual(p["jobs"], 12)
+        self.assertDictEqual(
+            p["experiments"]["exp"],
+            {"settings": 6, "tasks": 36, "jobs": 12, "tasks_per_job": 3, "reps_in_parallel": 3},
+        )
+        self.assertEqual(p["array"], {"size": 12, "max_parallel": 20})
+        self.assertAlmostEqual(p["core_hours"], 12 * 4 * 36)
+        self.assertAlmostEqual(p["gpu_hours"], 12 * 2 * 36)
+        # out, exp, 6 settings, 6 log dirs, 36 rep dirs
+        self.assertEqual(p["new_directories"], 2 + 6 + 6 + 36)
+        self.assertEqual(p["slurm_files"], 25)
+        self.assertEqual(p["code_copy"]["mode"], "COPY")
+        self.assertAlmostEqual(p["code_copy"]["size_mb"], 0.001)
+
+        self.assertEqual(json.loads(planner.to_json(p))["jobs"], 12)
+        self.assertIn("core-hours", planner.format_table(p))
+
+    def test_dry_run_json_stdout(self):
+        out = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "from cw2 import cluster_work; cluster_work.ClusterWork().run()",
+                self.config_path,
+                "-s",
+                "--dry-run",
+                "json",
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True,
+        )
+        self.assertEqual(json.loads(out.stdout)["jobs"], 12)
+        self.assertIn(b"Found slurm config", out.stderr)
+
+    def test_multicopy(self):
+        p = planner.plan(self.conf, {"slurm": True, "multicopy": True})
+        self.assertEqual(p["code_copy"]["copies"], 12)
+        self.assertAlmostEqual(p["code_copy"]["total_mb"], 0.012)
+
+    def test_slurm_time(self):
+        self.assertEqual(planner.parse_slurm_time(90), 1.5)
+        self.assertEqual(planner.parse_slurm_time("30"), 0.5)
+        self.assertEqual(planner.parse_slurm_time("30:00"), 0.5)
+        self.assertEqual(planner.parse_slurm_time("2:30:00"), 2.5)
+        self.assertEqual(planner.parse_slurm_time("1-2"), 26)
+        self.assertEqual(planner.parse_slurm_time("1-2:30"), 26.5)
+
+    def test_num_gpus(self):
+        for gres, n in [
+            (None, 0),
+            ("gpu", 1),
+            ("gpu:4", 4),
+            ("gpu:a100", 1),
+            ("gpu:a100:2", 2),
+            ("gpu:4,tmpfs:10G", 4),
+            ("tmpfs:10G,gpu:2", 2),
+            ("tmpfs:10G", 0),
+        ]:
+            sc = {"sbatch_args": {} if gres is None else {"gres": gres}}
+            self.assertEqual(planner._num_gpus(sc), n, gres)
+
+
+if __name__ == "__main__":
+    unittest.main()